@@ -11,87 +11,689 @@ IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
 or implied. 
 """
 
-from flask import Flask, render_template
+from flask import Flask, Blueprint, Response, current_app, g, render_template, jsonify, request, redirect, url_for, stream_with_context
+from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+import hashlib
+import json
 import os
+import threading
+import time
 
 from webex import WebexAPI
 from webex_reports import Webex_Reports
 from csv_reader import CSVReader
 from webex_contact_center import WebexContactCenterAPI
+from webex_transport import WebexTransport
 from report_processing import ReportProcessing
+from directory_cache import DirectoryCache
+from report_jobs import ReportJobManager
+from report_store import ReportStore
+from processed_reports import ProcessedReportCache
+from rolling_window import RollingCallWindow
+from call_store import CallStore
+from process_local import ProcessLocal
+from shared_cache import shared_cache_from_env
+from metrics import metrics, RequestProfiler
+from report_views import CallGroupFilter, paginate, page_arguments
+import exports
+from categorization_index import (CategorizationIndex, number_lookup, webex_number_lookup, wxcc_user_lookup,
+                                  tagged_number, WXCC_DIAL_NUMBER_TAG, WEBEX_CALL_QUEUE_TAG, TAG_LABELS)
 
 load_dotenv()
 
-app = Flask(__name__)
+# The routes are registered on the app created by create_app (python app.py, flask run or a WSGI server, see wsgi.py)
+views = Blueprint('views', __name__)
+views.add_app_template_filter(tagged_number)
+
+# API clients (and their connection pools) are created on first use, once per worker process
+webex_transport = ProcessLocal(WebexTransport)
+webex_api = ProcessLocal(lambda: WebexAPI(webex_transport.get()))
+wbx_report = ProcessLocal(lambda: Webex_Reports(webex_api.get()))
+webex_cc_api = ProcessLocal(lambda: WebexContactCenterAPI(webex_transport.get()))
+
+# Directories and report jobs are shared by the worker processes (SHARED_CACHE_BACKEND, by default a SQLite file)
+shared_cache = shared_cache_from_env()
+
+# The directories are cached as categorization lookups, built page by page while they are retrieved
+directory_cache = DirectoryCache({
+    'wxcc_dial_numbers': lambda: number_lookup(webex_cc_api.get().iter_dial_numbers(), "dialledNumber", WXCC_DIAL_NUMBER_TAG),
+    'w_queue_numbers': lambda: number_lookup(webex_api.get().iter_call_queues(), "phoneNumber", WEBEX_CALL_QUEUE_TAG),
+    'wxcc_user': lambda: wxcc_user_lookup(webex_cc_api.get().iter_users()),
+    'w_phone_numbers': lambda: webex_number_lookup(webex_api.get().iter_phone_numbers()),
+}, shared=shared_cache)
+
+# Reports are generated once per template and date range, the report jobs are served from the report store
+# Only reports served as they are (no shards or parts of merged reports) are processed while downloading, and only by
+# the python backend (the pandas backend reads the complete report columnar)
+report_store = ReportStore(lambda template_id, start_date, end_date, served_directly=True: wbx_report.get().report_workflow(
+    template_id, start_date, end_date,
+    process_rows=process_downloading_report if served_directly and report_processing_backend() == "python"
+    and os.getenv("REPORT_PARSE_WHILE_DOWNLOADING", "false").lower() == "true" else None))
+
+report_jobs = ReportJobManager(report_store.get_report, shared=shared_cache)
+
+# The processed call history of a report is stored per report and directory version
+processed_reports = ProcessedReportCache()
+
+# Call records collected by the CDR collector (cdr_collector.py)
+call_store = CallStore()
+
+
+def fetch_call_history(start_time, end_time):
+    '''
+    Returns the call history of a time window from the call store if it covers the window, otherwise from the CDR feed.
+    '''
+
+    if call_store.covers(start_time, end_time):
+        return call_store.iter_calls(start_time, end_time)
+
+    return webex_api.get().get_detailed_call_history(start_time, end_time)
+
+
+# Processed call store windows (most recently used last)
+call_store_results = OrderedDict()
+call_store_results_lock = threading.Lock()
+
+# The call history of the last 48 h is kept processed in memory and only extended by the new records
+latest_window = RollingCallWindow(fetch_call_history)
+
+directory_executor = ThreadPoolExecutor(max_workers=len(directory_cache.loaders), thread_name_prefix='directory')
+
+
+def retrieve_directory(name):
+    '''
+    Retrieves a single directory from the directory cache and measures the time.
+    Returns the directory lookup (empty on failure), its fingerprint, the error and the duration.
+    '''
+
+    start = time.perf_counter()
+    try:
+        return (*directory_cache.get_with_fingerprint(name), None, time.perf_counter() - start)
+    except Exception as e:
+        return {}, None, e, time.perf_counter() - start
 
 
 def retrieve_categorization_data():
     '''
-    Requests all information required for categoriation.
+    Requests all information required for categoriation (served from the directory cache) and
+    returns it as categorization index. The directories are requested concurrently. A failed directory
+    is replaced by an empty one and reported in the returned errors (directory name -> error).
+    '''
+
+    names = ('wxcc_dial_numbers', 'w_queue_numbers', 'wxcc_user', 'w_phone_numbers')
+    with metrics.timer('directories'):
+        results = dict(zip(names, directory_executor.map(retrieve_directory, names)))
+    for name, (_, _, _, duration) in results.items():
+        metrics.observe('stage_seconds', duration, stage='directory_fetch', directory=name)
+
+    errors = {name: error for name, (_, _, error, _) in results.items() if error}
+    timings = ", ".join(f"{name} {duration * 1000:.0f} ms{' (failed)' if error else ''}" for name, (_, _, error, duration) in results.items())
+    print(f"Categorization data retrieved: {timings}")
+    for name, error in errors.items():
+        print(f"Error: Directory {name} unavailable: {error}")
+
+    wxcc_dial_numbers, w_queue_numbers, wxcc_user, w_phone_numbers = (results[name][0] for name in names)
+    fingerprint = None if errors else hashlib.sha1(":".join(results[name][1] for name in names).encode('utf-8')).hexdigest()
+    categorization_index = CategorizationIndex(wxcc_dial_numbers, wxcc_user, w_queue_numbers, w_phone_numbers, fingerprint=fingerprint)
+
+    return categorization_index, errors
+
+
+def categorization_error_message(errors):
+    '''
+    Returns the message shown for a categorization based on incomplete directories.
+    '''
+
+    return f"Categorization incomplete, unavailable directories: {', '.join(f'{name} ({error})' for name, error in errors.items())}"
+
+
+def report_processing_backend():
+    '''
+    Returns the configured report processing backend (REPORT_PROCESSING_BACKEND: python or pandas).
+    '''
+
+    return os.getenv("REPORT_PROCESSING_BACKEND", "python")
+
+
+def create_report_processor(call_history, categorization_index):
+    '''
+    Creates the report processor of the configured backend for call history entries (CDR feed and call store windows).
+    '''
+
+    if report_processing_backend() == "pandas":
+        from report_processing_pandas import DataFrameReportProcessing
+        return DataFrameReportProcessing(call_history, categorization_index=categorization_index)
+
+    return ReportProcessing(call_history, categorization_index=categorization_index)
+
+
+def create_report_file_processor(report_path, categorization_index):
+    '''
+    Creates the report processor of the configured backend for a downloaded report. The pandas backend reads
+    the report directly into a DataFrame with categorical columns, without creating a dict per row.
+    '''
+
+    if report_processing_backend() == "pandas":
+        from report_processing_pandas import DataFrameReportProcessing
+        return DataFrameReportProcessing(DataFrameReportProcessing.read_report(report_path), categorization_index=categorization_index)
+
+    return ReportProcessing(CSVReader.iter_csv(report_path), categorization_index=categorization_index)
+
+
+def report_job_parameters():
+    '''
+    Returns the template id and date range of a report request (request values, by default the configured ones).
+    '''
+
+    return (request.values.get('template_id', os.getenv("TEMPLATE_ID")),
+            request.values.get('start_date', os.getenv("REPORT_START_DATE")),
+            request.values.get('end_date', os.getenv("REPORT_END_DATE")))
+
+
+def call_store_window(start_date, end_date):
+    '''
+    Returns the (start_time, end_time) window of a report date range, if the call store covers it, otherwise None.
+    '''
+
+    try:
+        start_time = f"{start_date}T00:00:00.000Z"
+        end_time = f"{(datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')}T00:00:00.000Z"
+    except (TypeError, ValueError):
+        return None
+
+    if call_store.covers(start_time, end_time, max_lag=0):
+        return start_time, end_time
+    return None
+
+
+def call_store_call_history(start_time, end_time):
+    '''
+    Processes the call history of a time window from the call store. The latest processed windows are kept in
+    memory, so the following pages of a window are served without processing it again.
+    Returns the processed call history and the categorization errors.
+    '''
+
+    categorization_index, errors = retrieve_categorization_data()
+    key = (start_time, end_time, categorization_index.fingerprint)
+
+    with call_store_results_lock:
+        if categorization_index.fingerprint and key in call_store_results:
+            call_store_results.move_to_end(key)
+            return call_store_results[key], errors
+
+    report_processor = create_report_processor(call_store.iter_calls(start_time, end_time), categorization_index)
+    final_report_data = report_processor.process_report_data()
+
+    if categorization_index.fingerprint:
+        with call_store_results_lock:
+            call_store_results[key] = final_report_data
+            while len(call_store_results) > int(os.getenv("CALL_STORE_RESULT_CACHE", 2)):
+                call_store_results.popitem(last=False)
+
+    return final_report_data, errors
+
+
+def report_call_history(report_id):
+    '''
+    Processes a downloaded report. The processed report is reused from its artifact as long as the report
+    and the directories are unchanged. Returns the processed call history and the categorization errors.
+    '''
+
+    report_path = f'./reports/{report_id}.csv'
+    if not os.path.exists(report_path):
+        raise Exception(f'Unknown report {report_id}')
+    
+    categorization_index, errors = retrieve_categorization_data()
+    
+    def process_report():
+        report_processor = create_report_file_processor(report_path, categorization_index)
+        return report_processor.process_report_data()
+
+    if categorization_index.fingerprint:
+        return processed_reports.get_or_process(report_path, categorization_index.fingerprint, process_report), errors
+
+    return process_report(), errors
+
+
+def process_downloading_report(report_path, rows):
+    '''
+    Processes the rows of a report while it is downloaded (REPORT_PARSE_WHILE_DOWNLOADING=true) and stores the
+    processed report as artifact, so the first view of the report is served from it.
+    '''
+
+    categorization_index, _ = retrieve_categorization_data()
+    if not categorization_index.fingerprint:
+        return
+
+    report_data = create_report_processor(rows, categorization_index).process_report_data()
+    processed_reports.store_report(report_path, categorization_index.fingerprint, report_data)
+
+
+def report_call_groups(report_id):
+    '''
+    Returns the (correlation id, call group) pairs of a downloaded report as iterator and the categorization errors.
+    Without artifact, the groups are processed one by one while they are consumed (and written to the artifact).
+    '''
+
+    report_path = f'./reports/{report_id}.csv'
+    if not os.path.exists(report_path):
+        raise Exception(f'Unknown report {report_id}')
+
+    categorization_index, errors = retrieve_categorization_data()
+
+    def iter_report():
+        return create_report_file_processor(report_path, categorization_index).iter_report_data()
+
+    if categorization_index.fingerprint:
+        return processed_reports.iter_or_process(report_path, categorization_index.fingerprint, iter_report), errors
+
+    return iter_report(), errors
+
+
+def latest_call_history(refresh=True):
+    '''
+    Returns the processed call history of the last 48 h and the categorization errors. Without refresh, the call
+    history of the last refresh is returned (used for the following pages).
+    '''
+
+    if not refresh:
+        call_history = latest_window.current()
+        if call_history is not None:
+            return call_history, {}
+
+    time_zone_difference = int(os.getenv("TIME_ZONE_DIFF")) 
+    end_date = datetime.now() - timedelta(hours=time_zone_difference, minutes=5)
+    start_date = datetime.now() - timedelta(hours=47+time_zone_difference, minutes=55) 
+    start_date = start_date.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    end_date = end_date.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+    categorization_index, errors = retrieve_categorization_data()
+
+    return latest_window.refresh(start_date, end_date, categorization_index), errors
+
+
+def render_report(report_id):
+    '''
+    Renders the call flows of a downloaded report, paginated or streamed (?stream=1).
+    '''
+
+    if streaming_requested():
+        return stream_call_groups(*report_call_groups(report_id))
+
+    return render_call_groups(*report_call_history(report_id), url_for('.api_report', report_id=report_id))
+
+
+def render_call_groups(call_history, errors, data_url):
+    '''
+    Renders the first page of the call groups matching the request filters, the following pages are
+    loaded from data_url (JSON API) while scrolling.
+    '''
+
+    call_filter = CallGroupFilter.from_args(request.args)
+    offset, limit = page_arguments(request.args)
+    page, next_offset = paginate(call_history, call_filter, offset, limit)
+
+    with metrics.timer('render'):
+        return render_template('table.html', hiddenLinks=False, call_history=page, next_offset=next_offset,
+                               data_url=data_url, filters=call_filter.to_args(), tags=TAG_LABELS,
+                               error=bool(errors), errormessage=categorization_error_message(errors))
+
+
+def streaming_requested():
+    '''
+    Checks if the call groups of a request should be streamed (?stream=1) instead of paginated.
     '''
 
-    wxcc_dial_numbers = webex_cc_api.list_dial_numbers()
-    w_queue_numbers = webex_api.get_call_queues()
-    wxcc_user = webex_cc_api.list_users()
-    w_phone_numbers = webex_api.get_phone_numbers()
+    return request.args.get('stream', '').lower() in ('1', 'true')
+
 
-    return wxcc_dial_numbers, w_queue_numbers, wxcc_user, w_phone_numbers
+def stream_template(template_name, **context):
+    '''
+    Renders a template as stream of HTML chunks (Flask >= 2.2 provides flask.stream_template).
+    '''
 
+    current_app.update_template_context(context)
+    template_stream = current_app.jinja_env.get_template(template_name).stream(context)
+    template_stream.enable_buffering(int(os.getenv("STREAM_BUFFER", 1000)))
 
-@app.route('/history')
+    return template_stream
+
+
+def stream_call_groups(call_groups, errors):
+    '''
+    Streams all call groups matching the request filters as HTML page, each group is sent when it is processed.
+    '''
+
+    call_filter = CallGroupFilter.from_args(request.args)
+    matching_call_groups = ((correlation_id, call_group) for correlation_id, call_group in call_groups if call_filter.matches(call_group))
+
+    return Response(stream_with_context(stream_template('table.html', hiddenLinks=False, call_history=matching_call_groups,
+                                                        data_url=None, filters=call_filter.to_args(), tags=TAG_LABELS,
+                                                        error=bool(errors), errormessage=categorization_error_message(errors))),
+                    mimetype='text/html')
+
+
+def ndjson_call_groups(call_groups, errors):
+    '''
+    Streams all call groups matching the request filters as newline delimited JSON, one call group per line.
+    '''
+
+    call_filter = CallGroupFilter.from_args(request.args)
+
+    def generate():
+        for name, error in errors.items():
+            yield json.dumps({'error': f'{name}: {error}'}) + '\n'
+        for correlation_id, call_group in call_groups:
+            if call_filter.matches(call_group):
+                yield json.dumps({'correlation_id': correlation_id, 'entries': call_group}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+def ndjson_requested():
+    '''
+    Checks if the call groups of an API request should be streamed as newline delimited JSON (?format=ndjson).
+    '''
+
+    return request.args.get('format') == 'ndjson'
+
+
+def call_groups_json(call_history, errors):
+    '''
+    Returns a page of the call groups matching the request filters as JSON.
+    '''
+
+    call_filter = CallGroupFilter.from_args(request.args)
+    offset, limit = page_arguments(request.args)
+    page, next_offset = paginate(call_history, call_filter, offset, limit)
+
+    with metrics.timer('render'):
+        return jsonify({
+            'groups': [{'correlation_id': correlation_id, 'entries': call_group} for correlation_id, call_group in page],
+            'next_offset': next_offset,
+            'errors': [f'{name}: {error}' for name, error in errors.items()],
+        })
+
+
+@views.before_app_request
+def start_request_metrics():
+    '''
+    Starts collecting the stage timings of a request and, if requested (?profile=cpu or ?profile=memory,
+    only with PROFILING_ENABLED=true), profiling the request.
+    '''
+
+    if request.endpoint == 'static':
+        return
+
+    metrics.start_request()
+    if request.args.get('profile') and RequestProfiler.enabled():
+        profiler = RequestProfiler(request.args['profile'], request.endpoint or 'request')
+        g.profiler = profiler if profiler.start() else None
+
+
+@views.after_app_request
+def finish_request_metrics(response):
+    '''
+    Adds the stage timings (Server-Timing header, in ms) and the counts (X-Request-Metrics header) of a request to
+    its response. Streamed responses only contain the stages before the first chunk.
+    '''
+
+    if request.endpoint == 'static':
+        return response
+
+    profiler = g.pop('profiler', None)
+    if profiler:
+        response.headers['X-Profile'] = str(profiler.stop())
+        if profiler.peak is not None:
+            response.headers['X-Profile-Peak-Memory'] = str(profiler.peak)
+
+    timings, counts = metrics.finish_request(request.endpoint or 'unknown', request.method, response.status_code)
+    if timings:
+        response.headers['Server-Timing'] = ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+    if counts:
+        response.headers['X-Request-Metrics'] = ", ".join(f"{name}={value}" for name, value in counts.items())
+
+    metrics.share(shared_cache)
+    return response
+
+
+@views.route('/history')
 def history():
     '''
-    Route to view the historic call flows (Max 31 days and latest end_date yesterday)
+    Route to view the historic call flows (Max 31 days and latest end_date yesterday).
+    Date ranges covered by the call store are queried from it, a report stored before is rendered directly,
+    otherwise a report job is submitted (or the running one for the same report is joined) and the request
+    is redirected to its results page.
     '''
     try:
         
-        report_id = wbx_report.report_workflow()
-        #report_id = "<Fill in name of report file to use (without .csv)>"
-        call_history = CSVReader.csv_to_dict(f'./reports/{report_id}.csv')
-        
-        wxcc_dial_numbers, w_queue_numbers, wxcc_user, w_phone_numbers = retrieve_categorization_data()
-        
-        report_processor = ReportProcessing(call_history, wxcc_dial_numbers, wxcc_user, w_queue_numbers, w_phone_numbers)
-        final_report_data = report_processor.process_report_data()
-        
-        return render_template('table.html', hiddenLinks=False, call_history=final_report_data)
+        template_id, start_date, end_date = report_job_parameters()
+        window = call_store_window(start_date, end_date)
+        if window:
+            start_time, end_time = window
+            call_history, errors = call_store_call_history(start_time, end_time)
+            if streaming_requested():
+                return stream_call_groups(call_history.items(), errors)
+            return render_call_groups(call_history, errors, url_for('.api_call_store', start_time=start_time, end_time=end_time))
+
+        report_id = report_store.lookup(template_id, start_date, end_date)
+        if report_id:
+            return render_report(report_id)
+
+        job = report_jobs.submit(template_id, start_date, end_date)
+
+        return redirect(url_for('.history_job_result', job_id=job.id))
+    except Exception as e: 
+        print(f"Error: {e}")  
+        return render_template('table.html', error=True, errormessage=e, call_history=[])
+
+
+@views.route('/history/jobs', methods=['POST'])
+def history_job_submit():
+    '''
+    Route to submit a report job, returns the job (id and status)
+    '''
+
+    job = report_jobs.submit(*report_job_parameters())
+
+    return jsonify(job.to_dict()), 202, {'Location': url_for('.history_job_status', job_id=job.id)}
+
+
+@views.route('/history/jobs/<job_id>')
+def history_job_status(job_id):
+    '''
+    Route to check the status of a report job
+    '''
+
+    job = report_jobs.get(job_id)
+    if not job:
+        return jsonify({'error': f'Unknown report job {job_id}'}), 404
+
+    return jsonify(dict(job.to_dict(), result_url=url_for('.history_job_result', job_id=job.id)))
+
+
+@views.route('/history/jobs/<job_id>/result')
+def history_job_result(job_id):
+    '''
+    Route to view the call flows of a report job, shows the job status until the report is ready
+    '''
+    try:
+
+        job = report_jobs.get(job_id)
+        if not job:
+            raise Exception(f'Unknown report job {job_id}')
+        if job.status == 'failed':
+            raise Exception(f'Report job failed: {job.error}')
+        if job.active:
+            return render_template('job.html', hiddenLinks=False, job=job.to_dict())
+
+        return render_report(job.report_id)
     except Exception as e: 
         print(f"Error: {e}")  
         return render_template('table.html', error=True, errormessage=e, call_history=[])
 
 
-@app.route('/latest')
+@views.route('/history/reports/<report_id>')
+def history_report(report_id):
+    '''
+    Route to view the call flows of a report downloaded before (file name in the reports folder without .csv)
+    '''
+    try:
+
+        return render_report(secure_filename(report_id))
+    except Exception as e: 
+        print(f"Error: {e}")  
+        return render_template('table.html', error=True, errormessage=e, call_history=[])
+
+
+@views.route('/latest')
 def latest():
     '''
     Route to view historic call flow data of last 48 h
     '''
     try:
 
-        time_zone_difference = int(os.getenv("TIME_ZONE_DIFF")) 
-        end_date = datetime.now() - timedelta(hours=time_zone_difference, minutes=5)
-        start_date = datetime.now() - timedelta(hours=47+time_zone_difference, minutes=55) 
-        start_date = start_date.strftime("%Y-%m-%dT%H:%M:%S.000Z")
-        end_date = end_date.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        call_history, errors = latest_call_history()
+        if streaming_requested():
+            return stream_call_groups(call_history.items(), errors)
 
-        call_history = webex_api.get_detailed_call_history(start_date, end_date)
+        return render_call_groups(call_history, errors, url_for('.api_latest'))
+    except Exception as e: 
+        print(f"Error: {e}")  
+        return render_template('table.html', error=True, errormessage=e, call_history=[])
 
-        wxcc_dial_numbers, w_queue_numbers, wxcc_user, w_phone_numbers = retrieve_categorization_data()
 
-        report_processor = ReportProcessing(call_history, wxcc_dial_numbers, wxcc_user, w_queue_numbers, w_phone_numbers)
-        final_report_data = report_processor.process_report_data()
+@views.route('/api/latest')
+def api_latest():
+    '''
+    API route to get a page of the call groups of the last 48 h (offset, limit and filter arguments)
+    '''
+    try:
 
-        return render_template('table.html', hiddenLinks=False, call_history=final_report_data)
+        call_history, errors = latest_call_history(refresh=False)
+        if ndjson_requested():
+            return ndjson_call_groups(call_history.items(), errors)
+
+        return call_groups_json(call_history, errors)
     except Exception as e: 
         print(f"Error: {e}")  
-        return render_template('table.html', error=True, errormessage=e, call_history=[])
+        return jsonify({'error': str(e)}), 500
+
+
+@views.route('/api/reports/<report_id>')
+def api_report(report_id):
+    '''
+    API route to get a page of the call groups of a downloaded report (offset, limit and filter arguments)
+    '''
+    try:
 
+        if ndjson_requested():
+            return ndjson_call_groups(*report_call_groups(secure_filename(report_id)))
 
-@app.route('/templates')
+        return call_groups_json(*report_call_history(secure_filename(report_id)))
+    except Exception as e: 
+        print(f"Error: {e}")  
+        return jsonify({'error': str(e)}), 404
+
+
+@views.route('/api/call-store')
+def api_call_store():
+    '''
+    API route to get a page of the call groups of a call store time window (start_time, end_time, offset, limit and filter arguments)
+    '''
+    try:
+
+        start_time, end_time = request.args['start_time'], request.args['end_time']
+        if not call_store.covers(start_time, end_time, max_lag=0):
+            return jsonify({'error': f'Call store does not cover {start_time} - {end_time}'}), 404
+
+        call_history, errors = call_store_call_history(start_time, end_time)
+        if ndjson_requested():
+            return ndjson_call_groups(call_history.items(), errors)
+
+        return call_groups_json(call_history, errors)
+    except Exception as e: 
+        print(f"Error: {e}")  
+        return jsonify({'error': str(e)}), 400
+
+
+def export_call_groups(call_groups, name):
+    '''
+    Streams the call groups matching the request filters as export (?format=csv, ndjson or parquet), one row per
+    call flow entry with the correlation id and the tags in separate columns.
+    '''
+
+    export_format = request.args.get('format', 'csv')
+    if export_format not in exports.EXPORT_FORMATS:
+        return jsonify({'error': f'Unknown export format {export_format}, supported: {", ".join(exports.EXPORT_FORMATS)}'}), 400
+
+    call_filter = CallGroupFilter.from_args(request.args)
+    rows = exports.export_rows((correlation_id, call_group) for correlation_id, call_group in call_groups if call_filter.matches(call_group))
+
+    try:
+        chunks = getattr(exports, f'iter_{export_format}')(rows)
+    except ImportError:
+        return jsonify({'error': f'The {export_format} export requires pyarrow (pip install pyarrow)'}), 501
+
+    return Response(stream_with_context(chunks), mimetype=exports.EXPORT_FORMATS[export_format],
+                    headers={'Content-Disposition': f'attachment; filename={name}.{export_format}'})
+
+
+@views.route('/export/latest')
+def export_latest():
+    '''
+    Route to export the call flows of the last 48 h (format and filter arguments)
+    '''
+    try:
+
+        call_history, _ = latest_call_history(refresh=False)
+        return export_call_groups(call_history.items(), 'latest')
+    except Exception as e: 
+        print(f"Error: {e}")  
+        return jsonify({'error': str(e)}), 500
+
+
+@views.route('/export/reports/<report_id>')
+def export_report(report_id):
+    '''
+    Route to export the call flows of a downloaded report (format and filter arguments)
+    '''
+    try:
+
+        report_id = secure_filename(report_id)
+        call_groups, _ = report_call_groups(report_id)
+        return export_call_groups(call_groups, report_id)
+    except Exception as e: 
+        print(f"Error: {e}")  
+        return jsonify({'error': str(e)}), 404
+
+
+@views.route('/export/call-store')
+def export_call_store():
+    '''
+    Route to export the call flows of a call store time window (start_time, end_time, format and filter arguments)
+    '''
+    try:
+
+        start_time, end_time = request.args['start_time'], request.args['end_time']
+        if not call_store.covers(start_time, end_time, max_lag=0):
+            return jsonify({'error': f'Call store does not cover {start_time} - {end_time}'}), 404
+
+        call_groups = create_report_processor(call_store.iter_calls(start_time, end_time), retrieve_categorization_data()[0]).iter_report_data()
+        return export_call_groups(call_groups, 'call-store')
+    except Exception as e: 
+        print(f"Error: {e}")  
+        return jsonify({'error': str(e)}), 400
+
+
+@views.route('/templates')
 def templates():
     try:
-        templates = wbx_report._get_templates()
+        templates = wbx_report.get()._get_templates()
 
         return render_template('templates.html', hiddenLinks=False, templates=templates)
 
@@ -100,8 +702,48 @@ def templates():
         return render_template('templates.html', error=True, errormessage=e)
 
 
+@views.route('/cache')
+def cache_stats():
+    '''
+    Route to view the hit/miss counters and ages of the cached directories and the size of the report store
+    '''
+
+    return jsonify(dict(directory_cache.stats(), report_store=report_store.stats()))
+
+
+@views.route('/metrics')
+def prometheus_metrics():
+    '''
+    Route to scrape the metrics of all workers in the Prometheus text format
+    '''
+
+    return Response(metrics.render(shared_cache), mimetype='text/plain; version=0.0.4')
+
+
+@views.route('/cache/invalidate', methods=['POST'])
+def cache_invalidate():
+    '''
+    Route to invalidate all cached directories or a single one (?directory=<name>)
+    '''
+
+    directory_cache.invalidate(request.args.get('directory'))
+
+    return jsonify(directory_cache.stats())
+
+
+def create_app(config=None):
+    '''
+    Creates the Flask app (app factory used by python app.py, flask run and the WSGI server, see wsgi.py).
+    The caches and API clients are shared by the apps of a process, the API clients are created on first use.
+    '''
+
+    app = Flask(__name__)
+    app.config.from_mapping(config or {})
+    app.register_blueprint(views)
+
+    return app
+
+
 if __name__ == "__main__":
-    webex_api = WebexAPI()
-    wbx_report = Webex_Reports(webex_api)
-    webex_cc_api = WebexContactCenterAPI()
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # Development server, use a WSGI server (gunicorn -c gunicorn.conf.py wsgi:app) in production
+    create_app().run(host='0.0.0.0', port=5000, debug=os.getenv("FLASK_DEBUG", "false").lower() == "true")
\ No newline at end of file
@@ -0,0 +1,97 @@
+""" Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+           https://developer.cisco.com/docs/licenses
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+'''
+Benchmark of the pure Python ReportProcessing against the pandas DataFrameReportProcessing.
+Both backends process the same csv report, read with CSVReader.iter_csv respectively DataFrameReportProcessing.read_report,
+and must return the same call history, also for the edge cases of an empty window and a window of notifications only.
+
+Usage: python benchmarks/bench_backends.py [rows ...]
+'''
+
+import csv
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from csv_reader import CSVReader
+from report_processing import ReportProcessing
+from report_processing_pandas import DataFrameReportProcessing
+from synthetic_data import generate_call_history, generate_directories
+
+ROW_COUNTS = (10000, 100000, 1000000)
+
+
+def write_report(filename, call_history):
+    '''
+    Writes synthetic call history entries as csv report.
+    '''
+
+    with open(filename, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=list(call_history[0]))
+        writer.writeheader()
+        writer.writerows(call_history)
+
+
+def check_edge_cases(directories):
+    '''
+    Checks that both backends return the same call history for windows without processable entries.
+    '''
+
+    call_history = generate_call_history(8)
+    notifications = [dict(call_entry, **{'Related reason': 'PushNotificationRetrieval'}) for call_entry in call_history]
+    edge_cases = {
+        'empty window': [],
+        'notifications only': notifications,
+        'one notification': notifications[:1],
+        'notifications and entries': notifications + call_history,
+    }
+
+    for name, call_entries in edge_cases.items():
+        results = [backend([dict(call_entry) for call_entry in call_entries], *directories).process_report_data() for backend in (ReportProcessing, DataFrameReportProcessing)]
+        assert results[0] == results[1], f"Backends differ for {name}"
+
+    print(f"Backends match for: {', '.join(edge_cases)}")
+
+
+def main():
+    row_counts = [int(rows) for rows in sys.argv[1:]] or ROW_COUNTS
+    wxcc_dial_numbers, w_queue_numbers, wxcc_user, w_phone_numbers = generate_directories(dial_numbers=20000, users=8000, phone_numbers=20000)
+    check_edge_cases((wxcc_dial_numbers, wxcc_user, w_queue_numbers, w_phone_numbers))
+    backends = (
+        (ReportProcessing, CSVReader.iter_csv),
+        (DataFrameReportProcessing, DataFrameReportProcessing.read_report),
+    )
+
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in row_counts:
+            filename = os.path.join(directory, f'{rows}.csv')
+            write_report(filename, generate_call_history(rows, number_space=60000, users=8000))
+
+            results = []
+            for backend, read_report in backends:
+                start = time.perf_counter()
+                results.append(backend(read_report(filename), wxcc_dial_numbers, wxcc_user, w_queue_numbers, w_phone_numbers).process_report_data())
+                elapsed = time.perf_counter() - start
+
+                print(f"{backend.__name__:>26} {rows:>8} rows: {elapsed:.3f} s ({rows / elapsed:,.0f} rows/s)")
+
+            assert results[0] == results[1], f"Backends differ for {rows} rows"
+            results.clear()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+""" Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+           https://developer.cisco.com/docs/licenses
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+'''
+Benchmark of the SQLite call store: insert rate (batched, idempotent inserts) and query latency of the
+indexed lookups at the given number of stored records (default 10M). The records are generated and inserted
+in chunks, so the memory usage stays constant.
+
+Usage: python benchmarks/bench_call_store.py [rows]
+'''
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from call_store import CallStore
+from synthetic_data import generate_call_history, number
+
+CHUNK = 100000
+START = datetime(2024, 1, 1)
+STEP_SECONDS = 0.25
+
+
+def call_history_chunk(offset, rows):
+    '''
+    Generates a chunk of call records with unique Call IDs, continuing the start times and correlation ids at offset.
+    '''
+
+    call_history = generate_call_history(rows, number_space=60000, users=8000, seed=offset, start=START + timedelta(seconds=offset * STEP_SECONDS), step_seconds=STEP_SECONDS)
+    for index, call_entry in enumerate(call_history, offset):
+        call_entry['Call ID'] = f"call-{index}"
+        call_entry['Local SessionID'] = f"session-{index}"
+        call_entry['Correlation ID'] = f"corr-{index // 4}"
+
+    return call_history
+
+
+def timed_query(call_store, statement, parameters, repeats=20):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = call_store._connection().execute(statement, parameters).fetchall()
+    return (time.perf_counter() - start) / repeats, len(result)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000000
+
+    with tempfile.TemporaryDirectory() as directory:
+        call_store = CallStore(os.path.join(directory, 'calls.db'))
+
+        insert_time = 0
+        for offset in range(0, rows, CHUNK):
+            call_history = call_history_chunk(offset, min(CHUNK, rows - offset))
+            start = time.perf_counter()
+            call_store.insert(call_history)
+            insert_time += time.perf_counter() - start
+
+        print(f"{rows:,} records inserted in {insert_time:.1f} s ({rows / insert_time:,.0f} records/s), "
+              f"database {os.path.getsize(os.path.join(directory, 'calls.db')) / 1024 ** 2:,.0f} MiB")
+
+        call_history = call_history_chunk(rows - CHUNK, CHUNK)
+        start = time.perf_counter()
+        inserted = call_store.insert(call_history)
+        print(f"{CHUNK:,} records inserted again (idempotent, {inserted} new) in {time.perf_counter() - start:.1f} s")
+
+        middle = START + timedelta(seconds=rows * STEP_SECONDS / 2)
+        window_start = middle.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        window_end = (middle + timedelta(hours=1)).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+        queries = (
+            ('correlation id', "SELECT * FROM calls WHERE correlation_id = ?", (f"corr-{rows // 8}",)),
+            ('user uuid (count)', "SELECT COUNT(*) FROM calls WHERE user_uuid = ?", ("user-42",)),
+            ('calling number (count)', "SELECT COUNT(*) FROM calls WHERE calling_number = ?", (number(4242),)),
+            ('called number (count)', "SELECT COUNT(*) FROM calls WHERE called_number = ?", (number(4242),)),
+            ('1 h window', "SELECT * FROM calls WHERE start_time >= ? AND start_time < ? ORDER BY start_time, rowid", (window_start, window_end)),
+        )
+        for name, statement, parameters in queries:
+            duration, result_rows = timed_query(call_store, statement, parameters)
+            print(f"{name:>24}: {duration * 1000:8.2f} ms ({result_rows} rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+""" Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+           https://developer.cisco.com/docs/licenses
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+'''
+Benchmark of ReportProcessing.categorize_entries for a growing number of report rows.
+The time per row stays constant as the categorization is based on hash lookups.
+
+Usage: python benchmarks/bench_categorization.py
+'''
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from report_processing import ReportProcessing
+from synthetic_data import generate_call_history, generate_directories
+
+ROW_COUNTS = (10000, 50000, 100000, 400000)
+
+
+def main():
+    wxcc_dial_numbers, w_queue_numbers, wxcc_user, w_phone_numbers = generate_directories(dial_numbers=20000, users=8000, phone_numbers=20000)
+
+    start = time.perf_counter()
+    report_processor = ReportProcessing([], wxcc_dial_numbers, wxcc_user, w_queue_numbers, w_phone_numbers)
+    print(f"Index build: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    for rows in ROW_COUNTS:
+        call_history = report_processor.sort_based_on_correlation_id(generate_call_history(rows, number_space=60000, users=8000))
+
+        start = time.perf_counter()
+        report_processor.categorize_entries(call_history)
+        elapsed = time.perf_counter() - start
+
+        print(f"{rows:>8} rows: {elapsed:.3f} s ({elapsed / rows * 1e6:.2f} us/row)")
+
+
+if __name__ == "__main__":
+    main()
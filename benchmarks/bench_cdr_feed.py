@@ -0,0 +1,57 @@
+""" Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+           https://developer.cisco.com/docs/licenses
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+'''
+Benchmark of WebexAPI.get_detailed_call_history against the local stub API for a 48h window,
+sequential pagination compared to parallel time slices.
+
+Usage: python benchmarks/bench_cdr_feed.py [records]
+'''
+
+import os
+import sys
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from stub_webex_api import StubWebexAPI, WINDOW_START, WINDOW_HOURS
+from webex import WebexAPI
+from webex_transport import WebexTransport
+
+TIME_SLICES = (1, 4, 8, 16)
+
+
+def main():
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    server = StubWebexAPI(('localhost', 0), records=records).start()
+    os.environ["WEBEX_ANALYTICS_URL"] = server.url
+
+    start_time = WINDOW_START.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    end_time = (WINDOW_START + timedelta(hours=WINDOW_HOURS)).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+    for time_slices in TIME_SLICES:
+        webex_api = WebexAPI(transport=WebexTransport(rate=1000))
+
+        start = time.perf_counter()
+        call_history = webex_api.get_detailed_call_history(start_time, end_time, time_slices=time_slices, max_workers=time_slices)
+        elapsed = time.perf_counter() - start
+
+        assert [call_entry['Start time'] for call_entry in call_history] == server.start_times
+        print(f"{time_slices:>3} time slices: {len(call_history)} records in {elapsed:.2f} s ({len(call_history) / elapsed:,.0f} records/s)")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+""" Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+           https://developer.cisco.com/docs/licenses
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+'''
+Loads all directories page by page from the local stub API into the categorization lookups
+and checks that no number is missing.
+
+Usage: python benchmarks/bench_directories.py [numbers]
+'''
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from categorization_index import (CategorizationIndex, number_lookup, webex_number_lookup, wxcc_user_lookup,
+                                  WXCC_DIAL_NUMBER_TAG, WEBEX_CALL_QUEUE_TAG)
+from stub_webex_api import StubWebexAPI
+from webex import WebexAPI
+from webex_contact_center import WebexContactCenterAPI
+from webex_transport import WebexTransport
+
+
+def main():
+    numbers = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    server = StubWebexAPI(('localhost', 0), records=0, numbers=numbers, latency=0.02).start()
+    os.environ["WEBEX_API_URL"] = server.url
+    os.environ["WXCC_API_URL"] = server.root_url
+
+    transport = WebexTransport(rate=1000)
+    webex_api = WebexAPI(transport=transport)
+    webex_cc_api = WebexContactCenterAPI(transport=transport)
+
+    loaders = {
+        'wxcc_dial_numbers': lambda: number_lookup(webex_cc_api.iter_dial_numbers(), "dialledNumber", WXCC_DIAL_NUMBER_TAG),
+        'w_queue_numbers': lambda: number_lookup(webex_api.iter_call_queues(), "phoneNumber", WEBEX_CALL_QUEUE_TAG),
+        'wxcc_user': lambda: wxcc_user_lookup(webex_cc_api.iter_users()),
+        'w_phone_numbers': lambda: webex_number_lookup(webex_api.iter_phone_numbers()),
+    }
+
+    lookups = {}
+    for name, loader in loaders.items():
+        start = time.perf_counter()
+        lookups[name] = loader()
+        print(f"{name:>18}: {len(lookups[name]):>7} entries in {time.perf_counter() - start:.2f} s")
+
+    categorization_index = CategorizationIndex(lookups['wxcc_dial_numbers'], lookups['wxcc_user'], lookups['w_queue_numbers'], lookups['w_phone_numbers'])
+    assert len(categorization_index.number_tags) == len(server.wxcc_dial_numbers) + len(server.w_queue_numbers) + len(server.w_phone_numbers)
+    assert len(categorization_index.user_tags) == len(server.wxcc_user)
+    print(f"Categorization index: {len(categorization_index.number_tags)} numbers, {len(categorization_index.user_tags)} users")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
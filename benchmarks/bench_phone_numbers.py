@@ -0,0 +1,74 @@
+""" Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+           https://developer.cisco.com/docs/licenses
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+'''
+Microbenchmark of the number matching: exact lookups of the raw CDR numbers against normalize_number + lookup,
+with a cold and a warm normalization cache. The CDR numbers use mixed formats (E.164, national, formatted,
+00 prefix, without "+", with extension) of the directory numbers, repeated like in a call history.
+
+Usage: python benchmarks/bench_phone_numbers.py [lookups]
+'''
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from categorization_index import number_lookup, WXCC_DIAL_NUMBER_TAG
+from phone_numbers import normalize_number, _normalize_formatted_number
+from synthetic_data import number
+
+DIRECTORY_NUMBERS = 20000
+DISTINCT_NUMBERS = 60000
+LOOKUPS = 1000000
+
+FORMATS = (
+    lambda e164: e164,
+    lambda e164: e164[2:],
+    lambda e164: e164[1:],
+    lambda e164: f"00{e164[1:]}",
+    lambda e164: f"+1 ({e164[2:5]}) {e164[5:8]}-{e164[8:]}",
+    lambda e164: f"{e164} x{e164[-3:]}",
+)
+
+
+def measure(name, lookups, match):
+    start = time.perf_counter()
+    matches = sum(1 for cdr_number in lookups if match(cdr_number))
+    elapsed = time.perf_counter() - start
+
+    print(f"{name:<32} {len(lookups) / elapsed / 1e6:6.2f} M lookups/s  {matches / len(lookups):6.1%} matched")
+
+
+def main():
+    lookup_count = int(sys.argv[1]) if len(sys.argv) > 1 else LOOKUPS
+    rng = random.Random(1)
+
+    directory = number_lookup(({"dialledNumber": number(i)} for i in range(DIRECTORY_NUMBERS)), "dialledNumber", WXCC_DIAL_NUMBER_TAG)
+    distinct_numbers = [rng.choice(FORMATS)(number(rng.randrange(DISTINCT_NUMBERS))) for _ in range(DISTINCT_NUMBERS)]
+    lookups = [rng.choice(distinct_numbers) for _ in range(lookup_count)]
+
+    print(f"{DIRECTORY_NUMBERS} directory numbers, {lookup_count} lookups of {DISTINCT_NUMBERS} distinct CDR numbers")
+
+    measure("exact lookup (raw number)", lookups, lambda cdr_number: cdr_number in directory)
+
+    _normalize_formatted_number.cache_clear()
+    measure("normalize + lookup (cold cache)", lookups, lambda cdr_number: normalize_number(cdr_number) in directory)
+    measure("normalize + lookup (warm cache)", lookups, lambda cdr_number: normalize_number(cdr_number) in directory)
+    print(_normalize_formatted_number.cache_info())
+
+
+if __name__ == "__main__":
+    main()
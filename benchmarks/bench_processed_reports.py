@@ -0,0 +1,69 @@
+""" Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+           https://developer.cisco.com/docs/licenses
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+'''
+Benchmark of processing a csv report against loading its processed report artifact
+(ProcessedReportCache): opening the artifact, reading a single call group and reading all call groups.
+
+Usage: python benchmarks/bench_processed_reports.py [rows ...]
+'''
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bench_backends import write_report
+from categorization_index import CategorizationIndex
+from csv_reader import CSVReader
+from processed_reports import ProcessedReportCache
+from report_processing import ReportProcessing
+from synthetic_data import generate_call_history, generate_directories
+
+ROW_COUNTS = (10000, 100000, 1000000)
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def main():
+    row_counts = [int(rows) for rows in sys.argv[1:]] or ROW_COUNTS
+    wxcc_dial_numbers, w_queue_numbers, wxcc_user, w_phone_numbers = generate_directories(dial_numbers=20000, users=8000, phone_numbers=20000)
+    categorization_index = CategorizationIndex.from_directories(wxcc_dial_numbers, wxcc_user, w_queue_numbers, w_phone_numbers)
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ProcessedReportCache(os.path.join(directory, 'processed'))
+
+        for rows in row_counts:
+            filename = os.path.join(directory, f'{rows}.csv')
+            write_report(filename, generate_call_history(rows, number_space=60000, users=8000))
+
+            def process_report():
+                return ReportProcessing(CSVReader.iter_csv(filename), categorization_index=categorization_index).process_report_data()
+
+            _, processing = timed(lambda: cache.get_or_process(filename, 'directories', process_report))
+            report, opening = timed(lambda: cache.get_or_process(filename, 'directories', process_report))
+            _, first_group = timed(lambda: report[next(iter(report))])
+            _, all_groups = timed(lambda: sum(len(call_group) for call_group in report.values()))
+
+            print(f"{rows:>8} rows: processing {processing:.3f} s, artifact open {opening * 1000:.1f} ms, "
+                  f"first group {first_group * 1000:.2f} ms, all groups {all_groups:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+""" Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+           https://developer.cisco.com/docs/licenses
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+'''
+Benchmark of the report download against a local report server with a limited bandwidth: streamed download
+(gzip, dropped connection restarted or resumed with a range request, server without range support) and the report
+processing after the download compared to the processing while downloading.
+
+Usage: python benchmarks/bench_report_download.py [rows] [bandwidth in MB/s]
+'''
+
+import csv
+import gzip
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from csv_reader import CSVReader
+from report_processing import ReportProcessing
+from synthetic_data import generate_call_history, generate_directories
+from webex import WebexAPI
+from webex_reports import Webex_Reports
+from webex_transport import WebexTransport
+
+ROWS = 200000
+BANDWIDTH = 2
+
+
+class ReportServer(ThreadingHTTPServer):
+    '''
+    Serves a report (gzip compressed on request, with range support) with a limited bandwidth. Optionally, the
+    first response is dropped after drop_after bytes.
+    '''
+
+    def __init__(self, report, bandwidth, compress=True, drop_after=None, ranges=True):
+        super().__init__(('127.0.0.1', 0), ReportHandler)
+        self.report = report
+        self.compressed_report = gzip.compress(report, compresslevel=5) if compress else None
+        self.bandwidth = bandwidth * 1024 * 1024
+        self.drop_after = drop_after
+        self.ranges = ranges
+        self.requests = []
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/report.csv'
+
+
+class ReportHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+
+    def do_GET(self):
+        server = self.server
+        range_header = self.headers.get('Range')
+        server.requests.append(range_header or self.headers.get('Accept-Encoding'))
+
+        if range_header and server.ranges:
+            start = int(range_header.split('=')[1].rstrip('-'))
+            body = memoryview(server.report)[start:]
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{len(server.report) - 1}/{len(server.report)}')
+        elif server.compressed_report and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = server.compressed_report
+            self.send_response(200)
+            self.send_header('Content-Encoding', 'gzip')
+        else:
+            body = server.report
+            self.send_response(200)
+
+        self.send_header('Content-Type', 'text/csv')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        drop_after, server.drop_after = server.drop_after, None
+        sent = 0
+        for offset in range(0, len(body), 65536):
+            if drop_after is not None and sent >= drop_after:
+                self.close_connection = True
+                return
+            block = body[offset:offset + 65536]
+            self.wfile.write(block)
+            sent += len(block)
+            time.sleep(len(block) / server.bandwidth)
+
+
+def report_bytes(rows):
+    '''
+    Returns a synthetic report as csv bytes.
+    '''
+
+    call_history = generate_call_history(rows, number_space=60000, users=8000)
+    text = io.StringIO()
+    writer = csv.DictWriter(text, fieldnames=list(call_history[0]))
+    writer.writeheader()
+    writer.writerows(call_history)
+
+    return text.getvalue().encode('utf-8')
+
+
+def download(server, directory, process_rows=None, trace=False):
+    '''
+    Downloads the report of the server with Webex_Reports._download_report, returns the report path,
+    the duration and the peak of the traced memory (if traced, tracing slows down the processing).
+    '''
+
+    reports = Webex_Reports(WebexAPI(WebexTransport(rate=1000)))
+    report_id = f'bench-{len(server.requests)}-{time.monotonic_ns()}'
+
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        assert reports._download_report(server.url, report_id, process_rows=process_rows)
+    finally:
+        os.chdir(cwd)
+    elapsed = time.perf_counter() - start
+    peak = None
+    if trace:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return Path(directory) / 'reports' / f'{report_id}.csv', elapsed, peak
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+    bandwidth = float(sys.argv[2]) if len(sys.argv) > 2 else BANDWIDTH
+    report = report_bytes(rows)
+    wxcc_dial_numbers, w_queue_numbers, wxcc_user, w_phone_numbers = generate_directories(dial_numbers=20000, users=8000, phone_numbers=20000)
+
+    def process(rows):
+        return ReportProcessing(rows, wxcc_dial_numbers, wxcc_user, w_queue_numbers, w_phone_numbers).process_report_data()
+
+    print(f"Report: {rows} rows, {len(report) / 1e6:.1f} MB ({len(gzip.compress(report, compresslevel=5)) / 1e6:.1f} MB gzip), {bandwidth} MB/s")
+
+    with tempfile.TemporaryDirectory() as directory:
+        (Path(directory) / 'reports').mkdir()
+
+        for name, server in (('gzip', ReportServer(report, bandwidth)),
+                             ('identity', ReportServer(report, bandwidth, compress=False)),
+                             ('gzip, dropped at 40 %, compressed restart', ReportServer(report, bandwidth, drop_after=len(gzip.compress(report, compresslevel=5)) * 2 // 5)),
+                             ('gzip, dropped at 90 %, range resume', ReportServer(report, bandwidth, drop_after=len(gzip.compress(report, compresslevel=5)) * 9 // 10)),
+                             ('identity, dropped at 40 %, no range support', ReportServer(report, bandwidth, compress=False, drop_after=len(report) * 2 // 5, ranges=False))):
+            path, elapsed, peak = download(server, directory, trace=True)
+            assert path.read_bytes() == report
+            print(f"Download ({name}): {elapsed:.2f} s, peak traced memory {peak / 1e6:.1f} MB, requests {server.requests}")
+
+        server = ReportServer(report, bandwidth)
+        path, download_time, _ = download(server, directory)
+        start = time.perf_counter()
+        report_data = process(CSVReader.iter_csv(path))
+        print(f"Download, then processing: {download_time + time.perf_counter() - start:.2f} s")
+
+        results = {}
+        server = ReportServer(report, bandwidth)
+        _, elapsed, _ = download(server, directory, process_rows=lambda report_path, rows: results.update(report_data=process(rows)))
+        assert results['report_data'] == report_data
+        print(f"Processing while downloading: {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+""" Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+           https://developer.cisco.com/docs/licenses
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+'''
+Compares the report wait time (report creation until the download URL is known) of the former fixed
+30 second polling with the adaptive polling of Webex_Reports._check_on_report on a simulated report service.
+The simulation runs on a virtual clock, so it finishes instantly.
+
+Usage: python benchmarks/bench_report_polling.py
+'''
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import webex_reports
+from webex_reports import Webex_Reports
+
+# Report generation times in seconds of the simulated report service
+GENERATION_TIMES = (5, 12, 40, 95, 240, 600)
+REPEATS = 5
+
+
+class VirtualClock():
+    '''
+    Replaces the time module of webex_reports, sleeping only advances the clock.
+    '''
+
+    def __init__(self):
+        self.now = 0.0
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+class SimulatedReportService():
+    '''
+    Webex API stub whose reports are done a fixed generation time after their creation.
+    '''
+
+    def __init__(self, clock, generation_time):
+        self.clock = clock
+        self.generation_time = generation_time
+        self.created = {}
+        self.status_checks = 0
+
+    def create_report(self, template_id, start_date, end_date):
+        report_id = str(len(self.created))
+        self.created[report_id] = self.clock.now
+        return {'Id': report_id}
+
+    def get_report(self, id):
+        self.status_checks += 1
+        done = self.clock.now - self.created[id] >= self.generation_time
+        return [{'status': 'done' if done else 'In progress', 'downloadURL': f'https://example.com/{id}' if done else ''}]
+
+
+def fixed_interval_check_on_report(webex_api, id):
+    '''
+    The former polling: check, then sleep 30 seconds, until the report is done.
+    '''
+
+    report_status = 'not done'
+    while report_status != 'done':
+        report_status = webex_api.get_report(id)[0]['status']
+        webex_reports.time.sleep(30)
+
+
+def main():
+    clock = VirtualClock()
+    webex_reports.time = clock
+    webex_reports.print = lambda *args, **kwargs: None
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ["REPORT_POLL_HISTORY"] = os.path.join(directory, 'poll_history.json')
+
+        print(f"{'generation':>10} {'fixed 30 s':>12} {'adaptive (1st)':>15} {'adaptive (avg)':>15} {'checks':>7}")
+        for generation_time in GENERATION_TIMES:
+            service = SimulatedReportService(clock, generation_time)
+            report_id = service.create_report(1, '2024-01-01', '2024-01-31')['Id']
+            start = clock.now
+            fixed_interval_check_on_report(service, report_id)
+            fixed = clock.now - start
+
+            service = SimulatedReportService(clock, generation_time)
+            wbx_report = Webex_Reports(service)
+            adaptive = []
+            for _ in range(REPEATS):
+                report_id = wbx_report._report_creation(generation_time, '2024-01-01', '2024-01-31')
+                start = clock.now
+                wbx_report._check_on_report(report_id, generation_time, '2024-01-01', '2024-01-31')
+                adaptive.append(clock.now - start)
+
+            print(f"{generation_time:>9}s {fixed:>11.0f}s {adaptive[0]:>14.0f}s {sum(adaptive) / REPEATS:>14.1f}s {service.status_checks / REPEATS:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
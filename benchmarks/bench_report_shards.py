@@ -0,0 +1,155 @@
+""" Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+           https://developer.cisco.com/docs/licenses
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+'''
+End-to-end benchmark of a 28 day report request (create, poll, download, delete and merge via ReportStore and
+Webex_Reports) against a simulated report service: one report for the whole window compared to day and week
+shards generated concurrently. The merged reports are processed and compared with the processed call history,
+including the call groups spanning the shard boundaries.
+
+The report service generates a report in GENERATION_BASE + GENERATION_PER_DAY seconds per day and generates at
+most SERVICE_CAPACITY reports at once. The service time is scaled by TIME_SCALE (1 service minute = 0.5 s).
+
+Usage: python benchmarks/bench_report_shards.py
+'''
+
+import contextlib
+import csv
+import io
+import itertools
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from csv_reader import CSVReader
+from report_processing import ReportProcessing
+from report_store import ReportStore
+from synthetic_data import generate_call_history, generate_directories
+from webex_reports import Webex_Reports
+
+DAYS = 28
+START_DATE, END_DATE = '2024-01-01', '2024-01-28'
+GENERATION_BASE = 60
+GENERATION_PER_DAY = 60
+SERVICE_CAPACITY = 8
+TIME_SCALE = 0.5 / 60
+
+# (days per shard, concurrency) of the compared configurations
+CONFIGURATIONS = ((0, 1), (7, 4), (1, 4), (1, 8))
+
+
+class SimulatedReportService():
+    '''
+    Webex API stub of the report service, serving the reports of a synthetic call history.
+    '''
+
+    def __init__(self, call_history):
+        self.ids = itertools.count(1)
+        self.reports = {}
+        self.capacity = threading.BoundedSemaphore(SERVICE_CAPACITY)
+        self.lock = threading.Lock()
+
+        self.header = list(call_history[0])
+        self.rows_by_day = {}
+        for call_entry in call_history:
+            text = io.StringIO()
+            csv.writer(text).writerow(call_entry.values())
+            self.rows_by_day.setdefault(call_entry['Start time'][:10], []).append(text.getvalue())
+
+
+    def create_report(self, template_id, start_date, end_date):
+        with self.lock:
+            report_id = next(self.ids)
+            self.reports[report_id] = {'start_date': start_date, 'end_date': end_date, 'status': 'inProgress'}
+
+        days = (datetime.fromisoformat(end_date) - datetime.fromisoformat(start_date)).days + 1
+        threading.Thread(target=self._generate, args=(report_id, days), daemon=True).start()
+
+        return {'Id': report_id}
+
+
+    def _generate(self, report_id, days):
+        with self.capacity:
+            time.sleep((GENERATION_BASE + GENERATION_PER_DAY * days) * TIME_SCALE)
+        self.reports[report_id]['status'] = 'done'
+
+
+    def get_report(self, id):
+        return [{'status': self.reports[id]['status'], 'downloadURL': f'simulated://reports/{id}'}]
+
+
+    def download_report(self, url, file):
+        report = self.reports[int(url.rsplit('/', 1)[1])]
+        text = io.StringIO()
+        csv.writer(text).writerow(self.header)
+        file.write(text.getvalue().encode('utf-8'))
+
+        for day, rows in sorted(self.rows_by_day.items()):
+            if report['start_date'] <= day <= report['end_date']:
+                file.write("".join(rows).encode('utf-8'))
+
+
+    def delete_report(self, id):
+        pass
+
+
+def main():
+    # Groups of 4 entries, 29 seconds apart, some groups span midnight
+    call_history = generate_call_history(DAYS * 86400 // 29, number_space=60000, users=8000, step_seconds=29)
+    spanning_groups = {call_entry['Correlation ID'] for call_entry in call_history} - \
+        {correlation_id for correlation_id, day_entries in itertools.groupby(call_history, key=lambda call_entry: call_entry['Correlation ID'])
+         if len({call_entry['Start time'][:10] for call_entry in day_entries}) == 1}
+    directories = generate_directories(dial_numbers=20000, users=8000, phone_numbers=20000)
+    wxcc_dial_numbers, w_queue_numbers, wxcc_user, w_phone_numbers = directories
+
+    def process(call_history):
+        return ReportProcessing(call_history, wxcc_dial_numbers, wxcc_user, w_queue_numbers, w_phone_numbers).process_report_data()
+
+    expected = process([dict(call_entry) for call_entry in call_history])
+    print(f"{DAYS} days, {len(call_history)} rows, {len(expected)} call groups ({len(spanning_groups)} spanning midnight), "
+          f"service: {GENERATION_BASE} s + {GENERATION_PER_DAY} s per day, {SERVICE_CAPACITY} reports at once")
+
+    cwd = os.getcwd()
+    baseline = None
+    for shard_days, concurrency in CONFIGURATIONS:
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                os.mkdir('reports')
+                service = SimulatedReportService(call_history)
+                reports = Webex_Reports(service)
+                reports.poll_initial_interval, reports.poll_max_interval = 0.01, 0.05
+                report_store = ReportStore(lambda template_id, start_date, end_date, served_directly=True: reports.report_workflow(template_id, start_date, end_date),
+                                           shard_days=shard_days, shard_concurrency=concurrency)
+
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    report_id = report_store.get_report(1, START_DATE, END_DATE)
+                elapsed = time.perf_counter() - start
+
+                assert process(CSVReader.iter_csv(f'reports/{report_id}.csv')) == expected
+            finally:
+                os.chdir(cwd)
+
+        baseline = baseline or elapsed
+        name = f"{shard_days} day shards, concurrency {concurrency}" if shard_days else "one report"
+        print(f"{name:<34} {elapsed:6.2f} s ({baseline / elapsed:.1f}x), {next(service.ids) - 1} reports, merged call groups match")
+
+
+if __name__ == "__main__":
+    main()
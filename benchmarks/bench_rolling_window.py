@@ -0,0 +1,78 @@
+""" Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+           https://developer.cisco.com/docs/licenses
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+'''
+Benchmark of the /latest refresh: processing the whole 48 h window from scratch against the incremental
+RollingCallWindow, refreshed every minute on a simulated CDR feed. The results of both are compared.
+
+Usage: python benchmarks/bench_rolling_window.py [seconds between records]
+'''
+
+import bisect
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import rolling_window
+from categorization_index import CategorizationIndex
+from report_processing import ReportProcessing
+from rolling_window import RollingCallWindow
+from synthetic_data import generate_call_history, generate_directories
+
+WINDOW = timedelta(hours=48)
+REFRESHES = 10
+
+
+def main():
+    step_seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 1
+    start = datetime(2024, 1, 1)
+    rows = int((WINDOW + timedelta(minutes=REFRESHES)).total_seconds() / step_seconds)
+    call_history = generate_call_history(rows, number_space=60000, users=8000, start=start, step_seconds=step_seconds)
+    start_times = [call_entry['Start time'] for call_entry in call_history]
+
+    wxcc_dial_numbers, w_queue_numbers, wxcc_user, w_phone_numbers = generate_directories(dial_numbers=20000, users=8000, phone_numbers=20000)
+    categorization_index = CategorizationIndex.from_directories(wxcc_dial_numbers, wxcc_user, w_queue_numbers, w_phone_numbers)
+    categorization_index.fingerprint = 'directories'
+
+    def fetch_call_history(start_time, end_time):
+        return [dict(call_entry) for call_entry in call_history[bisect.bisect_left(start_times, start_time):bisect.bisect_left(start_times, end_time)]]
+
+    rolling_window.print = lambda *args, **kwargs: None
+    window = RollingCallWindow(fetch_call_history, overlap=300)
+    full_durations, incremental_durations = [], []
+
+    for refresh in range(REFRESHES + 1):
+        end = start + WINDOW + timedelta(minutes=refresh)
+        start_time, end_time = RollingCallWindow._format(end - WINDOW), RollingCallWindow._format(end)
+
+        begin = time.perf_counter()
+        full = ReportProcessing(fetch_call_history(start_time, end_time), categorization_index=categorization_index).process_report_data()
+        full_durations.append(time.perf_counter() - begin)
+
+        begin = time.perf_counter()
+        incremental = window.refresh(start_time, end_time, categorization_index)
+        incremental_durations.append(time.perf_counter() - begin)
+
+        assert list(full.items()) == list(incremental.items()), f"Results differ after refresh {refresh}"
+
+    print(f"{len(start_times[:int(WINDOW.total_seconds() / step_seconds)]):,} records in the window, {60 / step_seconds:.0f} new records per refresh")
+    print(f"from scratch:        {sum(full_durations[1:]) / REFRESHES * 1000:8.1f} ms per refresh")
+    print(f"initial load:        {incremental_durations[0] * 1000:8.1f} ms")
+    print(f"incremental refresh: {sum(incremental_durations[1:]) / REFRESHES * 1000:8.1f} ms per refresh")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+""" Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+           https://developer.cisco.com/docs/licenses
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+'''
+Benchmark suite of the report pipeline on a synthetic report (iter_realistic_call_history) and matching directory
+fixtures: csv parsing, building the categorization index, the processing per backend (with the throughput of every
+stage, from the stage metrics), streaming and the csv export. Every benchmark runs in a new process, its peak memory
+is the increase of the peak resident memory over the memory after loading the fixtures.
+
+The results are written to benchmarks/results/<time>.json. With --baseline, the results are compared with an earlier
+run: a lower throughput or higher peak memory than the tolerance is reported as regression (exit code 1).
+
+Usage: python benchmarks/run_benchmarks.py [--rows 200000] [--backends python,pandas] [--repeat 3]
+                                           [--fixtures DIRECTORY] [--baseline FILE] [--save-baseline FILE]
+'''
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIRECTORY, '..'))
+
+from synthetic_data import generate_directories, iter_realistic_call_history, read_directories, write_directories, write_report
+
+ROWS = 200000
+REPEAT = 3
+# Directory sizes of a large deployment
+DIRECTORY_SIZES = {'dial_numbers': 20000, 'queue_numbers': 2000, 'users': 8000, 'phone_numbers': 20000}
+
+# Allowed throughput decrease and peak memory increase against the baseline
+TOLERANCE = 0.15
+MEMORY_TOLERANCE = 0.20
+# Peak memory differences below are noise
+MEMORY_NOISE = 8 * 1024 * 1024
+
+REPORT_FILE = 'report.csv'
+
+
+def benchmarks(backends):
+    '''
+    Returns the names of the benchmarks: csv parsing and the processing per backend, the backend independent ones once.
+    '''
+
+    names = [f'csv_parse[{backend}]' for backend in backends]
+    names.append('categorization_index')
+    names += [f'process[{backend}]' for backend in backends]
+    if 'python' in backends:
+        names += ['stream[python]', 'export_csv']
+
+    return names
+
+
+def run_benchmark(name, fixtures, repeat):
+    '''
+    Runs a benchmark repeat times (in a new process) and returns its durations, the number of processed items,
+    the increase of the peak memory during the first run and the duration of the pipeline stages.
+    '''
+
+    from categorization_index import CategorizationIndex
+    from csv_reader import CSVReader
+    from metrics import memory_usage, metrics, peak_memory
+    from report_processing import ReportProcessing
+    from report_processing_pandas import DataFrameReportProcessing
+    import exports
+
+    report_path = os.path.join(fixtures, REPORT_FILE)
+    wxcc_dial_numbers, w_queue_numbers, wxcc_user, w_phone_numbers = read_directories(fixtures)
+
+    def categorization_index():
+        return CategorizationIndex.from_directories(wxcc_dial_numbers, wxcc_user, w_queue_numbers, w_phone_numbers)
+
+    if name == 'categorization_index':
+        def run():
+            categorization_index()
+            return len(wxcc_dial_numbers) + len(w_queue_numbers) + len(wxcc_user) + len(w_phone_numbers)
+    elif name == 'csv_parse[python]':
+        def run():
+            return sum(1 for _ in CSVReader.iter_csv(report_path))
+    elif name == 'csv_parse[pandas]':
+        def run():
+            return len(DataFrameReportProcessing.read_report(report_path))
+    elif name == 'process[python]':
+        index = categorization_index()
+        def run():
+            ReportProcessing(CSVReader.iter_csv(report_path), categorization_index=index).process_report_data()
+    elif name == 'process[pandas]':
+        index = categorization_index()
+        def run():
+            DataFrameReportProcessing(DataFrameReportProcessing.read_report(report_path), categorization_index=index).process_report_data()
+    elif name == 'stream[python]':
+        index = categorization_index()
+        def run():
+            for _ in ReportProcessing(CSVReader.iter_csv(report_path), categorization_index=index).iter_report_data():
+                pass
+    elif name == 'export_csv':
+        call_history = ReportProcessing(CSVReader.iter_csv(report_path), categorization_index=categorization_index()).process_report_data()
+        def run():
+            rows = 0
+            for chunk in exports.iter_csv(exports.export_rows(call_history.items())):
+                rows += chunk.count('\n')
+            return rows - 1
+    else:
+        raise ValueError(f"Unknown benchmark {name}")
+
+    memory = memory_usage()
+    start_memory = memory[0] if memory else None
+    durations = []
+    stages = {}
+    items = None
+
+    for iteration in range(repeat):
+        before = metrics.snapshot()['histograms']
+        start = time.perf_counter()
+        items = run()
+        durations.append(time.perf_counter() - start)
+
+        if iteration == 0:
+            peak_increase = peak_memory() - start_memory if start_memory is not None else None
+            rows = sum(value for (metric, labels), value in metrics.snapshot()['counters'].items() if metric == 'rows_total')
+
+        for (metric, labels), histogram in metrics.snapshot()['histograms'].items():
+            previous = before.get((metric, labels)) or [0, 0]
+            if metric == 'stage_seconds' and histogram[-1] > previous[-1]:
+                stages.setdefault(dict(labels)['stage'], []).append(histogram[-2] - previous[-2])
+
+    return {
+        'seconds': min(durations),
+        'seconds_median': statistics.median(durations),
+        'items': items if items is not None else rows,
+        'peak_memory_increase': peak_increase,
+        'stages': {stage: min(seconds) for stage, seconds in stages.items()},
+    }
+
+
+def create_fixtures(directory, rows):
+    '''
+    Writes the directory fixtures and the synthetic report, unless the directory contains fixtures of the same size.
+    '''
+
+    parameters_path = os.path.join(directory, 'fixtures.json')
+    parameters = dict(rows=rows, **DIRECTORY_SIZES)
+    try:
+        with open(parameters_path, 'r', encoding='utf-8') as file:
+            if json.load(file) == parameters:
+                print(f"Using the fixtures in {directory}")
+                return
+    except (OSError, ValueError):
+        pass
+
+    start = time.perf_counter()
+    directories = generate_directories(**DIRECTORY_SIZES)
+    write_directories(directory, directories)
+    write_report(os.path.join(directory, REPORT_FILE), iter_realistic_call_history(rows, directories))
+    with open(parameters_path, 'w', encoding='utf-8') as file:
+        json.dump(parameters, file)
+
+    print(f"Fixtures written to {directory} in {time.perf_counter() - start:.1f} s "
+          f"({os.path.getsize(os.path.join(directory, REPORT_FILE)) / 1e6:.0f} MB report)")
+
+
+def environment():
+    '''
+    Returns the environment of the run, results of different environments are not comparable.
+    '''
+
+    import numpy
+    import pandas
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARK_DIRECTORY, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+        'pandas': pandas.__version__,
+        'numpy': numpy.__version__,
+        'commit': commit or None,
+        'time': datetime.now().isoformat(timespec='seconds'),
+    }
+
+
+def print_results(results, rows):
+    print(f"\n{'benchmark':<28} {'seconds':>8} {'items/s':>12} {'peak memory':>12}")
+    for name, result in results.items():
+        memory = f"{result['peak_memory_increase'] / 1e6:.0f} MB" if result['peak_memory_increase'] is not None else 'n/a'
+        print(f"{name:<28} {result['seconds']:8.3f} {result['items'] / result['seconds']:12,.0f} {memory:>12}")
+        for stage, seconds in result['stages'].items():
+            print(f"  {stage:<26} {seconds:8.3f} {rows / seconds if seconds else 0:12,.0f}")
+
+
+def compare(results, baseline, tolerance, memory_tolerance):
+    '''
+    Prints the throughput and peak memory of the results relative to the baseline, returns the regressions.
+    '''
+
+    size = {key: value for key, value in results['parameters'].items() if key != 'repeat'}
+    if {key: value for key, value in baseline['parameters'].items() if key != 'repeat'} != size:
+        print(f"\nWarning: Baseline parameters {baseline['parameters']} differ from {results['parameters']}")
+    if baseline['environment'].get('platform') != results['environment']['platform'] or baseline['environment'].get('cpus') != results['environment']['cpus']:
+        print(f"\nWarning: Baseline environment {baseline['environment'].get('platform')} ({baseline['environment'].get('cpus')} cpus) differs")
+
+    regressions = []
+    print(f"\n{'benchmark':<28} {'throughput':>12} {'peak memory':>12}   (relative to the baseline {baseline['environment'].get('commit')})")
+    for name, result in results['results'].items():
+        baseline_result = baseline['results'].get(name)
+        if not baseline_result:
+            print(f"{name:<28} {'new':>12}")
+            continue
+
+        throughput = baseline_result['seconds'] / result['seconds']
+        memory = result['peak_memory_increase'] / baseline_result['peak_memory_increase'] \
+            if result['peak_memory_increase'] and baseline_result['peak_memory_increase'] else None
+        flags = []
+        if throughput < 1 - tolerance:
+            flags.append('slower')
+        if memory is not None and memory > 1 + memory_tolerance and \
+                result['peak_memory_increase'] - baseline_result['peak_memory_increase'] > MEMORY_NOISE:
+            flags.append('more memory')
+        if flags:
+            regressions.append((name, flags))
+
+        print(f"{name:<28} {throughput:11.2f}x {f'{memory:.2f}x' if memory is not None else 'n/a':>12}   {', '.join(flags)}")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark suite of the report pipeline")
+    parser.add_argument('--rows', type=int, default=ROWS, help="rows of the synthetic report")
+    parser.add_argument('--backends', default='python,pandas', help="report processing backends (comma separated)")
+    parser.add_argument('--repeat', type=int, default=REPEAT, help="runs per benchmark, the fastest one counts")
+    parser.add_argument('--fixtures', help="directory of the fixtures, kept and reused by later runs (default: temporary)")
+    parser.add_argument('--output', help="results file (default: benchmarks/results/<time>.json)")
+    parser.add_argument('--baseline', help="results file to compare with")
+    parser.add_argument('--save-baseline', help="also write the results to this file, e.g. benchmarks/results/baseline.json")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help="allowed throughput decrease against the baseline")
+    parser.add_argument('--memory-tolerance', type=float, default=MEMORY_TOLERANCE, help="allowed peak memory increase against the baseline")
+    arguments = parser.parse_args()
+
+    backends = [backend.strip() for backend in arguments.backends.split(',') if backend.strip()]
+    results = {
+        'environment': environment(),
+        'parameters': dict(rows=arguments.rows, repeat=arguments.repeat, **DIRECTORY_SIZES),
+        'results': {},
+    }
+
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        fixtures = arguments.fixtures or temporary_directory
+        os.makedirs(fixtures, exist_ok=True)
+        create_fixtures(fixtures, arguments.rows)
+
+        for name in benchmarks(backends):
+            # A new process per benchmark, so the peak memory is the one of the benchmark
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                results['results'][name] = executor.submit(run_benchmark, name, fixtures, arguments.repeat).result()
+            print(f"{name}: {results['results'][name]['seconds']:.3f} s")
+
+    print_results(results['results'], arguments.rows)
+
+    output = arguments.output or os.path.join(BENCHMARK_DIRECTORY, 'results', f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    for path in filter(None, (output, arguments.save_baseline)):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=1)
+        print(f"\nResults written to {path}")
+
+    if arguments.baseline:
+        with open(arguments.baseline, 'r', encoding='utf-8') as file:
+            regressions = compare(results, json.load(file), arguments.tolerance, arguments.memory_tolerance)
+        if regressions:
+            print("\nRegressions: " + ", ".join(f"{name} ({', '.join(flags)})" for name, flags in regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+""" Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+           https://developer.cisco.com/docs/licenses
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+'''
+Local stub of the Webex APIs used by the dashboard, to test and benchmark against.
+Serves a detailed call history (cdr_feed), Webex call queues and phone numbers with pagination via Link headers,
+WxCC dial numbers and users with page/pageSize pagination, a simulated latency per request and optional
+429 responses with Retry-After.
+
+Usage: python benchmarks/stub_webex_api.py [--records 50000] [--numbers 100000] [--port 8080]
+Then start the dashboard with WEBEX_ANALYTICS_URL=http://localhost:8080/v1, WEBEX_API_URL=http://localhost:8080/v1
+and WXCC_API_URL=http://localhost:8080
+'''
+
+import argparse
+import bisect
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from synthetic_data import generate_call_history, generate_directories
+
+WINDOW_START = datetime(2024, 1, 1)
+WINDOW_HOURS = 48
+
+
+class StubWebexAPI(ThreadingHTTPServer):
+    '''
+    Threaded HTTP server holding the stub data.
+    '''
+
+    daemon_threads = True
+
+    def __init__(self, address, records=50000, numbers=0, latency=0.05, rate_limit_every=0):
+        super().__init__(address, StubWebexAPIHandler)
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.request_count = 0
+        self.lock = threading.Lock()
+
+        step_seconds = WINDOW_HOURS * 3600 / max(records, 1)
+        self.call_history = generate_call_history(records, start=WINDOW_START, step_seconds=step_seconds)
+        self.start_times = [call_entry['Start time'] for call_entry in self.call_history]
+
+        # Directories with numbers split 2:1:4 across dial numbers, queues and phone numbers, plus numbers / 10 users
+        self.wxcc_dial_numbers, self.w_queue_numbers, self.wxcc_user, self.w_phone_numbers = generate_directories(
+            dial_numbers=numbers * 2 // 7, queue_numbers=numbers // 7, users=numbers // 10, phone_numbers=numbers - numbers * 3 // 7)
+
+
+    @property
+    def url(self):
+        return f"{self.root_url}/v1"
+
+
+    @property
+    def root_url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+
+    def start(self):
+        '''
+        Serves the requests in a background thread.
+        '''
+
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+    def rate_limited(self):
+        '''
+        Returns True for every rate_limit_every-th request.
+        '''
+
+        with self.lock:
+            self.request_count += 1
+            return self.rate_limit_every and self.request_count % self.rate_limit_every == 0
+
+
+class StubWebexAPIHandler(BaseHTTPRequestHandler):
+    '''
+    Request handler of the stub Webex APIs.
+    '''
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+
+    def send_json(self, status, content, headers=None):
+        body = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def do_GET(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.server.latency)
+
+        if self.server.rate_limited():
+            self.send_json(429, {'message': 'Too Many Requests'}, {'Retry-After': '1'})
+            return
+
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        if url.path == '/v1/cdr_feed':
+            self.cdr_feed(url, query)
+        elif url.path == '/v1/telephony/config/queues':
+            self.linked_page(url, query, 'queues', self.server.w_queue_numbers)
+        elif url.path == '/v1/telephony/config/numbers':
+            self.linked_page(url, query, 'phoneNumbers', self.server.w_phone_numbers)
+        elif url.path.endswith('/dial-number'):
+            self.send_json(200, self.numbered_page(query, self.server.wxcc_dial_numbers))
+        elif url.path.endswith('/v2/user'):
+            page_size = int(query.get('pageSize', 100))
+            total_pages = -(-len(self.server.wxcc_user) // page_size)
+            meta = {'page': int(query.get('page', 0)), 'pageSize': page_size, 'totalPages': total_pages, 'totalRecords': len(self.server.wxcc_user)}
+            self.send_json(200, {'meta': meta, 'data': self.numbered_page(query, self.server.wxcc_user)})
+        else:
+            self.send_json(404, {'message': f'Unknown path {url.path}'})
+
+
+    def cdr_feed(self, url, query):
+        '''
+        Returns a page of the call history entries within startTime and endTime.
+        '''
+
+        start_times = self.server.start_times
+        first = bisect.bisect_left(start_times, query['startTime'])
+        last = bisect.bisect_left(start_times, query['endTime'])
+        offset = first + int(query.get('offset', 0))
+        page_end = min(offset + int(query.get('max', 500)), last)
+
+        headers = {}
+        if page_end < last:
+            next_query = dict(query, offset=page_end - first)
+            headers['Link'] = f'<http://{self.headers["Host"]}{url.path}?{urlencode(next_query)}>; rel="next"'
+
+        self.send_json(200, {'items': self.server.call_history[offset:page_end]}, headers)
+
+
+    def linked_page(self, url, query, items_key, items):
+        '''
+        Returns a page of items (start, max parameters) with a Link header to the next page.
+        '''
+
+        start = int(query.get('start', 0))
+        page_end = min(start + int(query.get('max', 1000)), len(items))
+
+        headers = {}
+        if page_end < len(items):
+            next_query = dict(query, start=page_end)
+            headers['Link'] = f'<http://{self.headers["Host"]}{url.path}?{urlencode(next_query)}>; rel="next"'
+
+        self.send_json(200, {items_key: items[start:page_end]}, headers)
+
+
+    def numbered_page(self, query, items):
+        '''
+        Returns a page of items (page, pageSize parameters).
+        '''
+
+        page_size = int(query.get('pageSize', 100))
+        start = int(query.get('page', 0)) * page_size
+
+        return items[start:start + page_size]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--records', type=int, default=50000)
+    parser.add_argument('--numbers', type=int, default=100000)
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--rate-limit-every', type=int, default=0)
+    args = parser.parse_args()
+
+    server = StubWebexAPI(('localhost', args.port), args.records, args.numbers, args.latency, args.rate_limit_every)
+    print(f"Serving stub Webex API at {server.url}, cdr_feed window starts {WINDOW_START.isoformat()}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+""" Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+           https://developer.cisco.com/docs/licenses
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+import csv
+import heapq
+import itertools
+import json
+import os
+import random
+from datetime import datetime, timedelta
+from functools import lru_cache
+from operator import itemgetter
+
+
+def number(i):
+    '''
+    Returns a deterministic E.164 number for an index.
+    '''
+
+    return f"+1555{i:07d}"
+
+
+def generate_directories(dial_numbers=2000, queue_numbers=500, users=800, phone_numbers=2000, seed=1):
+    '''
+    Generates WxCC dial numbers, Webex queue numbers, WxCC users and Webex phone numbers
+    in the shape returned by the WxCC and Webex APIs.
+    '''
+
+    rng = random.Random(seed)
+
+    wxcc_dial_numbers = [{"dialledNumber": number(i)} for i in range(dial_numbers)]
+    w_queue_numbers = [{"phoneNumber": number(dial_numbers + i)} for i in range(queue_numbers)]
+    wxcc_user = []
+    for i in range(users):
+        user = {"ciUserId": f"user-{i}"}
+        if rng.random() < 0.5:
+            user["agentProfileId"] = f"profile-{i % 10}"
+        wxcc_user.append(user)
+    w_phone_numbers = []
+    for i in range(phone_numbers):
+        owner_type = "PEOPLE" if rng.random() < 0.7 else "PLACE"
+        w_phone_numbers.append({"phoneNumber": number(dial_numbers + queue_numbers + i), "owner": {"type": owner_type}})
+
+    return wxcc_dial_numbers, w_queue_numbers, wxcc_user, w_phone_numbers
+
+
+def generate_call_history(rows, number_space=10000, users=800, seed=1, start=datetime(2024, 1, 1), step_seconds=7):
+    '''
+    Generates detailed call history entries with the columns used by the report processing.
+    The entries start at start and are step_seconds apart.
+    '''
+
+    rng = random.Random(seed)
+    call_history = []
+
+    for i in range(rows):
+        start_time = (start + timedelta(seconds=i * step_seconds)).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+        call_history.append({
+            "Start time": start_time,
+            "Release time": start_time,
+            "Duration": str(rng.randint(0, 600)),
+            "Ring duration": str(rng.randint(0, 30)),
+            "Calling number": number(rng.randrange(number_space)),
+            "Called number": number(rng.randrange(number_space)),
+            "User": "NA",
+            "Correlation ID": f"corr-{i // 4}",
+            "Direction": rng.choice(("ORIGINATING", "TERMINATING")),
+            "Answered": rng.choice(("true", "false")),
+            "Redirect reason": "NA",
+            "Related reason": "NA",
+            "User UUID": f"user-{rng.randrange(users * 2)}",
+        })
+
+    return call_history
+
+
+# Columns of a Webex detailed call history report (header of reports/example.csv)
+WEBEX_REPORT_COLUMNS = (
+    'Start time', 'Answer time', 'Duration', 'Calling number', 'Called number', 'User', 'Calling line ID', 'Called line ID',
+    'Correlation ID', 'Location', 'Inbound trunk', 'Outbound trunk', 'Route group', 'Direction', 'Call type', 'Client type',
+    'Client version', 'Sub client type', 'OS type', 'Device Mac', 'Model', 'Answered', 'International Country',
+    'Original reason', 'Related reason', 'Redirect reason', 'Site main number', 'Site timezone', 'User type', 'Call ID',
+    'Local SessionID', 'Remote SessionID', 'User UUID', 'Org UUID', 'Report ID', 'Department ID', 'Site UUID',
+    'Releasing party', 'Redirecting number', 'Transfer related call ID', 'Dialed digits', 'Authorization code',
+    'Call transfer time', 'User number', 'Local call ID', 'Remote call ID', 'Network call ID', 'Related call ID',
+    'Call outcome', 'Call outcome reason', 'Final local sessionID', 'Final remote sessionID', 'Answer Indicator',
+    'Ring duration', 'Release time', 'Report time',
+)
+
+# Call flow scenarios and their shares of the call groups
+SCENARIOS = (
+    ('internal', 0.30),
+    ('inbound_wxcc', 0.20),
+    ('inbound_queue', 0.20),
+    ('transfer', 0.15),
+    ('outbound', 0.15),
+)
+
+DIRECTORY_FILES = ('wxcc_dial_numbers', 'w_queue_numbers', 'wxcc_user', 'w_phone_numbers')
+
+
+def external_number(i):
+    '''
+    Returns a deterministic E.164 number outside of the directories for an index.
+    '''
+
+    return f"+1666{i:07d}"
+
+
+def format_number(e164, rng, formatted_share):
+    '''
+    Returns a North American E.164 number as it appears in CDRs: mostly E.164, a formatted_share in national,
+    formatted or 00-prefixed form (matched after normalization).
+    '''
+
+    if rng.random() >= formatted_share:
+        return e164
+
+    return rng.choice((
+        lambda: e164[2:],
+        lambda: f"+1 ({e164[2:5]}) {e164[5:8]}-{e164[8:]}",
+        lambda: f"00{e164[1:]}",
+    ))()
+
+
+def iter_realistic_call_history(rows, directories, seed=1, start=datetime(2024, 1, 1), step_seconds=7, notification_share=0.05,
+                                formatted_share=0.1, external_numbers=100000):
+    '''
+    Lazily yields rows detailed call history entries (all columns of a Webex report) of the directories
+    (generate_directories), ordered by start time, in call flows like the ones of a Webex Calling and
+    Contact Center deployment:
+    - internal: call between two Webex users, an ORIGINATING entry and its TERMINATING twin
+    - inbound_wxcc: external call to a WxCC dial number, routed to an agent
+    - inbound_queue: external call to a Webex call queue, offered to agents until one answers
+    - transfer: internal call transferred to a third user (twins for both connections)
+    - outbound: call of a Webex user or WxCC agent to an external number
+    notification_share of the TERMINATING entries are repeated as PushNotificationRetrieval entries (mobile clients),
+    formatted_share of the numbers use national or formatted forms. A call flow starts every step_seconds seconds,
+    the call flows overlap in time. Memory stays constant for any number of rows.
+    '''
+
+    wxcc_dial_numbers, w_queue_numbers, wxcc_user, w_phone_numbers = directories
+    rng = random.Random(seed)
+
+    dial_numbers = [entry['dialledNumber'] for entry in wxcc_dial_numbers]
+    queue_numbers = [entry['phoneNumber'] for entry in w_queue_numbers]
+    # WxCC agents first, then the other WxCC users
+    agent_uuids = [entry['ciUserId'] for entry in wxcc_user if 'agentProfileId' in entry]
+    wxcc_uuids = agent_uuids + [entry['ciUserId'] for entry in wxcc_user if 'agentProfileId' not in entry]
+    agent_count = max(1, len(agent_uuids))
+    people_numbers = [entry['phoneNumber'] for entry in w_phone_numbers if entry['owner']['type'] == 'PEOPLE'] or [external_number(0)]
+    # Numbers of places (e.g. common area phones), without user
+    place_numbers = [entry['phoneNumber'] for entry in w_phone_numbers if entry['owner']['type'] != 'PEOPLE'] or [external_number(1)]
+    # Webex users: a phone number and a user UUID, the WxCC users are Webex users as well
+    users = [(number, wxcc_uuids[i] if i < len(wxcc_uuids) else f"webex-user-{i}") for i, number in enumerate(people_numbers)]
+    agents = users[:agent_count]
+    scenario_names = [name for name, _ in SCENARIOS]
+    scenario_weights = [share for _, share in SCENARIOS]
+    call_ids = itertools.count(1)
+
+    @lru_cache(maxsize=65536)
+    def timestamp(seconds):
+        return (start + timedelta(seconds=seconds)).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+    def entry(correlation_id, seconds, direction, calling_number, called_number, user_uuid, answered=True, duration=0,
+              related_reason="NA", redirect_reason="NA", redirecting_number="NA"):
+        call_entry = dict.fromkeys(WEBEX_REPORT_COLUMNS, "NA")
+        call_id = next(call_ids)
+        call_entry.update({
+            'Start time': timestamp(seconds),
+            'Answer time': timestamp(seconds + 2) if answered else "NA",
+            'Release time': timestamp(seconds + duration + 2),
+            'Report time': timestamp(seconds + duration + 3),
+            'Duration': str(duration),
+            'Ring duration': str(rng.randint(1, 20)),
+            'Calling number': format_number(calling_number, rng, formatted_share),
+            'Called number': format_number(called_number, rng, formatted_share),
+            'Correlation ID': correlation_id,
+            'Location': f"Site{rng.randint(1, 5)}",
+            'Direction': direction,
+            'Answered': "true" if answered else "false",
+            'Related reason': related_reason,
+            'Redirect reason': redirect_reason,
+            'Redirecting number': redirecting_number,
+            'Call ID': f"SSE{call_id:012d}@10.0.0.1",
+            'Local SessionID': f"{call_id:032x}",
+            'User UUID': user_uuid,
+            'Call outcome': "Success" if answered else "Failure",
+        })
+        return call_entry
+
+    def call_flow(group, seconds):
+        '''
+        Returns the entries (offset seconds, entry) of a call flow.
+        '''
+
+        correlation_id = f"corr-{group:09d}"
+        scenario = rng.choices(scenario_names, scenario_weights)[0]
+        duration = rng.randint(10, 600)
+
+        if scenario == 'internal' or scenario == 'transfer':
+            (caller, caller_uuid), (callee, callee_uuid) = rng.sample(users, 2)
+            entries = [entry(correlation_id, seconds, "ORIGINATING", caller, callee, caller_uuid, duration=duration),
+                       entry(correlation_id, seconds, "TERMINATING", caller, callee, callee_uuid, duration=duration)]
+            if scenario == 'transfer':
+                target, target_uuid = rng.choice(users)
+                transfer_seconds = seconds + rng.randint(10, 120)
+                related_reason = rng.choice(("ConsultativeTransfer", "BlindTransfer"))
+                entries += [entry(correlation_id, transfer_seconds, "ORIGINATING", callee, target, callee_uuid, duration=duration, related_reason=related_reason),
+                            entry(correlation_id, transfer_seconds, "TERMINATING", callee, target, target_uuid, duration=duration,
+                                  related_reason=related_reason, redirect_reason="CallTransfer", redirecting_number=callee)]
+            return entries
+
+        if scenario == 'outbound':
+            if rng.random() < 0.2:
+                caller, caller_uuid = rng.choice(place_numbers), "NA"
+            else:
+                caller, caller_uuid = rng.choice(agents if rng.random() < 0.3 else users)
+            return [entry(correlation_id, seconds, "ORIGINATING", caller, external_number(rng.randrange(external_numbers)), caller_uuid,
+                          answered=rng.random() < 0.8, duration=duration)]
+
+        caller = external_number(rng.randrange(external_numbers))
+        if scenario == 'inbound_wxcc':
+            agent, agent_uuid = rng.choice(agents)
+            dial_number = rng.choice(dial_numbers)
+            return [entry(correlation_id, seconds, "TERMINATING", caller, dial_number, agent_uuid, duration=duration),
+                    entry(correlation_id, seconds + rng.randint(5, 60), "TERMINATING", caller, agent, agent_uuid, duration=duration,
+                          redirect_reason="Unconditional", redirecting_number=dial_number)]
+
+        # inbound_queue: offered to up to 3 agents, the last one answers
+        queue_number = rng.choice(queue_numbers)
+        entries = [entry(correlation_id, seconds, "TERMINATING", caller, queue_number, "NA", duration=duration, related_reason="CallQueue")]
+        offer_seconds = seconds + rng.randint(5, 60)
+        offered_agents = rng.sample(agents, min(len(agents), rng.randint(1, 3)))
+        for position, (agent, agent_uuid) in enumerate(offered_agents):
+            answered = position == len(offered_agents) - 1
+            entries.append(entry(correlation_id, offer_seconds, "TERMINATING", caller, agent, agent_uuid, answered=answered,
+                                 duration=duration if answered else 0, related_reason="CallQueue", redirect_reason="CallQueue",
+                                 redirecting_number=queue_number))
+            offer_seconds += rng.randint(10, 30)
+        return entries
+
+    # Entries of the started call flows by start time, emitted once no earlier entry can follow
+    pending = []
+    sequence = itertools.count()
+    emitted = 0
+    group = 0
+
+    while emitted < rows:
+        seconds = group * step_seconds
+        for call_entry in call_flow(group, seconds):
+            heapq.heappush(pending, (call_entry['Start time'], next(sequence), call_entry))
+            if call_entry['Direction'] == "TERMINATING" and rng.random() < notification_share:
+                notification = dict(call_entry, **{'Related reason': "PushNotificationRetrieval", 'Answered': "false",
+                                                   'Call ID': f"{call_entry['Call ID']}-push", 'Local SessionID': f"{call_entry['Local SessionID']}1"})
+                heapq.heappush(pending, (call_entry['Start time'], next(sequence), notification))
+        group += 1
+
+        current = timestamp(seconds)
+        while pending and pending[0][0] <= current and emitted < rows:
+            yield heapq.heappop(pending)[2]
+            emitted += 1
+
+
+def write_report(filename, call_history, columns=WEBEX_REPORT_COLUMNS):
+    '''
+    Writes call history entries (any iterable, written while it is consumed) with the columns as csv report like the
+    Webex reports (UTF-8 with BOM, all values quoted). Returns the number of rows.
+    '''
+
+    rows = 0
+    row = itemgetter(*columns)
+    with open(filename, 'w', newline='', encoding='utf-8-sig') as file:
+        writer = csv.writer(file, quoting=csv.QUOTE_ALL)
+        writer.writerow(columns)
+        for call_entry in call_history:
+            writer.writerow(row(call_entry))
+            rows += 1
+
+    return rows
+
+
+def write_directories(directory, directories):
+    '''
+    Writes the directories (generate_directories) as JSON fixtures, one file per directory.
+    '''
+
+    for name, entries in zip(DIRECTORY_FILES, directories):
+        with open(os.path.join(directory, f"{name}.json"), 'w', encoding='utf-8') as file:
+            json.dump(entries, file)
+
+
+def read_directories(directory):
+    '''
+    Reads the directory fixtures written by write_directories.
+    '''
+
+    directories = []
+    for name in DIRECTORY_FILES:
+        with open(os.path.join(directory, f"{name}.json"), 'r', encoding='utf-8') as file:
+            directories.append(json.load(file))
+
+    return tuple(directories)
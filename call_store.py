@@ -0,0 +1,177 @@
+""" Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+           https://developer.cisco.com/docs/licenses
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+from dotenv import load_dotenv
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from itertools import islice
+import logging
+log = logging.getLogger(__name__)
+
+from csv_reader import REPORT_COLUMNS
+
+load_dotenv()
+
+# Columns of a call record (report column -> database column), Call ID and Local SessionID identify a record
+KEY_COLUMNS = {'Call ID': 'call_id', 'Local SessionID': 'local_session_id'}
+CALL_COLUMNS = {column: column.lower().replace(' ', '_') for column in REPORT_COLUMNS}
+
+INDEXED_COLUMNS = ('correlation_id', 'start_time', 'user_uuid', 'calling_number', 'called_number')
+
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+
+def call_key(call_entry):
+    '''
+    Returns the (Call ID, Local SessionID) of a call record. Records without them are identified by their content.
+    '''
+
+    if call_entry.get('Call ID') and call_entry.get('Local SessionID'):
+        return call_entry['Call ID'], call_entry['Local SessionID']
+
+    return "|".join(str(call_entry.get(column, '')) for column in ('Correlation ID', 'Start time', 'Direction', 'Calling number', 'Called number', 'User UUID')), ''
+
+
+class CallStore():
+    '''
+    Local SQLite store of the call detail records, filled by the CDR collector (cdr_collector.py).
+    Inserts are idempotent by Call ID and Local SessionID. The store keeps the time range it covers without
+    gaps, so readers can decide whether a time window can be served from the store.
+    '''
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("CALL_STORE_PATH", './reports/calls.db')
+        self.local = threading.local()
+
+        with self._connection() as connection:
+            columns = ", ".join(f'"{column}" TEXT' for column in (*KEY_COLUMNS.values(), *CALL_COLUMNS.values()))
+            connection.execute(f"CREATE TABLE IF NOT EXISTS calls ({columns}, PRIMARY KEY (call_id, local_session_id))")
+            for column in INDEXED_COLUMNS:
+                connection.execute(f"CREATE INDEX IF NOT EXISTS calls_{column} ON calls ({column})")
+            connection.execute("CREATE TABLE IF NOT EXISTS collector_state (name TEXT PRIMARY KEY, value TEXT)")
+
+
+    def _connection(self):
+        '''
+        Returns the database connection of the current thread.
+        '''
+
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            # A larger page cache keeps the index pages of the batched inserts in memory
+            connection.execute(f"PRAGMA cache_size=-{int(os.getenv('CALL_STORE_CACHE_MB', 64)) * 1024}")
+            self.local.connection = connection
+
+        return connection
+
+
+    def insert(self, call_history, batch_size=None):
+        '''
+        Inserts call records in batches (executemany), records already stored are skipped.
+        Returns the number of new records.
+        '''
+
+        batch_size = batch_size or int(os.getenv("CALL_STORE_BATCH_SIZE", 10000))
+        columns = (*KEY_COLUMNS.values(), *CALL_COLUMNS.values())
+        statement = f"INSERT OR IGNORE INTO calls ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        rows = (call_key(call_entry) + tuple(call_entry.get(column) for column in CALL_COLUMNS) for call_entry in call_history)
+
+        connection = self._connection()
+        inserted = 0
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            with connection:
+                inserted += connection.executemany(statement, batch).rowcount
+
+        return inserted
+
+
+    def iter_calls(self, start_time, end_time):
+        '''
+        Yields the call records (as dictionaries with the report columns, Call ID and Local SessionID) starting
+        from start_time (inclusive) to end_time (exclusive), ordered by start time.
+        start_time and end_time need to use the following format: YYYY-MM-DDTHH:MM:SS.mmmZ
+        '''
+
+        columns = {**KEY_COLUMNS, **CALL_COLUMNS}
+        cursor = self._connection().execute(
+            f"SELECT {', '.join(columns.values())} FROM calls WHERE start_time >= ? AND start_time < ? ORDER BY start_time, rowid",
+            (start_time, end_time))
+
+        for row in cursor:
+            yield dict(zip(columns, row))
+
+
+    def get_state(self, name):
+        row = self._connection().execute("SELECT value FROM collector_state WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+
+    def set_state(self, **values):
+        with self._connection() as connection:
+            connection.executemany("INSERT OR REPLACE INTO collector_state (name, value) VALUES (?, ?)", values.items())
+
+
+    def record_ingestion(self, start_time, end_time):
+        '''
+        Records an ingested (start_time, end_time) window: extends the covered time range, or starts a new one
+        after a gap.
+        '''
+
+        coverage_start, high_water_mark = self.get_state('coverage_start'), self.get_state('high_water_mark')
+
+        if not coverage_start or not high_water_mark or start_time > high_water_mark:
+            coverage_start = start_time
+
+        self.set_state(coverage_start=min(coverage_start, start_time), high_water_mark=max(high_water_mark or end_time, end_time))
+
+
+    def covers(self, start_time, end_time, max_lag=None):
+        '''
+        Checks if the store contains all records from start_time to end_time, allowing the last max_lag seconds
+        (CALL_STORE_MAX_LAG, default 120) to be still missing.
+        '''
+
+        max_lag = max_lag if max_lag is not None else int(os.getenv("CALL_STORE_MAX_LAG", 120))
+        coverage_start, high_water_mark = self.get_state('coverage_start'), self.get_state('high_water_mark')
+        if not coverage_start or not high_water_mark:
+            return False
+
+        required_end = (datetime.strptime(end_time, TIME_FORMAT) - timedelta(seconds=max_lag)).strftime(TIME_FORMAT)[:-4] + "Z"
+        return coverage_start <= start_time and high_water_mark >= required_end
+
+
+    def delete_before(self, start_time):
+        '''
+        Deletes the records starting before start_time (retention) and moves the start of the covered time range.
+        '''
+
+        with self._connection() as connection:
+            deleted = connection.execute("DELETE FROM calls WHERE start_time < ?", (start_time,)).rowcount
+
+        coverage_start = self.get_state('coverage_start')
+        if coverage_start and coverage_start < start_time:
+            self.set_state(coverage_start=start_time)
+
+        return deleted
+
+
+    def count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM calls").fetchone()[0]
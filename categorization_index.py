@@ -0,0 +1,183 @@
+""" Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+           https://developer.cisco.com/docs/licenses
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+from enum import IntFlag
+
+from phone_numbers import normalize_number
+
+
+class Tag(IntFlag):
+    '''
+    Categorization tags of a number. A call entry keeps the tags of its numbers as codes (combined flags) in the
+    fields 'Calling tag' and 'Called tag', the numbers themselves stay unchanged.
+    '''
+
+    WXCC_DIAL_NUMBER = 1
+    WXCC_AGENT_USER = 2
+    WXCC_USER = 4
+    WEBEX_CALL_QUEUE = 8
+    WEBEX_USER = 16
+    WEBEX_NUMBER = 32
+
+
+# The lookups and call entries store the plain integer codes, combining them does not go through the enum
+WXCC_DIAL_NUMBER_TAG = Tag.WXCC_DIAL_NUMBER.value
+WXCC_AGENT_USER_TAG = Tag.WXCC_AGENT_USER.value
+WXCC_USER_TAG = Tag.WXCC_USER.value
+WEBEX_CALL_QUEUE_TAG = Tag.WEBEX_CALL_QUEUE.value
+WEBEX_USER_TAG = Tag.WEBEX_USER.value
+WEBEX_NUMBER_TAG = Tag.WEBEX_NUMBER.value
+
+# Labels of all tags in categorization order
+TAG_LABELS = {
+    WXCC_DIAL_NUMBER_TAG: "WxCC Dial Number",
+    WXCC_AGENT_USER_TAG: "WxCC Agent User",
+    WXCC_USER_TAG: "WxCC User",
+    WEBEX_CALL_QUEUE_TAG: "Webex Call Queue",
+    WEBEX_USER_TAG: "Webex User",
+    WEBEX_NUMBER_TAG: "Webex Number",
+}
+
+
+def tag_labels(tag_code):
+    '''
+    Returns the labels of the tags in a tag code, e.g. ['WxCC Dial Number', 'WxCC Agent User'].
+    '''
+
+    return [label for tag, label in TAG_LABELS.items() if tag_code & tag]
+
+
+def tag_code(label):
+    '''
+    Returns the code of a tag label (with or without brackets) or None for unknown labels.
+    '''
+
+    label = label.strip("()").lower()
+    for tag, tag_label in TAG_LABELS.items():
+        if tag_label.lower() == label:
+            return tag
+    return None
+
+
+def tagged_number(number, tag_code):
+    '''
+    Returns the number followed by the labels of its tags, e.g. "+15550001 (WxCC Dial Number)".
+    '''
+
+    return " ".join([number or "", *(f"({label})" for label in tag_labels(tag_code or 0))]).strip()
+
+
+def number_lookup(identifiers_numbers, identifier_key, tag):
+    '''
+    Builds the lookup (normalized number -> tag) of all numbers stored with identifier_key in the identifiers_numbers entries.
+    The entries can be any iterable, e.g. the pages of a directory as they are retrieved.
+    '''
+
+    lookup = {}
+    for identifier_number_entry in identifiers_numbers:
+        if identifier_key in identifier_number_entry:
+            lookup.setdefault(normalize_number(identifier_number_entry[identifier_key]), tag)
+
+    return lookup
+
+
+def webex_number_lookup(w_phone_numbers):
+    '''
+    Builds the lookup (normalized number -> tag) of the Webex numbers tagged with (Webex User) or (Webex Number) based on their owner type.
+    '''
+
+    lookup = {}
+    for number in w_phone_numbers:
+        if "phoneNumber" in number:
+            if number['owner']['type'] == "PEOPLE":
+                lookup.setdefault(normalize_number(number['phoneNumber']), WEBEX_USER_TAG)
+            else:
+                lookup.setdefault(normalize_number(number['phoneNumber']), WEBEX_NUMBER_TAG)
+
+    return lookup
+
+
+def wxcc_user_lookup(wxcc_user):
+    '''
+    Builds the lookup (ciUserId -> tags) of the WxCC users tagged with (WxCC Agent User) or (WxCC User) based on their agent profile.
+    Users sharing a ciUserId keep their distinct tags in directory order: ORIGINATING entries combine all of them in
+    the calling tag, TERMINATING entries get the first one as called tag. A tag shared by several users is shown
+    once (the former tag strings repeated it, e.g. "(WxCC Agent User) (WxCC Agent User)").
+    '''
+
+    lookup = {}
+    for user in wxcc_user:
+        tag = WXCC_AGENT_USER_TAG if "agentProfileId" in user else WXCC_USER_TAG
+        tags = lookup.get(user['ciUserId'], ())
+        if tag not in tags:
+            lookup[user['ciUserId']] = tuple(tags) + (tag,)
+
+    return lookup
+
+
+class CategorizationIndex:
+    '''
+    Hash index over the WxCC and Webex directories used for categorization.
+    Built once per request from the directory lookups, afterwards every number or user lookup is a single dict access.
+    The numbers are matched by their normalized (E.164) form: the directory lookups are keyed by it and the lookups
+    expect numbers normalized with phone_numbers.normalize_number.
+    '''
+
+    def __init__(self, dial_number_tags, user_tags, queue_number_tags, webex_number_tags, fingerprint=None):
+        # Later lookups take precedence: a number keeps the tag of the first directory in categorization order.
+        self.number_tags = {**webex_number_tags, **queue_number_tags, **dial_number_tags}
+        self.user_tags = user_tags
+        # Identifies the directory data the index was built from (None if unknown)
+        self.fingerprint = fingerprint
+
+
+    @classmethod
+    def from_directories(cls, wxcc_dial_numbers, wxcc_user, w_queue_numbers, w_phone_numbers):
+        '''
+        Builds the index from the directory entries as returned by the WxCC and Webex APIs.
+        '''
+
+        return cls(number_lookup(wxcc_dial_numbers, "dialledNumber", WXCC_DIAL_NUMBER_TAG),
+                   wxcc_user_lookup(wxcc_user),
+                   number_lookup(w_queue_numbers, "phoneNumber", WEBEX_CALL_QUEUE_TAG),
+                   webex_number_lookup(w_phone_numbers))
+
+
+    def dial_number_tag(self, number):
+        '''
+        Returns the WxCC dial number tag of a normalized number or 0.
+        '''
+
+        tag = self.number_tags.get(number, 0)
+        if tag == WXCC_DIAL_NUMBER_TAG:
+            return tag
+        return 0
+
+
+    def number_tag(self, number):
+        '''
+        Returns the Webex call queue or Webex number tag of a normalized number or 0.
+        '''
+
+        tag = self.number_tags.get(number, 0)
+        if tag == WXCC_DIAL_NUMBER_TAG:
+            return 0
+        return tag
+
+
+    def wxcc_user_tags(self, user_uuid):
+        '''
+        Returns the distinct WxCC user tags of a user uuid in directory order.
+        '''
+
+        return self.user_tags.get(user_uuid, ())
@@ -0,0 +1,99 @@
+""" Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+           https://developer.cisco.com/docs/licenses
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+from dotenv import load_dotenv
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+import logging
+log = logging.getLogger(__name__)
+
+from call_store import CallStore, TIME_FORMAT
+from webex import WebexAPI
+
+load_dotenv()
+
+
+class CDRCollector():
+    '''
+    Collects the detailed call history (CDR feed) into the call store in a fixed interval.
+    Every run ingests the records since the high-water mark of the store (minus an overlap for late records),
+    on the first run or after a longer downtime the records of the last 48 h are ingested.
+    '''
+
+    def __init__(self, webex_api, call_store, interval=None, overlap=None, backfill=None, retention=None):
+        self.webex_api = webex_api
+        self.call_store = call_store
+        self.interval = interval if interval is not None else int(os.getenv("CDR_COLLECTOR_INTERVAL", 60))
+        self.overlap = timedelta(seconds=overlap if overlap is not None else int(os.getenv("CDR_COLLECTOR_OVERLAP", 300)))
+        self.backfill = timedelta(hours=backfill if backfill is not None else int(os.getenv("CDR_COLLECTOR_BACKFILL_HOURS", 48)))
+        # Retention of the stored records in days, 0 keeps all records
+        self.retention = retention if retention is not None else int(os.getenv("CALL_STORE_RETENTION_DAYS", 0))
+        self.stop_event = threading.Event()
+
+
+    def collect(self):
+        '''
+        Ingests the records from the high-water mark until 5 minutes ago (latest time accepted by the CDR feed).
+        Returns the number of new records.
+        '''
+
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        end = now - timedelta(minutes=5)
+        start = end - self.backfill + timedelta(minutes=5)
+
+        high_water_mark = self.call_store.get_state('high_water_mark')
+        if high_water_mark:
+            start = max(start, datetime.strptime(high_water_mark, TIME_FORMAT) - self.overlap)
+
+        start_time, end_time = self._format(start), self._format(end)
+
+        started = time.perf_counter()
+        call_history = self.webex_api.get_detailed_call_history(start_time, end_time)
+        inserted = self.call_store.insert(call_history)
+        self.call_store.record_ingestion(start_time, end_time)
+
+        if self.retention:
+            self.call_store.delete_before(self._format(now - timedelta(days=self.retention)))
+
+        print(f"Collected {inserted} new call records ({start_time} - {end_time}) in {time.perf_counter() - started:.1f} s")
+        return inserted
+
+
+    def run(self):
+        '''
+        Collects the records in the configured interval until stop() is called.
+        '''
+
+        while not self.stop_event.is_set():
+            try:
+                self.collect()
+            except Exception as e:
+                print(f"Error: CDR collection failed: {e}")
+
+            self.stop_event.wait(self.interval)
+
+
+    def stop(self):
+        self.stop_event.set()
+
+
+    @staticmethod
+    def _format(timestamp):
+        return timestamp.strftime(TIME_FORMAT)[:-4] + "Z"
+
+
+if __name__ == "__main__":
+    collector = CDRCollector(WebexAPI(), CallStore())
+    collector.run()
@@ -16,6 +16,16 @@ or implied.
 """
 
 import csv
+import sys
+import time
+
+# Columns of the Detailed Call History report used by the report processing and the table view
+REPORT_COLUMNS = ('Start time', 'Release time', 'Duration', 'Ring duration', 'Calling number', 'Called number', 'User',
+                  'Correlation ID', 'User UUID', 'Location', 'Direction', 'Answered', 'Redirect reason', 'Related reason')
+
+# Columns with a small set of repeating values, shared between rows instead of allocated per row
+INTERNED_COLUMNS = ('Location', 'Direction', 'Answered', 'Redirect reason', 'Related reason')
+
 
 class CSVReader():
 
@@ -30,3 +40,60 @@ class CSVReader():
             data = [row for row in csv_reader]
                 
         return data
+
+
+    @staticmethod
+    def iter_csv(filename, columns=REPORT_COLUMNS, interned_columns=INTERNED_COLUMNS):
+        '''
+        Lazily yields the rows of a csv file as Python dictionaries, only containing the provided columns.
+        Values of the interned columns are shared between rows.
+        '''
+
+        with open(f'{filename}', 'r', encoding='utf-8-sig') as file:
+            yield from CSVReader.iter_rows(file, columns, interned_columns)
+
+
+    @staticmethod
+    def follow_csv(filename, finished, columns=REPORT_COLUMNS, interned_columns=INTERNED_COLUMNS, poll_interval=0.05):
+        '''
+        Lazily yields the rows of a csv file which is still being written (e.g. a report download), like iter_csv.
+        Waits for more data at the end of the file until the finished event is set.
+        '''
+
+        def complete_lines(file):
+            partial_line = ''
+            while True:
+                is_finished = finished.is_set()
+                line = file.readline()
+                if line.endswith('\n'):
+                    yield partial_line + line
+                    partial_line = ''
+                elif line:
+                    partial_line += line
+                elif is_finished:
+                    # The finished event was set before reading the end of the file, so all data was read
+                    if partial_line:
+                        yield partial_line
+                    return
+                else:
+                    time.sleep(poll_interval)
+
+        with open(f'{filename}', 'r', encoding='utf-8-sig', newline='') as file:
+            yield from CSVReader.iter_rows(complete_lines(file), columns, interned_columns)
+
+
+    @staticmethod
+    def iter_rows(lines, columns=REPORT_COLUMNS, interned_columns=INTERNED_COLUMNS):
+        '''
+        Yields the rows of csv lines (a file or any iterable of lines) as Python dictionaries, only containing the provided columns.
+        '''
+
+        csv_reader = csv.reader(lines)
+        header = next(csv_reader, [])
+        selected_columns = [(column, header.index(column), column in interned_columns) for column in columns if column in header]
+
+        for row in csv_reader:
+            if not row:
+                continue
+
+            yield {column: sys.intern(row[index]) if interned else row[index] for column, index, interned in selected_columns}
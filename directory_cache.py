@@ -0,0 +1,341 @@
+""" Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+           https://developer.cisco.com/docs/licenses
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+from dotenv import load_dotenv
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+import logging
+log = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Version of the snapshot file, changed whenever the format of the cached lookups changes
+# (2: tags as codes, 3: lookups keyed by normalized numbers)
+SNAPSHOT_VERSION = 4
+
+# Namespace of the directories in the shared cache, includes the snapshot version for the same reason
+SHARED_NAMESPACE = f"directories:{SNAPSHOT_VERSION}"
+
+
+class DirectoryCache():
+    '''
+    In-process TTL cache for the directories used for categorization (dial numbers, queues, users, phone numbers).
+    Expired entries are served stale while they are refreshed in the background, up to a maximum staleness.
+    Optionally, the cached directories are written to a snapshot file, so they survive restarts.
+    With a shared cache (shared_cache.py), the directories are shared by the worker processes: a directory loaded
+    or invalidated by one worker is picked up by the others, and only one worker at a time loads a directory.
+    '''
+
+    def __init__(self, loaders, ttls=None, default_ttl=None, max_stale=None, snapshot_path=None, shared=None,
+                 sync_interval=None, load_timeout=None):
+        self.loaders = loaders
+        self.default_ttl = default_ttl if default_ttl is not None else int(os.getenv("DIRECTORY_CACHE_TTL", 900))
+        self.ttls = {name: int(os.getenv(f"DIRECTORY_CACHE_TTL_{name.upper()}", self.default_ttl)) for name in loaders}
+        self.ttls.update(ttls or {})
+        self.max_stale = max_stale if max_stale is not None else int(os.getenv("DIRECTORY_CACHE_MAX_STALE", 86400))
+        self.snapshot_path = snapshot_path or os.getenv("DIRECTORY_CACHE_SNAPSHOT")
+        self.shared = shared
+        # Seconds between the checks of the shared cache for directories updated by other workers
+        self.sync_interval = sync_interval if sync_interval is not None else float(os.getenv("DIRECTORY_CACHE_SYNC_INTERVAL", 5))
+        # Seconds to wait for a directory loaded by another worker before loading it
+        self.load_timeout = load_timeout if load_timeout is not None else int(os.getenv("DIRECTORY_CACHE_LOAD_TIMEOUT", 300))
+        self.synced_at = {}
+
+        self.entries = {}
+        self.counters = {name: {'hits': 0, 'stale_hits': 0, 'misses': 0, 'refreshes': 0, 'errors': 0} for name in loaders}
+        self.generation = 0
+        self.refreshing = set()
+        self.lock = threading.Lock()
+        self.load_locks = {name: threading.Lock() for name in loaders}
+
+        self._read_snapshot()
+
+
+    def get(self, name):
+        '''
+        Returns a directory. Fresh entries are returned directly, stale entries are returned
+        while a background refresh runs, missing or too old entries are loaded synchronously.
+        '''
+
+        return self._get_entry(name)['value']
+
+
+    def get_with_fingerprint(self, name):
+        '''
+        Returns a directory and the fingerprint (content hash) of exactly this directory version.
+        '''
+
+        entry = self._get_entry(name)
+        return entry['value'], entry['fingerprint']
+
+
+    def _get_entry(self, name):
+        self._sync(name)
+
+        with self.lock:
+            entry = self.entries.get(name)
+            age = time.time() - entry['loaded_at'] if entry else None
+
+            if entry and age < self.ttls[name]:
+                self.counters[name]['hits'] += 1
+                return entry
+
+            if entry and age < self.ttls[name] + self.max_stale:
+                self.counters[name]['stale_hits'] += 1
+                if name not in self.refreshing:
+                    self.refreshing.add(name)
+                    threading.Thread(target=self._background_refresh, args=(name,), daemon=True).start()
+                return entry
+
+            self.counters[name]['misses'] += 1
+
+        return self._refresh_entry(name, only_if_older_than=time.time())
+
+
+    def refresh(self, name, only_if_older_than=None):
+        '''
+        Loads a directory and stores it in the cache. Concurrent loads of the same directory are
+        combined: with only_if_older_than, an entry loaded by another caller in the meantime is reused.
+        '''
+
+        return self._refresh_entry(name, only_if_older_than)['value']
+
+
+    def _refresh_entry(self, name, only_if_older_than=None):
+        with self.load_locks[name]:
+            entry = self.entries.get(name)
+            if only_if_older_than and entry and entry['loaded_at'] >= only_if_older_than:
+                return entry
+
+            # Another worker loading the directory is waited for
+            leased = self._acquire_load_lease(name, only_if_older_than)
+            if not leased:
+                entry = self._wait_for_shared_entry(name, only_if_older_than)
+                if entry:
+                    return entry
+
+            try:
+                value = self.loaders[name]()
+            except Exception:
+                with self.lock:
+                    self.counters[name]['errors'] += 1
+                raise
+            finally:
+                if leased and self.shared:
+                    self._call_shared('release_lease', f"{SHARED_NAMESPACE}:{name}")
+
+            entry = {'value': value, 'loaded_at': time.time(), 'fingerprint': self._fingerprint(value)}
+            with self.lock:
+                self.entries[name] = entry
+                self.counters[name]['refreshes'] += 1
+                self.generation += 1
+
+            self._call_shared('set', SHARED_NAMESPACE, name, entry, entry['loaded_at'])
+            self._write_snapshot()
+            return entry
+
+
+    def _acquire_load_lease(self, name, only_if_older_than):
+        '''
+        Checks if the current worker loads a directory: always without shared cache or for a forced refresh,
+        otherwise if no other worker is loading it (the lease expires after the load timeout).
+        '''
+
+        if not self.shared or only_if_older_than is None:
+            return True
+
+        return self._call_shared('acquire_lease', f"{SHARED_NAMESPACE}:{name}", self.load_timeout) is not False
+
+
+    def _wait_for_shared_entry(self, name, only_if_older_than):
+        '''
+        Waits up to the load timeout for a directory loaded by another worker after only_if_older_than.
+        Returns the entry or None (the directory was not loaded in time, or the load failed).
+        '''
+
+        deadline = time.time() + self.load_timeout
+        while time.time() < deadline:
+            shared_entry = self._call_shared('get', SHARED_NAMESPACE, name)
+            if shared_entry and shared_entry[0] and shared_entry[1] >= only_if_older_than:
+                return self._adopt(name, *shared_entry)
+            # The lease is released after a load, also after a failed one
+            if self._call_shared('acquire_lease', f"{SHARED_NAMESPACE}:{name}", self.load_timeout) is not False:
+                self._call_shared('release_lease', f"{SHARED_NAMESPACE}:{name}")
+                return None
+            time.sleep(0.5)
+
+        return None
+
+
+    def _sync(self, name):
+        '''
+        Takes over a directory updated (loaded or invalidated) by another worker since the own entry was loaded.
+        The shared cache is checked at most every sync interval.
+        '''
+
+        if not self.shared:
+            return
+
+        now = time.time()
+        with self.lock:
+            if now - self.synced_at.get(name, 0) < self.sync_interval:
+                return
+            self.synced_at[name] = now
+            entry = self.entries.get(name)
+
+        updated_at = self._call_shared('updated_at', SHARED_NAMESPACE, name)
+        if updated_at is None or entry and updated_at <= entry['loaded_at']:
+            return
+
+        shared_entry = self._call_shared('get', SHARED_NAMESPACE, name)
+        if shared_entry:
+            self._adopt(name, *shared_entry)
+
+
+    def _adopt(self, name, shared_entry, updated_at):
+        '''
+        Replaces the own entry of a directory by the newer one of the shared cache (None: invalidated).
+        Returns the current entry.
+        '''
+
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry and entry['loaded_at'] >= updated_at:
+                return entry
+
+            if shared_entry is None:
+                self.entries.pop(name, None)
+            else:
+                self.entries[name] = shared_entry
+            self.generation += 1
+
+            return shared_entry
+
+
+    def _call_shared(self, method, *args):
+        '''
+        Calls a method of the shared cache, errors are printed and return None (the cache works without it).
+        '''
+
+        try:
+            return getattr(self.shared, method)(*args)
+        except Exception as e:
+            print(f"Error: Shared directory cache unavailable ({method}): {e}")
+            return None
+
+
+    @staticmethod
+    def _fingerprint(value):
+        '''
+        Returns a content hash of a directory, equal directories have equal fingerprints across restarts.
+        '''
+
+        return hashlib.sha1(json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+    def _background_refresh(self, name):
+        '''
+        Refreshes a stale directory, errors keep the stale entry in place.
+        A fresh directory loaded by another worker in the meantime is taken over.
+        '''
+
+        try:
+            self.refresh(name, only_if_older_than=time.time() - self.ttls[name])
+        except Exception as e:
+            print(f"Error: Refresh of directory {name} failed: {e}")
+        finally:
+            with self.lock:
+                self.refreshing.discard(name)
+
+
+    def invalidate(self, name=None):
+        '''
+        Removes a directory (or all directories) from the cache.
+        '''
+
+        with self.lock:
+            if name:
+                self.entries.pop(name, None)
+            else:
+                self.entries.clear()
+            self.generation += 1
+
+        # The other workers drop their entries loaded before the invalidation
+        if self.shared:
+            now = time.time()
+            for directory_name in ([name] if name else self.loaders):
+                self._call_shared('set', SHARED_NAMESPACE, directory_name, None, now)
+
+        self._write_snapshot()
+
+
+    def stats(self):
+        '''
+        Returns the hit/miss counters, the age and TTL of every directory.
+        '''
+
+        with self.lock:
+            now = time.time()
+            return {
+                'generation': self.generation,
+                'shared': self.shared is not None,
+                'directories': {
+                    name: dict(self.counters[name],
+                               ttl=self.ttls[name],
+                               age=round(now - self.entries[name]['loaded_at'], 1) if name in self.entries else None,
+                               refreshing=name in self.refreshing)
+                    for name in self.loaders
+                }
+            }
+
+
+    def _read_snapshot(self):
+        '''
+        Reads the cached directories from the snapshot file.
+        '''
+
+        if not self.snapshot_path or not Path(self.snapshot_path).exists():
+            return
+
+        try:
+            with open(self.snapshot_path, 'r', encoding='utf-8') as file:
+                snapshot = json.load(file)
+            if snapshot.get('version') != SNAPSHOT_VERSION:
+                print(f"Directory cache snapshot {self.snapshot_path} has an outdated format, it is ignored")
+                return
+            self.entries = {name: entry for name, entry in snapshot.items() if name in self.loaders}
+            for entry in self.entries.values():
+                entry.setdefault('fingerprint', self._fingerprint(entry['value']))
+        except (OSError, ValueError) as e:
+            print(f"Error: Unable to read directory cache snapshot {self.snapshot_path}: {e}")
+
+
+    def _write_snapshot(self):
+        '''
+        Writes the cached directories to the snapshot file (atomically via a temporary file).
+        '''
+
+        if not self.snapshot_path:
+            return
+
+        with self.lock:
+            snapshot = dict(self.entries, version=SNAPSHOT_VERSION)
+
+        temp_path = f"{self.snapshot_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(snapshot, file)
+        os.replace(temp_path, self.snapshot_path)
@@ -0,0 +1,124 @@
+""" Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+           https://developer.cisco.com/docs/licenses
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+from dotenv import load_dotenv
+import csv
+import io
+import json
+import os
+import tempfile
+from itertools import islice
+
+from categorization_index import tag_labels
+from csv_reader import REPORT_COLUMNS
+
+load_dotenv()
+
+# Columns of an exported call flow entry: the group key, the position in the call flow, the numbers,
+# the tag labels of the numbers (separated by ;) and the other report columns
+EXPORT_COLUMNS = ('Correlation ID', 'Leg', 'Calling number', 'Calling tag', 'Called number', 'Called tag') + \
+    tuple(column for column in REPORT_COLUMNS if column not in ('Correlation ID', 'Calling number', 'Called number'))
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", 10000))
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def export_rows(call_groups):
+    '''
+    Yields the entries of the (correlation id, call group) pairs as rows (tuples in the EXPORT_COLUMNS order).
+    '''
+
+    other_columns = EXPORT_COLUMNS[6:]
+
+    for correlation_id, call_group in call_groups:
+        for leg, call_entry in enumerate(call_group, 1):
+            yield (correlation_id, leg,
+                   call_entry['Calling number'], ";".join(tag_labels(call_entry['Calling tag'])),
+                   call_entry['Called number'], ";".join(tag_labels(call_entry['Called tag']))) + \
+                tuple(call_entry.get(column) for column in other_columns)
+
+
+def chunks(rows, chunk_rows=None):
+    '''
+    Yields lists of up to chunk_rows rows.
+    '''
+
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_rows or EXPORT_CHUNK_ROWS))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_csv(rows, chunk_rows=None):
+    '''
+    Yields the CSV export (header and rows) in chunks of chunk_rows rows.
+    '''
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+
+    for chunk in chunks(rows, chunk_rows):
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def iter_ndjson(rows, chunk_rows=None):
+    '''
+    Yields the NDJSON export (one JSON object per row) in chunks of chunk_rows rows.
+    '''
+
+    for chunk in chunks(rows, chunk_rows):
+        yield "".join(json.dumps(dict(zip(EXPORT_COLUMNS, row))) + "\n" for row in chunk)
+
+
+def iter_parquet(rows, chunk_rows=None):
+    '''
+    Yields the Parquet export, written with pyarrow to a temporary file with one row group per chunk of rows,
+    afterwards the file is sent in blocks. Raises ImportError if pyarrow is not installed.
+    '''
+
+    import pyarrow
+    import pyarrow.parquet
+
+    schema = pyarrow.schema([(column, pyarrow.int32() if column == 'Leg' else pyarrow.string()) for column in EXPORT_COLUMNS])
+
+    def generate(file):
+        with file:
+            with pyarrow.parquet.ParquetWriter(file, schema) as writer:
+                for chunk in chunks(rows, chunk_rows):
+                    columns = [[value if value is None or field.type != pyarrow.string() else str(value) for value in values]
+                               for values, field in zip(zip(*chunk), schema)]
+                    writer.write_table(pyarrow.Table.from_arrays([pyarrow.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema))
+
+            file.seek(0)
+            while True:
+                block = file.read(1024 * 1024)
+                if not block:
+                    return
+                yield block
+
+    # iter_parquet itself is no generator, so a missing pyarrow raises before the response starts
+    return generate(tempfile.TemporaryFile())
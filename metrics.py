@@ -0,0 +1,375 @@
+""" Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+           https://developer.cisco.com/docs/licenses
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+from dotenv import load_dotenv
+import bisect
+import cProfile
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+import logging
+log = logging.getLogger(__name__)
+
+from process_local import process_running
+
+try:
+    import resource
+except ImportError:
+    # Windows: no memory usage of the process
+    resource = None
+
+load_dotenv()
+
+PREFIX = "webex_reporting"
+
+# Upper bounds (seconds) of the duration histogram buckets, from short API calls to report generation
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+METRIC_HELP = {
+    'stage_seconds': ('histogram', 'Duration of the report pipeline stages'),
+    'api_call_seconds': ('histogram', 'Duration of the Webex and WxCC API calls (per attempt)'),
+    'http_request_seconds': ('histogram', 'Duration of the HTTP requests (until the response starts)'),
+    'api_calls_total': ('counter', 'Webex and WxCC API calls (per attempt) by outcome'),
+    'http_requests_total': ('counter', 'HTTP requests by endpoint and status'),
+    'rows_total': ('counter', 'Call records processed'),
+    'notification_rows_total': ('counter', 'PushNotificationRetrieval records removed'),
+    'call_groups_total': ('counter', 'Call groups processed'),
+    'tags_total': ('counter', 'Numbers tagged by the categorization, by tag'),
+    'resident_memory_bytes': ('gauge', 'Resident memory of the worker process'),
+    'peak_resident_memory_bytes': ('gauge', 'Peak resident memory of the worker process'),
+}
+
+# Namespace of the metrics of the worker processes (pid -> snapshot) in the shared cache
+SHARED_NAMESPACE = "metrics"
+
+
+class TimedRows():
+    '''
+    Iterator over rows which measures the time spent producing them (e.g. parsing a csv report). The rows are
+    read in blocks, so the time is measured per block instead of per row.
+    '''
+
+    def __init__(self, rows, block_size=1024):
+        self.rows = iter(rows)
+        self.block_size = block_size
+        self.seconds = 0.0
+        self.count = 0
+
+
+    def __iter__(self):
+        rows, block_size = self.rows, self.block_size
+        while True:
+            start = time.perf_counter()
+            block = [row for _, row in zip(range(block_size), rows)]
+            self.seconds += time.perf_counter() - start
+            self.count += len(block)
+            if not block:
+                return
+            yield from block
+
+
+class Metrics():
+    '''
+    Counters and duration histograms of the report pipeline, rendered in the Prometheus text format.
+    The stages measured while handling a request are also collected per request (timing header).
+    With a shared cache, the metrics of all worker processes are published to it and rendered together.
+    '''
+
+    def __init__(self, share_interval=None, retention=None):
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.share_interval = share_interval if share_interval is not None else float(os.getenv("METRICS_SHARE_INTERVAL", 5))
+        self.retention = retention if retention is not None else int(os.getenv("METRICS_RETENTION", 86400))
+        self.shared_at = 0
+
+
+    def count(self, name, amount=1, **labels):
+        '''
+        Increases a counter, also in the counts of the current request.
+        '''
+
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+        request_metrics = getattr(self.local, 'request', None)
+        if request_metrics is not None and not labels:
+            request_metrics['counts'][name] = request_metrics['counts'].get(name, 0) + amount
+
+
+    def observe(self, name, seconds, **labels):
+        '''
+        Adds a duration to a histogram.
+        '''
+
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                # Bucket counts, sum, count
+                histogram = self.histograms[key] = [0] * (len(BUCKETS) + 2)
+            histogram[bisect.bisect_left(BUCKETS, seconds)] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+
+
+    def stage(self, stage, seconds, **labels):
+        '''
+        Records the duration of a pipeline stage, also in the timings of the current request.
+        '''
+
+        self.observe('stage_seconds', seconds, stage=stage, **labels)
+
+        request_metrics = getattr(self.local, 'request', None)
+        if request_metrics is not None:
+            request_metrics['timings'][stage] = request_metrics['timings'].get(stage, 0.0) + seconds
+
+
+    @contextmanager
+    def timer(self, stage, **labels):
+        '''
+        Measures the duration of a pipeline stage (with statement).
+        '''
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage(stage, time.perf_counter() - start, **labels)
+
+
+    def start_request(self):
+        '''
+        Starts collecting the stage timings and counts of a request in the current thread.
+        '''
+
+        self.local.request = {'timings': {}, 'counts': {}, 'start': time.perf_counter(), 'peak_memory': peak_memory()}
+
+
+    def finish_request(self, endpoint, method, status):
+        '''
+        Stops collecting for the request of the current thread and records its duration.
+        Returns the stage timings (seconds) and counts of the request (with the increase of the process peak memory).
+        '''
+
+        request_metrics = getattr(self.local, 'request', None)
+        self.local.request = None
+        if request_metrics is None:
+            return {}, {}
+
+        seconds = time.perf_counter() - request_metrics['start']
+        self.observe('http_request_seconds', seconds, endpoint=endpoint)
+        self.count('http_requests_total', endpoint=endpoint, method=method, status=str(status))
+
+        timings = dict(request_metrics['timings'], total=seconds)
+        counts = request_metrics['counts']
+        if request_metrics['peak_memory'] is not None:
+            counts['peak_memory_increase_bytes'] = peak_memory() - request_metrics['peak_memory']
+
+        return timings, counts
+
+
+    def snapshot(self):
+        '''
+        Returns a copy of the counters, the histograms and the memory gauges of the process.
+        '''
+
+        gauges = {}
+        memory = memory_usage()
+        if memory:
+            worker = (('worker', str(os.getpid())),)
+            gauges = {('resident_memory_bytes', worker): memory[0], ('peak_resident_memory_bytes', worker): memory[1]}
+
+        with self.lock:
+            return {'counters': dict(self.counters), 'histograms': {key: list(histogram) for key, histogram in self.histograms.items()},
+                    'gauges': gauges}
+
+
+    def share(self, shared, force=False):
+        '''
+        Publishes the snapshot of the process to the shared cache, at most every share interval.
+        '''
+
+        now = time.time()
+        if not shared or not force and now - self.shared_at < self.share_interval:
+            return
+
+        self.shared_at = now
+        try:
+            shared.set(SHARED_NAMESPACE, str(os.getpid()), self.snapshot(), now)
+            shared.prune(SHARED_NAMESPACE, now - self.retention)
+        except Exception as e:
+            print(f"Error: Unable to share the metrics: {e}")
+
+
+    def render(self, shared=None):
+        '''
+        Renders the metrics in the Prometheus text format: the sum of the metrics of all worker processes
+        (published to the shared cache) or of this process only.
+        '''
+
+        snapshots = {os.getpid(): self.snapshot()}
+        if shared:
+            self.share(shared, force=True)
+            try:
+                snapshots.update((int(pid), snapshot) for pid, snapshot in shared.items(SHARED_NAMESPACE))
+            except Exception as e:
+                print(f"Error: Unable to read the shared metrics: {e}")
+
+        counters, histograms = {}, {}
+        for snapshot in snapshots.values():
+            for key, value in snapshot['counters'].items():
+                counters[key] = counters.get(key, 0) + value
+            for key, histogram in snapshot['histograms'].items():
+                histograms[key] = [total + value for total, value in zip(histograms.get(key, [0] * len(histogram)), histogram)]
+
+        # The memory of the running workers only, the counters of exited workers are kept
+        gauges = {}
+        for pid, snapshot in snapshots.items():
+            if pid == os.getpid() or process_running(pid):
+                gauges.update(snapshot.get('gauges', {}))
+
+        lines = []
+        for name, (metric_type, help_text) in METRIC_HELP.items():
+            samples = sorted(key for key in (histograms if metric_type == 'histogram' else counters if metric_type == 'counter' else gauges) if key[0] == name)
+            if not samples:
+                continue
+            lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PREFIX}_{name} {metric_type}")
+
+            for key in samples:
+                labels = key[1]
+                if metric_type == 'histogram':
+                    histogram = histograms[key]
+                    cumulative = 0
+                    for bound, bucket_count in zip((*BUCKETS, '+Inf'), histogram):
+                        cumulative += bucket_count
+                        lines.append(f"{PREFIX}_{name}_bucket{format_labels(labels + (('le', str(bound)),))} {cumulative}")
+                    lines.append(f"{PREFIX}_{name}_sum{format_labels(labels)} {histogram[-2]}")
+                    lines.append(f"{PREFIX}_{name}_count{format_labels(labels)} {histogram[-1]}")
+                else:
+                    lines.append(f"{PREFIX}_{name}{format_labels(labels)} {(counters if metric_type == 'counter' else gauges)[key]}")
+
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+
+def peak_memory():
+    '''
+    Returns the peak resident memory (bytes) of the process or None.
+    '''
+
+    if resource is None:
+        return None
+
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def memory_usage():
+    '''
+    Returns the resident and the peak resident memory (bytes) of the process or None.
+    '''
+
+    try:
+        with open('/proc/self/statm', 'r') as file:
+            resident = int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+    # The peak is updated by the kernel with a delay
+    return resident, max(resident, peak_memory() or 0)
+
+
+class RequestProfiler():
+    '''
+    Opt-in profile of a single request (PROFILING_ENABLED=true and ?profile=cpu or ?profile=memory): a cProfile
+    dump (.prof, e.g. for snakeviz) or the top allocations of tracemalloc (.txt) in the profile directory.
+    Only one request per process is profiled at a time.
+    '''
+
+    lock = threading.Lock()
+
+    def __init__(self, mode, name, directory=None):
+        self.mode = mode
+        self.name = name
+        self.directory = Path(directory or os.getenv("PROFILE_DIRECTORY", './reports/profiles'))
+        self.profiler = None
+        self.path = None
+        self.peak = None
+
+
+    @staticmethod
+    def enabled():
+        return os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+
+
+    def start(self):
+        '''
+        Starts profiling, returns False if another request is profiled or the mode is unknown.
+        '''
+
+        if self.mode not in ('cpu', 'memory') or not RequestProfiler.lock.acquire(blocking=False):
+            return False
+
+        if self.mode == 'cpu':
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            tracemalloc.start(int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", 10)))
+
+        return True
+
+
+    def stop(self):
+        '''
+        Stops profiling and writes the profile, returns its path.
+        '''
+
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            file_name = f"{self.name}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+
+            if self.mode == 'cpu':
+                self.profiler.disable()
+                self.path = self.directory / f"{file_name}.prof"
+                self.profiler.dump_stats(self.path)
+            else:
+                snapshot = tracemalloc.take_snapshot()
+                _, self.peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                self.path = self.directory / f"{file_name}.txt"
+                with open(self.path, 'w', encoding='utf-8') as file:
+                    file.write(f"Peak traced memory: {self.peak} bytes\n\n")
+                    for statistic in snapshot.statistics('traceback')[:int(os.getenv("PROFILE_TOP_ALLOCATIONS", 30))]:
+                        file.write(f"{statistic}\n")
+                        file.writelines(f"    {line}\n" for line in statistic.traceback.format())
+
+            return self.path
+        finally:
+            RequestProfiler.lock.release()
+
+
+metrics = Metrics()
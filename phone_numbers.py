@@ -0,0 +1,92 @@
+""" Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+           https://developer.cisco.com/docs/licenses
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+from dotenv import load_dotenv
+import os
+import re
+from functools import lru_cache
+
+load_dotenv()
+
+# Country code of numbers in national format, e.g. 5551234567 -> +15551234567
+DEFAULT_COUNTRY_CODE = os.getenv("DEFAULT_COUNTRY_CODE", "1").lstrip("+")
+# Prefix of numbers in national format, e.g. 0 in 0301234567 (empty in the North American Numbering Plan)
+NATIONAL_PREFIX = os.getenv("NATIONAL_PREFIX", "")
+# Numbers with fewer digits are internal extensions and kept as they are
+MIN_NATIONAL_NUMBER_LENGTH = int(os.getenv("MIN_NATIONAL_NUMBER_LENGTH", 7))
+
+# Extension suffixes: "+15551234567 x100", "+15551234567 ext. 100", "+15551234567;ext=100"
+EXTENSION_PATTERN = re.compile(r'\s*(?:;ext=|(?:x|ext\.?|extension)\s*)(\d+)$', re.IGNORECASE)
+# Formatting characters of a number: spaces, dashes, dots, slashes and brackets
+FORMATTING_PATTERN = re.compile(r'[\s\-./()]')
+
+
+def normalize_number(number):
+    '''
+    Returns the canonical (E.164) form of a number, used as key to match CDR numbers with directory numbers:
+    "+1 (555) 123-4567", "0015551234567", "15551234567" and "5551234567" all become "+15551234567".
+    Extensions stay part of the number in the RFC 3966 form, e.g. "+15551234567 x100" becomes "+15551234567;ext=100",
+    so an extension neither matches the main number nor other extensions of it.
+    Internal extensions are returned as digits, values which are no numbers (e.g. "NA" or SIP URIs) unchanged.
+    '''
+
+    # Most numbers are E.164 already and returned without a cache lookup
+    if not number or number[0] == '+' and number[1:].isdigit():
+        return number
+
+    return _normalize_formatted_number(number)
+
+
+@lru_cache(maxsize=int(os.getenv("PHONE_NUMBER_CACHE_SIZE", 131072)))
+def _normalize_formatted_number(number):
+    '''
+    Normalizes a number which is not in E.164 format, repeated numbers are served from the cache.
+    '''
+
+    stripped = number.strip()
+    extension = EXTENSION_PATTERN.search(stripped)
+    if extension:
+        stripped = stripped[:extension.start()]
+
+    normalized = _normalize_digits(FORMATTING_PATTERN.sub('', stripped))
+    if normalized is None:
+        return number
+
+    return f"{normalized};ext={extension.group(1)}" if extension else normalized
+
+
+def _normalize_digits(digits):
+    '''
+    Returns the canonical form of a number without formatting characters, or None if it is no number.
+    '''
+
+    international = digits.startswith('+')
+    if international:
+        digits = digits[1:]
+
+    if not digits.isdigit():
+        return None
+
+    if international:
+        return f"+{digits}"
+    if digits.startswith('00'):
+        return f"+{digits[2:]}"
+    if len(digits) < MIN_NATIONAL_NUMBER_LENGTH:
+        return digits
+    if NATIONAL_PREFIX and digits.startswith(NATIONAL_PREFIX):
+        return f"+{DEFAULT_COUNTRY_CODE}{digits[len(NATIONAL_PREFIX):]}"
+    # Numbers starting with the country code are international numbers without "+" (e.g. WxCC dialled numbers)
+    if digits.startswith(DEFAULT_COUNTRY_CODE) and len(digits) > len(DEFAULT_COUNTRY_CODE) + MIN_NATIONAL_NUMBER_LENGTH:
+        return f"+{digits}"
+
+    return f"+{DEFAULT_COUNTRY_CODE}{digits}"
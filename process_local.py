@@ -0,0 +1,69 @@
+""" Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+           https://developer.cisco.com/docs/licenses
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+import os
+import threading
+import logging
+log = logging.getLogger(__name__)
+
+
+class ProcessLocal():
+    '''
+    A value created lazily on first use, once per process. Worker processes forked from a process which
+    already created the value (e.g. gunicorn --preload) create their own value, so connection pools and
+    locks are never shared between processes.
+    '''
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.lock = threading.Lock()
+        self.value = None
+        self.pid = None
+
+        # The lock might be held by another thread while the process forks
+        os.register_at_fork(after_in_child=self._reset)
+
+
+    def get(self):
+        '''
+        Returns the value of the current process, created by the factory on first use.
+        '''
+
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.value = self.factory()
+                    self.pid = os.getpid()
+
+        return self.value
+
+
+    def _reset(self):
+        self.lock = threading.Lock()
+        self.value = None
+        self.pid = None
+
+
+def process_running(pid):
+    '''
+    Checks if a process (of the same host) is running.
+    '''
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+    return True
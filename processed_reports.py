@@ -0,0 +1,234 @@
+""" Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+           https://developer.cisco.com/docs/licenses
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+from dotenv import load_dotenv
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from pathlib import Path
+import logging
+log = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Artifact layout: header (offset of the group index), the pickled call groups, the pickled group index
+HEADER = struct.Struct('<Q')
+
+# Part of the artifact key, changed whenever the structure of the processed call entries or the categorization changes
+# (2: tags as codes in 'Calling tag'/'Called tag' instead of appended to the numbers, 3: numbers matched in normalized form)
+ARTIFACT_VERSION = 4
+
+
+class ProcessedReport(Mapping):
+    '''
+    Read-only view (correlation id -> call group) of a processed report artifact.
+    The artifact is memory-mapped and a call group is only unpickled when it is accessed.
+    '''
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        index_offset, = HEADER.unpack_from(self.buffer, 0)
+        self.index = pickle.loads(self.buffer[index_offset:])
+
+
+    def __getitem__(self, key):
+        offset, length = self.index[key]
+        return pickle.loads(self.buffer[offset:offset + length])
+
+
+    def __iter__(self):
+        return iter(self.index)
+
+
+    def __len__(self):
+        return len(self.index)
+
+
+class ProcessedReportCache():
+    '''
+    Stores the processed (grouped and categorized) call history of a report as a binary artifact, keyed by
+    the report id, the report file version and the fingerprint of the directory data used for categorization.
+    A changed directory leads to a different key, so the report is processed again and the old artifact is removed.
+    '''
+
+    def __init__(self, directory='./reports/processed', max_open=None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        # The latest opened artifacts (most recently used last), the following pages of a report reuse their group index
+        self.open_reports = OrderedDict()
+        self.max_open = max_open or int(os.getenv("PROCESSED_REPORTS_OPEN", 4))
+
+
+    def get_or_process(self, report_path, directory_fingerprint, process_report):
+        '''
+        Returns the processed report from its artifact, or processes it with process_report and stores the artifact.
+        '''
+
+        path = self._path(Path(report_path), directory_fingerprint)
+
+        report = self._open(path)
+        if report is not None:
+            return report
+
+        report_data = process_report()
+        self.store(path, report_data)
+
+        return report_data
+
+
+    def iter_or_process(self, report_path, directory_fingerprint, iter_report):
+        '''
+        Yields the (correlation id, call group) pairs of the processed report from its artifact, or from iter_report
+        while they are written to the artifact. Used to stream reports, the artifact is only stored when all groups were consumed.
+        '''
+
+        path = self._path(Path(report_path), directory_fingerprint)
+
+        report = self._open(path)
+        if report is not None:
+            yield from report.items()
+        else:
+            yield from self._write(path, iter_report())
+
+
+    def store_report(self, report_path, directory_fingerprint, report_data):
+        '''
+        Stores the artifact of a report processed elsewhere, e.g. while the report was downloaded.
+        '''
+
+        self.store(self._path(Path(report_path), directory_fingerprint), report_data)
+
+
+    def store(self, path, report_data):
+        '''
+        Writes the artifact of a processed report (atomically via a temporary file) and removes the
+        artifacts of the same report built from other directory data or report versions.
+        '''
+
+        for _ in self._write(path, report_data.items()):
+            pass
+
+
+    def _open(self, path):
+        '''
+        Returns the opened artifact or None if it does not exist (or is unreadable).
+        '''
+
+        with self.lock:
+            if path in self.open_reports:
+                self.open_reports.move_to_end(path)
+                return self.open_reports[path]
+
+        if not path.exists():
+            return None
+
+        try:
+            report = ProcessedReport(path)
+        except (OSError, ValueError, pickle.UnpicklingError, struct.error) as e:
+            print(f"Error: Unable to read processed report {path}: {e}")
+            return None
+
+        with self.lock:
+            self.open_reports[path] = report
+            while len(self.open_reports) > self.max_open:
+                self.open_reports.popitem(last=False)
+
+        return report
+
+
+    def _write(self, path, items):
+        '''
+        Writes the (correlation id, call group) pairs to the artifact and yields them once written.
+        Write errors only stop the artifact, all pairs are still yielded.
+        '''
+
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        index = {}
+        file = None
+
+        try:
+            try:
+                file = open(temp_path, 'wb')
+                file.write(HEADER.pack(0))
+            except OSError as e:
+                print(f"Error: Unable to store processed report {path}: {e}")
+                file = None
+
+            for call_group_key, call_group in items:
+                if file:
+                    try:
+                        data = pickle.dumps(call_group, protocol=5)
+                        index[call_group_key] = (file.tell(), len(data))
+                        file.write(data)
+                    except OSError as e:
+                        print(f"Error: Unable to store processed report {path}: {e}")
+                        file.close()
+                        file = None
+                yield call_group_key, call_group
+
+            if file:
+                try:
+                    index_offset = file.tell()
+                    pickle.dump(index, file, protocol=5)
+                    file.seek(0)
+                    file.write(HEADER.pack(index_offset))
+                    file.close()
+                    os.replace(temp_path, path)
+                except OSError as e:
+                    print(f"Error: Unable to store processed report {path}: {e}")
+                else:
+                    self.prune(keep=path)
+        finally:
+            if file and not file.closed:
+                file.close()
+            if temp_path.exists():
+                temp_path.unlink()
+
+
+    def prune(self, keep=None):
+        '''
+        Removes outdated artifacts: older artifacts of the kept report and artifacts of deleted reports.
+        '''
+
+        prefix = keep.name.rsplit('.', 2)[0] if keep else None
+
+        with self.lock:
+            for artifact in self.directory.glob('*.pickle'):
+                report_id = artifact.name.rsplit('.', 2)[0]
+                if artifact == keep:
+                    continue
+                if report_id == prefix or not (self.directory.parent / f'{report_id}.csv').exists():
+                    self.open_reports.pop(artifact, None)
+                    try:
+                        artifact.unlink()
+                    except OSError:
+                        pass
+
+
+    def _path(self, report_path, directory_fingerprint):
+        '''
+        Returns the artifact path of a report: report id and a hash of the artifact version, the report file version and the directory fingerprint.
+        '''
+
+        report_stat = report_path.stat()
+        key = hashlib.sha1(f"{ARTIFACT_VERSION}:{report_stat.st_size}:{report_stat.st_mtime_ns}:{directory_fingerprint}".encode('utf-8')).hexdigest()[:16]
+
+        return self.directory / f'{report_path.stem}.{key}.pickle'
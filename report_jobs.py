@@ -0,0 +1,267 @@
+""" Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+           https://developer.cisco.com/docs/licenses
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+from dotenv import load_dotenv
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import logging
+log = logging.getLogger(__name__)
+
+from process_local import process_running
+
+load_dotenv()
+
+# Namespaces of the jobs (job id -> job) and of the active jobs (key -> job id) in the shared cache
+SHARED_JOBS = "report_jobs"
+SHARED_ACTIVE_JOBS = "active_report_jobs"
+# Duration (seconds) of the lease held by a worker while it creates and shares a job
+SUBMIT_LEASE_DURATION = 10
+
+
+class ReportJob():
+    '''
+    A background report generation job for a (template_id, start_date, end_date) key.
+    '''
+
+    def __init__(self, key):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = 'queued'
+        self.report_id = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        # Process running the job, a job of another worker is failed once its process exited
+        self.pid = os.getpid()
+
+
+    @property
+    def active(self):
+        return self.status in ('queued', 'running')
+
+
+    def to_dict(self):
+        template_id, start_date, end_date = self.key
+        return {
+            'id': self.id,
+            'status': self.status,
+            'template_id': template_id,
+            'start_date': start_date,
+            'end_date': end_date,
+            'report_id': self.report_id,
+            'error': self.error,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+        }
+
+
+    @classmethod
+    def from_shared(cls, shared_job):
+        '''
+        Returns a job of another worker from its shared state (the job dictionary and the pid of the worker).
+        '''
+
+        job = cls((shared_job['template_id'], shared_job['start_date'], shared_job['end_date']))
+        for attribute in ('id', 'status', 'report_id', 'error', 'created_at', 'finished_at', 'pid'):
+            setattr(job, attribute, shared_job[attribute])
+
+        if job.active and not process_running(job.pid):
+            job.status = 'failed'
+            job.error = 'The worker running the report job exited'
+            job.finished_at = job.finished_at or time.time()
+
+        return job
+
+
+class ReportJobManager():
+    '''
+    Runs the report workflow (create, poll, download and delete a report) in background workers.
+    Concurrent requests for the same (template_id, start_date, end_date) share one job.
+    With a shared cache (shared_cache.py), the jobs are shared by the worker processes: the status of a job
+    can be requested from any worker, and a request joins the active job of another worker.
+    '''
+
+    def __init__(self, report_workflow, max_workers=None, retention=None, shared=None):
+        self.report_workflow = report_workflow
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or int(os.getenv("REPORT_JOB_WORKERS", 2)), thread_name_prefix='report-job')
+        self.retention = retention if retention is not None else int(os.getenv("REPORT_JOB_RETENTION", 3600))
+        self.jobs = {}
+        self.active_jobs = {}
+        self.lock = threading.Lock()
+        self.shared = shared
+
+
+    def submit(self, template_id, start_date, end_date):
+        '''
+        Submits a report job, or returns the active job for the same template and date range.
+        '''
+
+        key = (template_id, start_date, end_date)
+
+        with self.lock:
+            self._prune()
+
+            job = self.active_jobs.get(key)
+            if job:
+                return job
+
+            job = self._claim_shared_key(key)
+            if job:
+                return job
+
+            job = ReportJob(key)
+            self.jobs[job.id] = job
+            self.active_jobs[key] = job
+
+            self._share(job)
+            if self.shared:
+                self._call_shared('release_lease', self._submit_lease(key))
+
+        self.executor.submit(self._run, job)
+        print(f"Submitted report job {job.id} for template {template_id} ({start_date} - {end_date})")
+        return job
+
+
+    def get(self, job_id):
+        '''
+        Returns a job by its id or None.
+        '''
+
+        with self.lock:
+            job = self.jobs.get(job_id)
+
+        if job or not self.shared:
+            return job
+
+        shared_job = self._call_shared('get', SHARED_JOBS, job_id)
+        return ReportJob.from_shared(shared_job[0]) if shared_job else None
+
+
+    def _run(self, job):
+        '''
+        Runs the report workflow of a job and records its outcome.
+        '''
+
+        job.status = 'running'
+        self._share(job)
+
+        try:
+            report_id = self.report_workflow(*job.key)
+            if not report_id:
+                raise Exception("Report could not be downloaded")
+            job.report_id = report_id
+            job.status = 'done'
+        except Exception as e:
+            print(f"Error: Report job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished_at = time.time()
+            with self.lock:
+                if self.active_jobs.get(job.key) is job:
+                    del self.active_jobs[job.key]
+            self._share(job)
+
+
+    def _prune(self):
+        '''
+        Removes finished jobs older than the retention time.
+        '''
+
+        now = time.time()
+        for job_id, job in list(self.jobs.items()):
+            if not job.active and now - job.finished_at > self.retention:
+                del self.jobs[job_id]
+
+        if self.shared:
+            self._call_shared('prune', SHARED_JOBS, now - self.retention)
+            self._call_shared('prune', SHARED_ACTIVE_JOBS, now - self.retention)
+
+
+    def _claim_shared_key(self, key):
+        '''
+        Returns the active job of another worker for the same key, or None once the current worker holds the
+        submit lease of the key (released after the new job is shared). A worker losing the lease waits for the
+        job of the lease owner.
+        '''
+
+        if not self.shared:
+            return None
+
+        deadline = time.time() + SUBMIT_LEASE_DURATION
+        while True:
+            job = self._shared_active_job(key)
+            if job:
+                return job
+
+            # Without shared cache (None), the job is submitted by the current worker
+            if self._call_shared('acquire_lease', self._submit_lease(key), SUBMIT_LEASE_DURATION) is not False:
+                # The owner of the previous lease might have shared its job in the meantime
+                job = self._shared_active_job(key)
+                if job:
+                    self._call_shared('release_lease', self._submit_lease(key))
+                return job
+
+            if time.time() >= deadline:
+                return None
+            time.sleep(0.05)
+
+
+    @staticmethod
+    def _submit_lease(key):
+        return f"{SHARED_ACTIVE_JOBS}:{'|'.join(map(str, key))}"
+
+
+    def _shared_active_job(self, key):
+        '''
+        Returns the active job of another worker for the same key or None.
+        '''
+
+        if not self.shared:
+            return None
+
+        active_job = self._call_shared('get', SHARED_ACTIVE_JOBS, "|".join(map(str, key)))
+        shared_job = active_job and self._call_shared('get', SHARED_JOBS, active_job[0])
+        if not shared_job:
+            return None
+
+        job = ReportJob.from_shared(shared_job[0])
+        return job if job.active else None
+
+
+    def _share(self, job):
+        '''
+        Writes the state of a job to the shared cache.
+        '''
+
+        if not self.shared:
+            return
+
+        self._call_shared('set', SHARED_JOBS, job.id, dict(job.to_dict(), pid=job.pid))
+        if job.active:
+            self._call_shared('set', SHARED_ACTIVE_JOBS, "|".join(map(str, job.key)), job.id)
+
+
+    def _call_shared(self, method, *args):
+        '''
+        Calls a method of the shared cache, errors are printed and return None (the jobs of this worker work without it).
+        '''
+
+        try:
+            return getattr(self.shared, method)(*args)
+        except Exception as e:
+            print(f"Error: Shared report jobs unavailable ({method}): {e}")
+            return None
@@ -11,19 +11,31 @@ IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
 or implied. 
 """
 
-import copy
+import time
+from collections import Counter
+
+from categorization_index import CategorizationIndex, tag_labels
+from metrics import metrics, TimedRows
+from phone_numbers import normalize_number
 
 class ReportProcessing:
     '''
     Class for report processing - sorts, orders, filters and categorizes the report entries.
+    The report entries are grouped, filtered and tagged in place, without copies of the call history.
+    The call history can be a list or any iterator of entries (e.g. CSVReader.iter_csv), it is consumed once.
     '''
 
-    def __init__(self, call_history, wxcc_dial_numbers, wxcc_user, w_queue_numbers, w_phone_numbers):
+    def __init__(self, call_history, wxcc_dial_numbers=(), wxcc_user=(), w_queue_numbers=(), w_phone_numbers=(), categorization_index=None):
         self.call_history = call_history
         self.wxcc_dial_numbers = wxcc_dial_numbers
         self.wxcc_user = wxcc_user
         self.w_phone_numbers = w_phone_numbers
         self.w_queue_numbers = w_queue_numbers
+        self.categorization_index = categorization_index or CategorizationIndex.from_directories(wxcc_dial_numbers, wxcc_user, w_queue_numbers, w_phone_numbers)
+        # Durations of the group stages and tag code counts, recorded in the metrics by record_metrics
+        self.stage_seconds = dict.fromkeys(('twin_removal', 'sort', 'categorize'), 0.0)
+        self.tag_counts = Counter()
+        self.group_count = 0
 
 
     def entry_is_no_notification_entry(self, call_entry):
@@ -55,196 +67,171 @@ class ReportProcessing:
         return sorted_history
 
 
-    def entries_of_same_bidirectional_connection(self, compare_call_entry, call_entry):
+    def connection_key(self, call_entry):
         '''
-        Checks if two entries are part of the same connection. Each covering one of the directions. 
+        Returns the key identifying a connection. Both entries of a bidirectional connection share it.
         '''
-        
-        return compare_call_entry["Start time"] == call_entry["Start time"] and compare_call_entry["Called number"] == call_entry["Called number"] and compare_call_entry['Direction'] == "TERMINATING" and call_entry['Direction'] == "ORIGINATING"
 
+        return (call_entry["Start time"], call_entry["Called number"])
 
-    def remove_origination_entries_for_two_way_entries(self, call_history):
+
+    def remove_origination_entries_of_group(self, call_entry_group):
         '''
-        Removes the ORIGINATING entries in case an associated TERMINATING entry for the same connection is additionally available in the call history.
+        Removes the ORIGINATING entries of a group in case an associated TERMINATING entry for the same connection is part of the group.
         '''
-        
-        filtered_call_history = {}
 
-        for call_entry_group_key, call_entry_group in call_history.items():
-            filtered_call_history[call_entry_group_key] = []
+        terminating_connections = {self.connection_key(call_entry) for call_entry in call_entry_group if call_entry['Direction'] == "TERMINATING"}
 
-            for call_entry in call_entry_group: 
+        if not terminating_connections:
+            return call_entry_group
 
-                mark_for_delete = False
+        return [call_entry for call_entry in call_entry_group
+                if call_entry['Direction'] != "ORIGINATING" or self.connection_key(call_entry) not in terminating_connections]
 
-                for compare_call_entry in call_entry_group: 
 
-                    if self.entries_of_same_bidirectional_connection(compare_call_entry, call_entry):
-
-                        mark_for_delete = True
-                        break
-
-                if not mark_for_delete:
-                    filtered_call_history[call_entry_group_key].append(call_entry)
-        
-        return filtered_call_history
-
-
-    def sort_by_start_time(self, call_history):
+    def remove_origination_entries_for_two_way_entries(self, call_history):
         '''
-        Sorts the call history entries by start time. 
+        Removes the ORIGINATING entries in case an associated TERMINATING entry for the same connection is additionally available in the call history.
         '''
 
-        ordered_call_history = copy.deepcopy(call_history)
-
         for call_entry_group_key, call_entry_group in call_history.items():
-            ordered_call_history[call_entry_group_key] = []
-
-            ordered_call_history[call_entry_group_key] = sorted(call_entry_group, key=lambda x: x['Start time'])
+            call_history[call_entry_group_key] = self.remove_origination_entries_of_group(call_entry_group)
 
-        return ordered_call_history
+        return call_history
 
 
-    def already_categorized_number(self, number_string):
+    def sort_by_start_time(self, call_history):
         '''
-        Checks if a number string was already tagged.
+        Sorts the call history entries by start time. 
         '''
 
-        if "(" in number_string:
-            return False
-        return True
+        for call_entry_group in call_history.values():
+            call_entry_group.sort(key=lambda x: x['Start time'])
+
+        return call_history
 
 
-    def tag_calling_string(self, call_entry, calling_number, tag):
+    def categorize_entry(self, call_entry):
         '''
-        Tags calling number string and returns new calling_number value.
+        Categorizes the calling and called number of a single report entry via the categorization index and stores
+        the tag codes in 'Calling tag' and 'Called tag', the numbers stay unchanged and are matched in normalized form.
+        Tags are applied in the order WxCC dial number, WxCC user, Webex call queue, Webex number.
         '''
 
-        call_entry['Calling number'] = f"{calling_number} {tag}"
-        calling_number = call_entry['Calling number']
-        return call_entry, calling_number
-
+        calling_number = normalize_number(call_entry['Calling number'])
+        called_number = normalize_number(call_entry['Called number'])
+        categorization_index = self.categorization_index
 
-    def tag_called_string(self, call_entry, called_number, tag):
-        '''
-        Tags called number string and returns new called_number value.
-        '''
+        calling_tag = categorization_index.dial_number_tag(calling_number)
+        called_tag = categorization_index.dial_number_tag(called_number)
 
-        call_entry['Called number'] = f"{called_number} {tag}"
-        called_number = call_entry['Called number']
-        return call_entry, called_number
+        if not called_tag:
+            user_tags = categorization_index.wxcc_user_tags(call_entry['User UUID'])
+            if user_tags:
+                direction = call_entry['Direction']
+                if direction == "ORIGINATING":
+                    for tag in user_tags:
+                        calling_tag |= tag
+                elif direction == "TERMINATING":
+                    called_tag = user_tags[0]
 
+        if not calling_tag:
+            calling_tag = categorization_index.number_tag(calling_number)
+        if not called_tag:
+            called_tag = categorization_index.number_tag(called_number)
 
-    def compare_and_tag_number_on_match(self, call_entry, identifier_number, calling_number, called_number, tag):
-        '''
-        Compares the calling and called number with the identifier number. 
-        If equal and number wasn't categorized before, it is tagged.
-        '''
-        
-        if calling_number == identifier_number and self.already_categorized_number(calling_number):
-            call_entry, calling_number = self.tag_calling_string(call_entry, calling_number, tag)
-        if called_number == identifier_number and self.already_categorized_number(called_number):
-            call_entry, called_number = self.tag_called_string(call_entry, called_number, tag)
+        call_entry['Calling tag'] = calling_tag
+        call_entry['Called tag'] = called_tag
 
-        return call_entry, calling_number, called_number
+        return call_entry
 
 
-    def map_and_tag_numbers(self, call_entry, identifiers_numbers, identifier_key, tag, calling_number, called_number):
+    def categorize_entries(self, call_history):
         '''
-        Maps the calling and called numbers to a identifiers_number (in identifiers_numbers list with identifier_key).
-        On successful mapping the number is tagged with a provided tag string.
+        Categorizes the calling number, called number or user uuid of all report entries based on information
+        about the WxCC dial numbers, Webex queue numbers, Webex overall numbers or WxCC users. 
         '''
 
-        for identifier_number_entry in identifiers_numbers:
-            if identifier_key in identifier_number_entry:
-                identifier_number= identifier_number_entry[identifier_key]
+        for call_entry_group in call_history.values():
 
-                call_entry, calling_number, called_number = self.compare_and_tag_number_on_match(call_entry, identifier_number, calling_number, called_number, tag) 
+            for call_entry in call_entry_group:
+                self.categorize_entry(call_entry)
 
-        return call_entry, calling_number, called_number
+        return call_history
 
 
-    def map_and_tag_wxcc_users(self, call_entry, wxcc_users, calling_number, called_number):
+    def process_call_entry_group(self, call_entry_group):
         '''
-        Maps the user uuid to WxCC users. Furthermore, it checks if the mapped user has a agend profil ID.
-        On successful mapping the calling or called number is tagged with (WxCC Agent User) or (WxCC User).
+        Filters, orders and categorizes the entries of a single correlation group.
         '''
 
-        report_user_uuid = call_entry['User UUID']
-        direction = call_entry['Direction']
+        start = time.perf_counter()
+        call_entry_group = self.remove_origination_entries_of_group(call_entry_group)
+        removed = time.perf_counter()
+        call_entry_group.sort(key=lambda x: x['Start time'])
+        sorted_at = time.perf_counter()
 
-        for user in wxcc_users:
-            user_uuid = user['ciUserId']
+        tag_counts = self.tag_counts
+        for call_entry in call_entry_group:
+            self.categorize_entry(call_entry)
+            tag_counts[call_entry['Calling tag']] += 1
+            tag_counts[call_entry['Called tag']] += 1
 
-            if report_user_uuid == user_uuid:
-                if self.already_categorized_number(called_number):
-                    if "agentProfileId" in user:
-                        if direction == "ORIGINATING":
-                            call_entry, calling_number = self.tag_calling_string(call_entry, calling_number, "(WxCC Agent User)")
-                        if direction == "TERMINATING":
-                            call_entry, called_number = self.tag_called_string(call_entry, called_number, "(WxCC Agent User)")
-                    else:
-                        if direction == "ORIGINATING":
-                            call_entry, calling_number = self.tag_calling_string(call_entry, calling_number, "(WxCC User)")
-                        if direction == "TERMINATING":
-                            call_entry, called_number = self.tag_called_string(call_entry, called_number, "(WxCC User)")
+        stage_seconds = self.stage_seconds
+        stage_seconds['twin_removal'] += removed - start
+        stage_seconds['sort'] += sorted_at - removed
+        stage_seconds['categorize'] += time.perf_counter() - sorted_at
+        self.group_count += 1
 
-        return call_entry, calling_number, called_number
+        return call_entry_group
 
 
-    def map_and_tag_webex_numbers(self, call_entry, w_phone_numbers, calling_number, called_number):
+    def record_metrics(self):
         '''
-        Maps the calling and called numbers to Webex numbers and their owner type.
-        On successful mapping the number is tagged with (Webex User) or (Webex Number).
+        Records the durations of the group stages, the number of call groups and tags in the metrics
+        and resets them (the processor can be used for further groups).
         '''
 
-        for number in w_phone_numbers:
-
-            if "phoneNumber" in number:
-                phone_number = number['phoneNumber']
-                owner_type = number['owner']['type']
+        for stage, seconds in self.stage_seconds.items():
+            metrics.stage(stage, seconds, backend='python')
+        metrics.count('call_groups_total', self.group_count)
+        for code, count in self.tag_counts.items():
+            for label in tag_labels(code):
+                metrics.count('tags_total', count, tag=label)
 
-                if owner_type == "PEOPLE":
-                    call_entry, calling_number, called_number = self.compare_and_tag_number_on_match(call_entry, phone_number, calling_number, called_number, "(Webex User)") 
-                else: 
-                    call_entry, calling_number, called_number = self.compare_and_tag_number_on_match(call_entry, phone_number, calling_number, called_number, "(Webex Number)") 
+        self.stage_seconds = dict.fromkeys(self.stage_seconds, 0.0)
+        self.tag_counts = Counter()
+        self.group_count = 0
 
-        return call_entry, calling_number, called_number
 
-
-    def categorize_entries(self, call_history):
+    def process_report_data(self):
         '''
-        Categorizes the calling number, called number or user uuid of all report entries based on information
-        about the WxCC dial numbers, Webex queue numbers, Webex overall numbers or WxCC users. 
+        Takes the call history report and sorts, orders, filters and categorizes the content.
         '''
 
-        categorized_call_history = copy.deepcopy(call_history)
-        
-        for key, call_entry_group in categorized_call_history.items():
-
-            for call_entry in call_entry_group:
-                calling_number = call_entry['Calling number']
-                called_number = call_entry['Called number']
-                
-                call_entry, calling_number, called_number = self.map_and_tag_numbers(call_entry, self.wxcc_dial_numbers, "dialledNumber", "(WxCC Dial Number)", calling_number, called_number)
-                call_entry, calling_number, called_number = self.map_and_tag_wxcc_users(call_entry, self.wxcc_user, calling_number, called_number)
-                call_entry, calling_number, called_number = self.map_and_tag_numbers(call_entry, self.w_queue_numbers, "phoneNumber", "(Webex Call Queue)", calling_number, called_number)
-                call_entry, calling_number, called_number = self.map_and_tag_webex_numbers(call_entry, self.w_phone_numbers, calling_number, called_number)
-
-        return categorized_call_history
+        return dict(self.iter_report_data())
 
 
-    def process_report_data(self):
+    def iter_report_data(self):
         '''
-        Takes the call history report and sorts, orders, filters and categorizes the content.
+        Groups the call history report and yields the (correlation id, call group) pairs one by one, each group is
+        filtered, ordered and categorized when it is yielded. Used to stream large reports.
         '''
 
-        call_history = self.sort_based_on_correlation_id(self.call_history)
-        call_history = self.remove_origination_entries_for_two_way_entries(call_history)
-        call_history = self.sort_by_start_time(call_history)
-        call_history = self.categorize_entries(call_history)
+        start = time.perf_counter()
+        rows = TimedRows(self.call_history)
+        call_history = self.sort_based_on_correlation_id(rows)
 
-        return call_history
+        metrics.stage('parse', rows.seconds, backend='python')
+        metrics.stage('grouping', time.perf_counter() - start - rows.seconds, backend='python')
+        metrics.count('rows_total', rows.count)
+        metrics.count('notification_rows_total', rows.count - sum(map(len, call_history.values())))
+
+        try:
+            for call_entry_group_key in list(call_history):
+                yield call_entry_group_key, self.process_call_entry_group(call_history.pop(call_entry_group_key))
+        finally:
+            self.record_metrics()
         
 
 
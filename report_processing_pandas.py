@@ -0,0 +1,234 @@
+""" Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+           https://developer.cisco.com/docs/licenses
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+import itertools
+from functools import reduce
+from operator import itemgetter, or_
+
+import numpy as np
+import pandas as pd
+
+from categorization_index import CategorizationIndex, tag_labels, WXCC_DIAL_NUMBER_TAG
+from metrics import metrics
+from phone_numbers import normalize_number
+from csv_reader import REPORT_COLUMNS, INTERNED_COLUMNS
+
+# Low cardinality columns plus the columns used as keys for grouping, sorting and joins
+CATEGORICAL_COLUMNS = INTERNED_COLUMNS + ('Correlation ID', 'Start time', 'Calling number', 'Called number', 'User UUID')
+
+
+class DataFrameReportProcessing:
+    '''
+    Columnar (pandas) variant of ReportProcessing - sorts, orders, filters and categorizes the report entries
+    with vectorized operations and returns the same grouped structure.
+    '''
+
+    def __init__(self, call_history, wxcc_dial_numbers=(), wxcc_user=(), w_queue_numbers=(), w_phone_numbers=(), categorization_index=None):
+        self.call_history = call_history
+        self.wxcc_dial_numbers = wxcc_dial_numbers
+        self.wxcc_user = wxcc_user
+        self.w_phone_numbers = w_phone_numbers
+        self.w_queue_numbers = w_queue_numbers
+        self.categorization_index = categorization_index or CategorizationIndex.from_directories(wxcc_dial_numbers, wxcc_user, w_queue_numbers, w_phone_numbers)
+        self.dial_number_tags, self.number_tags, self.user_tags = self.build_directory_frames()
+
+
+    @staticmethod
+    def read_report(filename):
+        '''
+        Reads the used columns of a csv report into a DataFrame, the key columns are parsed as categoricals.
+        '''
+
+        dtypes = {column: 'category' if column in CATEGORICAL_COLUMNS else str for column in REPORT_COLUMNS}
+        return pd.read_csv(filename, usecols=lambda column: column in REPORT_COLUMNS, dtype=dtypes, keep_default_na=False, encoding='utf-8-sig')
+
+
+    def build_directory_frames(self):
+        '''
+        Builds the lookup frames for the WxCC dial numbers, the remaining numbers and the WxCC users.
+        '''
+
+        number_tags = pd.Series(self.categorization_index.number_tags, dtype=np.int64)
+        is_dial_number = (number_tags == WXCC_DIAL_NUMBER_TAG).to_numpy(dtype=bool)
+
+        user_tags = pd.Series(self.categorization_index.user_tags, dtype=object)
+        user_frame = pd.DataFrame({
+            'all_tags': user_tags.map(lambda tags: reduce(or_, tags, 0)),
+            'first_tag': user_tags.map(itemgetter(0))
+        }, index=user_tags.index, dtype=np.int64)
+
+        return number_tags[is_dial_number], number_tags[~is_dial_number], user_frame
+
+
+    def load_call_history(self):
+        '''
+        Loads the call history into a DataFrame with categorical dtypes for the low cardinality and key columns.
+        '''
+
+        if isinstance(self.call_history, pd.DataFrame):
+            frame = self.call_history
+        else:
+            frame = pd.DataFrame.from_records(list(self.call_history))
+
+        return frame.astype({column: 'category' for column in CATEGORICAL_COLUMNS if column in frame})
+
+
+    def origination_entries_for_two_way_entries(self, group_codes, start_time_codes, called_number_codes, directions):
+        '''
+        Returns a mask of the ORIGINATING entries with an associated TERMINATING entry for the same connection
+        in the same correlation group.
+        '''
+
+        if len(directions) == 0:
+            return np.zeros(0, dtype=bool)
+
+        connection_codes, _ = pd.factorize(start_time_codes.astype(np.int64) << 31 | called_number_codes.astype(np.int64))
+        connections = pd.Index(group_codes.astype(np.int64) * (connection_codes.max() + 1) + connection_codes)
+        terminating = directions == "TERMINATING"
+        originating = directions == "ORIGINATING"
+
+        return originating & connections.isin(connections[terminating])
+
+
+    def filter_and_sort(self, frame):
+        '''
+        Removes the PushNotificationRetrieval entries and the ORIGINATING entries of two way entries.
+        Orders the remaining entries by correlation group (in order of first appearance) and start time.
+        '''
+
+        positions = np.flatnonzero((frame['Related reason'] != "PushNotificationRetrieval").to_numpy(dtype=bool))
+        if positions.size == 0:
+            return frame.iloc[0:0]
+        group_codes, _ = pd.factorize(frame['Correlation ID'].cat.codes.to_numpy()[positions])
+        start_time_codes = frame['Start time'].cat.codes.to_numpy()[positions]
+
+        twins = self.origination_entries_for_two_way_entries(group_codes, start_time_codes,
+                                                             frame['Called number'].cat.codes.to_numpy()[positions],
+                                                             frame['Direction'].to_numpy(dtype=object)[positions])
+        positions, group_codes, start_time_codes = positions[~twins], group_codes[~twins], start_time_codes[~twins]
+
+        # Categories of the start time are sorted, ordering by their codes orders by start time
+        order = np.lexsort((positions, start_time_codes, group_codes))
+
+        return frame.take(positions[order])
+
+
+    def join_tags(self, column, directory_tags, key=None):
+        '''
+        Joins the categories of a column (converted with key, e.g. normalize_number) against a directory frame and returns
+        the tag codes per row (0 for rows without match). Rows without category (code -1) are mapped to the appended 0.
+        '''
+
+        categories = column.cat.categories if key is None else column.cat.categories.map(key)
+        tags = pd.Series(categories.map(directory_tags)).fillna(0).to_numpy(dtype=np.int64)
+        return np.append(tags, 0)[column.cat.codes.to_numpy()]
+
+
+    def categorize_entries(self, frame):
+        '''
+        Categorizes the calling and called numbers, applying the tags in the order WxCC dial number,
+        WxCC user, Webex call queue, Webex number. Returns the tag code columns.
+        '''
+
+        originating = (frame['Direction'] == "ORIGINATING").to_numpy(dtype=bool)
+        terminating = (frame['Direction'] == "TERMINATING").to_numpy(dtype=bool)
+
+        calling_tag = self.join_tags(frame['Calling number'], self.dial_number_tags, normalize_number)
+        called_tag = self.join_tags(frame['Called number'], self.dial_number_tags, normalize_number)
+
+        all_user_tags = self.join_tags(frame['User UUID'], self.user_tags['all_tags'])
+        first_user_tags = self.join_tags(frame['User UUID'], self.user_tags['first_tag'])
+        wxcc_user = (called_tag == 0) & (all_user_tags != 0)
+        tagged = wxcc_user & originating
+        calling_tag[tagged] |= all_user_tags[tagged]
+        tagged = wxcc_user & terminating
+        called_tag[tagged] = first_user_tags[tagged]
+
+        untagged = calling_tag == 0
+        calling_tag[untagged] = self.join_tags(frame['Calling number'], self.number_tags, normalize_number)[untagged]
+        untagged = called_tag == 0
+        called_tag[untagged] = self.join_tags(frame['Called number'], self.number_tags, normalize_number)[untagged]
+
+        return {'Calling tag': calling_tag, 'Called tag': called_tag}
+
+
+    def to_grouped_call_history(self, frame, tagged_columns):
+        '''
+        Converts the ordered frame (with the tag code columns) to the call history dictionary
+        (correlation ID -> list of entries).
+        '''
+
+        frame_columns = [column for column in frame.columns if column not in tagged_columns]
+        columns = frame_columns + list(tagged_columns)
+        values = [frame[column].to_numpy(dtype=object) for column in frame_columns] + [tags.tolist() for tags in tagged_columns.values()]
+        call_entries = (dict(zip(columns, row)) for row in zip(*values))
+
+        call_history = {}
+        for correlation_id, call_entry_group in itertools.groupby(zip(frame['Correlation ID'].to_numpy(dtype=object), call_entries), key=itemgetter(0)):
+            call_history[correlation_id] = [call_entry for _, call_entry in call_entry_group]
+
+        return call_history
+
+
+    def process_report_data(self):
+        '''
+        Takes the call history report and sorts, orders, filters and categorizes the content.
+        '''
+
+        with metrics.timer('parse', backend='pandas'):
+            frame = self.load_call_history()
+        metrics.count('rows_total', len(frame))
+        if frame.empty:
+            return {}
+
+        with metrics.timer('filter_and_sort', backend='pandas'):
+            filtered_frame = self.filter_and_sort(frame)
+        metrics.count('notification_rows_total', int((frame['Related reason'] == "PushNotificationRetrieval").sum()))
+        frame = filtered_frame
+        if frame.empty:
+            return {}
+
+        with metrics.timer('categorize', backend='pandas'):
+            tagged_columns = self.categorize_entries(frame)
+        self.record_tag_counts(tagged_columns)
+
+        with metrics.timer('grouping', backend='pandas'):
+            call_history = self.to_grouped_call_history(frame, tagged_columns)
+        metrics.count('call_groups_total', len(call_history))
+
+        return call_history
+
+
+    def record_tag_counts(self, tagged_columns):
+        '''
+        Records the number of tags per tag label in the metrics.
+        '''
+
+        tag_counts = {}
+        for tags in tagged_columns.values():
+            codes, counts = np.unique(tags, return_counts=True)
+            for code, count in zip(codes.tolist(), counts.tolist()):
+                for label in tag_labels(code):
+                    tag_counts[label] = tag_counts.get(label, 0) + count
+
+        for label, count in tag_counts.items():
+            metrics.count('tags_total', count, tag=label)
+
+
+    def iter_report_data(self):
+        '''
+        Yields the (correlation id, call group) pairs of the processed report. The columnar pipeline processes
+        the whole report before the first group is yielded.
+        '''
+
+        yield from self.process_report_data().items()
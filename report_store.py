@@ -0,0 +1,443 @@
+""" Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+           https://developer.cisco.com/docs/licenses
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+from dotenv import load_dotenv
+import csv
+import heapq
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+import logging
+log = logging.getLogger(__name__)
+
+from call_store import call_key
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: the manifest is only locked within the process
+    fcntl = None
+
+load_dotenv()
+
+
+class ReportStore():
+    '''
+    Persistent store of the downloaded reports, indexed by (template_id, start_date, end_date) in a manifest file.
+    Historical reports never change, so a repeated request is served from the stored file. For a request
+    overlapping stored reports of the same template, only the missing days are generated and the days are merged
+    into a new report file. The least recently used reports are evicted above a size or age limit.
+    Optionally, the missing days are split into day or week shards, generated as concurrent reports.
+    The manifest is shared by the worker processes of the app: it is changed under a file lock and read
+    again whenever another process changed it.
+    '''
+
+    def __init__(self, report_workflow, directory='./reports', max_bytes=None, max_age=None, shard_days=None, shard_concurrency=None):
+        self.report_workflow = report_workflow
+        self.directory = Path(directory)
+        self.manifest_path = self.directory / 'manifest.json'
+        self.lock_path = self.directory / 'manifest.lock'
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("REPORT_STORE_MAX_BYTES", 1024 ** 3))
+        self.max_age = max_age if max_age is not None else int(os.getenv("REPORT_STORE_MAX_AGE", 30 * 86400))
+        # Days per shard (0: one report per missing range), at most shard_concurrency reports are generated at once
+        self.shard_days = shard_days if shard_days is not None else int(os.getenv("REPORT_SHARD_DAYS", 0))
+        self.shard_executor = ThreadPoolExecutor(max_workers=shard_concurrency or int(os.getenv("REPORT_SHARD_CONCURRENCY", 4)),
+                                                 thread_name_prefix='report-shard')
+        self.lock = threading.Lock()
+
+        self.manifest_version = None
+        self.reports = self._read_manifest()
+
+
+    def lookup(self, template_id, start_date, end_date):
+        '''
+        Returns the id of the stored report for exactly this template and date range or None.
+        '''
+
+        with self._manifest_lock():
+            for report_id, entry in self.reports.items():
+                if (entry['template_id'], entry['start_date'], entry['end_date']) == (str(template_id), start_date, end_date) \
+                        and entry['complete'] and self._path(report_id).exists():
+                    entry['last_used'] = time.time()
+                    self._write_manifest()
+                    return report_id
+
+        return None
+
+
+    def get_report(self, template_id, start_date, end_date):
+        '''
+        Returns the id of a report for the template and date range: the stored one, a new one assembled from
+        stored reports and generated reports for the missing days, or a completely new one.
+        '''
+
+        report_id = self.lookup(template_id, start_date, end_date)
+        if report_id:
+            print(f"Report for template {template_id} ({start_date} - {end_date}) served from the report store: {report_id}")
+            return report_id
+
+        days = self._days(start_date, end_date)
+        if not days:
+            report_id = self._generate(template_id, start_date, end_date)
+        else:
+            sources = self._covering_reports(template_id, days)
+            covered = {day for source_days in sources.values() for day in source_days}
+
+            shards = [shard for missing_range in self._missing_ranges(days, covered) for shard in self._shards(*missing_range)]
+            generated = set()
+            for (shard_start, shard_end), shard_report_id in zip(shards, self._generate_shards(template_id, shards, served_directly=not sources)):
+                sources[shard_report_id] = [day for day in days if shard_start <= day <= shard_end]
+                generated.add(shard_report_id)
+
+            report_id = next(iter(sources)) if len(sources) == 1 and self._covers_exactly(next(iter(sources)), start_date, end_date) \
+                else self._merge(template_id, start_date, end_date, sources, generated)
+
+        self._evict(keep=report_id)
+        return report_id
+
+
+    def _generate(self, template_id, start_date, end_date, served_directly=True):
+        '''
+        Generates and downloads a new report via the report workflow and adds it to the store.
+        served_directly tells the workflow whether the report is returned as is or merged with other reports.
+        '''
+
+        report_id = self.report_workflow(template_id, start_date, end_date, served_directly=served_directly)
+        if not report_id:
+            raise Exception(f"Report for template {template_id} ({start_date} - {end_date}) could not be downloaded")
+
+        self._register(str(report_id), template_id, start_date, end_date)
+        return str(report_id)
+
+
+    def _generate_shards(self, template_id, shards, served_directly):
+        '''
+        Generates the reports of the shards (first day, last day) concurrently and returns their ids in shard order.
+        If a shard fails, the error is raised once all shards are finished, the successful shards stay in the store.
+        '''
+
+        if len(shards) == 1:
+            shard_start, shard_end = shards[0]
+            return [self._generate(template_id, shard_start.isoformat(), shard_end.isoformat(), served_directly)]
+
+        print(f"Generating {len(shards)} report shards for template {template_id}")
+        futures = [self.shard_executor.submit(self._generate, template_id, shard_start.isoformat(), shard_end.isoformat(), False)
+                   for shard_start, shard_end in shards]
+
+        errors = [future.exception() for future in futures if future.exception()]
+        if errors:
+            raise errors[0]
+
+        return [future.result() for future in futures]
+
+
+    def _shards(self, first_day, last_day):
+        '''
+        Splits a range of days into shards of shard_days days. The shards are aligned to the calendar (week shards
+        start on Mondays), so the shards of different requests are the same and reused from the store.
+        '''
+
+        if self.shard_days <= 0:
+            return [(first_day, last_day)]
+
+        shards = []
+        shard_start = first_day
+        while shard_start <= last_day:
+            # Day ordinals start with 1 on Monday, 0001-01-01
+            shard_end = min(last_day, shard_start + timedelta(days=self.shard_days - 1 - (shard_start.toordinal() - 1) % self.shard_days))
+            shards.append((shard_start, shard_end))
+            shard_start = shard_end + timedelta(days=1)
+
+        return shards
+
+
+    def _covering_reports(self, template_id, days):
+        '''
+        Returns the stored reports (report id -> days) covering the requested days, the reports covering
+        most of the days are used first.
+        '''
+
+        with self._manifest_lock():
+            candidates = []
+            for report_id, entry in self.reports.items():
+                if entry['template_id'] != str(template_id) or not entry['complete'] or not self._path(report_id).exists():
+                    continue
+                report_days = set(self._days(entry['start_date'], entry['end_date']))
+                overlap = [day for day in days if day in report_days]
+                if overlap:
+                    candidates.append((len(overlap), entry['created_at'], report_id, overlap))
+
+            sources = {}
+            covered = set()
+            for _, _, report_id, overlap in sorted(candidates, reverse=True):
+                new_days = [day for day in overlap if day not in covered]
+                if new_days:
+                    sources[report_id] = new_days
+                    covered.update(new_days)
+                    self.reports[report_id]['last_used'] = time.time()
+
+        return sources
+
+
+    def _merge(self, template_id, start_date, end_date, sources, generated=()):
+        '''
+        Writes a new report with the rows of the source reports (report id -> days) and adds it to the store.
+        Stored reports contribute the rows whose start time is on one of their days, the reports generated for
+        this range (shards) all their rows, also rows with a start time (UTC) outside the days of the shard.
+        The sources are merged in start time order (unsorted sources are sorted first), so call groups spanning
+        several sources end up complete in one report. Rows contained in several sources are written once.
+        '''
+
+        report_id = re.sub(r'[^A-Za-z0-9_.-]', '_', f"merged-{template_id}-{start_date}-{end_date}")
+        # Concurrent merges of the same range (other threads or workers) write separate files, the last one is kept
+        temp_path = self._path(report_id).with_name(f"{report_id}.{os.getpid()}.{threading.get_ident()}.tmp")
+        readfiles = [open(self._path(source_id), 'r', encoding='utf-8-sig', newline='') for source_id in sources]
+
+        try:
+            csv_readers = [csv.reader(readfile) for readfile in readfiles]
+            source_headers = [next(csv_reader, []) for csv_reader in csv_readers]
+            header = source_headers[0]
+            start_time = header.index('Start time')
+
+            def source_rows(csv_reader, source_header, source_id, days):
+                day_prefixes = None if source_id in generated else {day.isoformat() for day in days}
+                columns = [source_header.index(column) if column in source_header else None for column in header]
+                source_start_time = source_header.index('Start time')
+
+                for row in csv_reader:
+                    if row and (day_prefixes is None or row[source_start_time][:10] in day_prefixes):
+                        yield [row[index] if index is not None else '' for index in columns]
+
+            def sorted_rows(readfile, csv_reader, source_header, source_id, days):
+                if self._sorted_by_start_time(readfile, csv_reader, source_header.index('Start time')):
+                    return source_rows(csv_reader, source_header, source_id, days)
+
+                print(f"Report {source_id} is not ordered by start time, sorting it before merging")
+                return iter(sorted(source_rows(csv_reader, source_header, source_id, days), key=lambda row: row[start_time]))
+
+            def unique_rows(rows):
+                # Duplicates have the same start time, only the keys of the current start time are kept
+                current_start_time, keys = None, set()
+                for row in rows:
+                    if row[start_time] != current_start_time:
+                        current_start_time, keys = row[start_time], set()
+                    key = call_key(dict(zip(header, row)))
+                    if key not in keys:
+                        keys.add(key)
+                        yield row
+
+            with open(temp_path, 'w', encoding='utf-8-sig', newline='') as writefile:
+                csv_writer = csv.writer(writefile, quoting=csv.QUOTE_ALL)
+                csv_writer.writerow(header)
+                csv_writer.writerows(unique_rows(heapq.merge(*(sorted_rows(readfile, csv_reader, source_header, source_id, days)
+                                                               for readfile, csv_reader, source_header, (source_id, days)
+                                                               in zip(readfiles, csv_readers, source_headers, sources.items())),
+                                                             key=lambda row: row[start_time])))
+        except Exception:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        finally:
+            for readfile in readfiles:
+                readfile.close()
+
+        os.replace(temp_path, self._path(report_id))
+        print(f"Merged report {report_id} from the reports {', '.join(sources)}")
+
+        self._register(report_id, template_id, start_date, end_date, sources=list(sources))
+        return report_id
+
+
+    @staticmethod
+    def _sorted_by_start_time(readfile, csv_reader, start_time):
+        '''
+        Checks if the rows of a report (after its header) are ordered by start time and rewinds the reader
+        to the first row.
+        '''
+
+        previous = ''
+        try:
+            for row in csv_reader:
+                if row:
+                    if row[start_time] < previous:
+                        return False
+                    previous = row[start_time]
+            return True
+        finally:
+            readfile.seek(0)
+            next(csv_reader, None)
+
+
+    def _register(self, report_id, template_id, start_date, end_date, sources=None):
+        '''
+        Adds a report file to the manifest. Only reports created after their end date are complete and reused.
+        '''
+
+        now = time.time()
+        try:
+            complete = date.fromisoformat(end_date) < datetime.now(timezone.utc).date()
+        except (TypeError, ValueError):
+            complete = False
+
+        with self._manifest_lock():
+            self.reports[report_id] = {
+                'template_id': str(template_id),
+                'start_date': start_date,
+                'end_date': end_date,
+                'size': self._path(report_id).stat().st_size,
+                'complete': complete,
+                'sources': sources or [],
+                'created_at': now,
+                'last_used': now,
+            }
+            self._write_manifest()
+
+
+    def _evict(self, keep=None):
+        '''
+        Removes reports not used for longer than the maximum age, and the least recently used reports
+        while the store is larger than the maximum size. The report keep is never removed.
+        '''
+
+        with self._manifest_lock():
+            now = time.time()
+            total_size = sum(entry['size'] for entry in self.reports.values())
+
+            for report_id, entry in sorted(self.reports.items(), key=lambda item: item[1]['last_used']):
+                if report_id == keep:
+                    continue
+                if now - entry['last_used'] > self.max_age or total_size > self.max_bytes:
+                    total_size -= entry['size']
+                    del self.reports[report_id]
+                    try:
+                        self._path(report_id).unlink()
+                    except OSError:
+                        pass
+                    print(f"Evicted report {report_id} from the report store")
+
+            self._write_manifest()
+
+
+    def stats(self):
+        '''
+        Returns the number and total size of the stored reports.
+        '''
+
+        with self._manifest_lock():
+            return {
+                'reports': len(self.reports),
+                'size': sum(entry['size'] for entry in self.reports.values()),
+                'max_bytes': self.max_bytes,
+                'max_age': self.max_age,
+            }
+
+
+    def _path(self, report_id):
+        return self.directory / f'{report_id}.csv'
+
+
+    @staticmethod
+    def _days(start_date, end_date):
+        '''
+        Returns all days from start_date to end_date (inclusive) or an empty list for unparsable dates.
+        '''
+
+        try:
+            start, end = date.fromisoformat(start_date), date.fromisoformat(end_date)
+        except (TypeError, ValueError):
+            return []
+
+        return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+    @staticmethod
+    def _missing_ranges(days, covered):
+        '''
+        Returns the consecutive ranges (first day, last day) of the days not covered.
+        '''
+
+        ranges = []
+        for day in days:
+            if day in covered:
+                continue
+            if ranges and ranges[-1][1] == day - timedelta(days=1):
+                ranges[-1][1] = day
+            else:
+                ranges.append([day, day])
+
+        return [tuple(missing_range) for missing_range in ranges]
+
+
+    def _covers_exactly(self, report_id, start_date, end_date):
+        entry = self.reports.get(report_id, {})
+        return (entry.get('start_date'), entry.get('end_date')) == (start_date, end_date)
+
+
+    @contextmanager
+    def _manifest_lock(self):
+        '''
+        Holds the lock of the manifest (within the process and across processes) and reads the manifest again
+        if another process changed it.
+        '''
+
+        with self.lock, open(self.lock_path, 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if self._stat_manifest() != self.manifest_version:
+                self.reports = self._read_manifest()
+            yield
+
+
+    def _stat_manifest(self):
+        try:
+            stat = self.manifest_path.stat()
+            return stat.st_mtime_ns, stat.st_size, stat.st_ino
+        except OSError:
+            return None
+
+
+    def _read_manifest(self):
+        '''
+        Reads the stored reports from the manifest file.
+        '''
+
+        try:
+            self.manifest_version = self._stat_manifest()
+            with open(self.manifest_path, 'r', encoding='utf-8') as file:
+                return json.load(file).get('reports', {})
+        except (OSError, ValueError):
+            return {}
+
+
+    def _write_manifest(self):
+        '''
+        Writes the stored reports to the manifest file (atomically via a temporary file), called with the lock held.
+        '''
+
+        try:
+            temp_path = self.manifest_path.with_suffix('.tmp')
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump({'reports': self.reports}, file, indent=1)
+            os.replace(temp_path, self.manifest_path)
+            self.manifest_version = self._stat_manifest()
+        except OSError as e:
+            print(f"Error: Unable to write report store manifest {self.manifest_path}: {e}")
@@ -0,0 +1,127 @@
+""" Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+           https://developer.cisco.com/docs/licenses
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+from dotenv import load_dotenv
+import os
+from itertools import islice
+
+from categorization_index import tag_code
+
+load_dotenv()
+
+PAGE_SIZE = int(os.getenv("TABLE_PAGE_SIZE", 50))
+MAX_PAGE_SIZE = 500
+
+FILTER_NAMES = ('calling', 'called', 'tag', 'direction', 'answered', 'start', 'end')
+
+
+class CallGroupFilter():
+    '''
+    Server-side filter of the call groups. A group is shown if one of its entries matches all set filters:
+    calling/called number (substring), tag label, direction, answered status and start time range.
+    The number filters apply to the untagged numbers, the tag filter to the tag codes of the entries.
+    '''
+
+    def __init__(self, calling=None, called=None, tag=None, direction=None, answered=None, start=None, end=None):
+        self.calling = calling or None
+        self.called = called or None
+        self.tag = tag.strip("()") if tag else None
+        # Unknown tag labels match no entry
+        self.tag_code = (tag_code(tag) or 0) if tag else None
+        self.direction = direction.upper() if direction else None
+        self.answered = answered.lower() if answered else None
+        self.start = start or None
+        self.end = end or None
+
+
+    @classmethod
+    def from_args(cls, args):
+        '''
+        Creates the filter from request arguments.
+        '''
+
+        return cls(**{name: args.get(name, '').strip() for name in FILTER_NAMES})
+
+
+    def to_args(self):
+        '''
+        Returns the set filters as request arguments.
+        '''
+
+        return {name: getattr(self, name) for name in FILTER_NAMES if getattr(self, name)}
+
+
+    @property
+    def active(self):
+        return any(getattr(self, name) for name in FILTER_NAMES)
+
+
+    def entry_matches(self, call_entry):
+        calling_number = call_entry['Calling number']
+        called_number = call_entry['Called number']
+
+        if self.calling and self.calling not in calling_number:
+            return False
+        if self.called and self.called not in called_number:
+            return False
+        if self.tag and not (call_entry['Calling tag'] | call_entry['Called tag']) & self.tag_code:
+            return False
+        if self.direction and call_entry['Direction'] != self.direction:
+            return False
+        if self.answered and str(call_entry['Answered']).lower() != self.answered:
+            return False
+        # Start times are ISO timestamps, so a date or a prefix of a timestamp compares as well
+        if self.start and call_entry['Start time'] < self.start:
+            return False
+        if self.end and call_entry['Start time'][:len(self.end)] > self.end:
+            return False
+        return True
+
+
+    def matches(self, call_group):
+        return not self.active or any(self.entry_matches(call_entry) for call_entry in call_group)
+
+
+def paginate(call_history, call_filter, offset=0, limit=PAGE_SIZE):
+    '''
+    Returns a page of the call groups (correlation id, call group) matching the filter, starting at the group
+    position offset, and the offset of the next page (None after the last page).
+    Only the groups up to the end of the page are accessed, so lazily loaded reports are not read completely.
+    '''
+
+    page = []
+    position = offset
+
+    for correlation_id in islice(call_history, offset, None):
+        position += 1
+        call_group = call_history[correlation_id]
+        if call_filter.matches(call_group):
+            page.append((correlation_id, call_group))
+            if len(page) == limit:
+                return page, position
+
+    return page, None
+
+
+def page_arguments(args):
+    '''
+    Returns the offset and limit of a page request.
+    '''
+
+    try:
+        offset = max(0, int(args.get('offset', 0)))
+        limit = min(MAX_PAGE_SIZE, max(1, int(args.get('limit', PAGE_SIZE))))
+    except ValueError:
+        offset, limit = 0, PAGE_SIZE
+
+    return offset, limit
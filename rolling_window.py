@@ -0,0 +1,183 @@
+""" Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+           https://developer.cisco.com/docs/licenses
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+from dotenv import load_dotenv
+import heapq
+import os
+import threading
+from datetime import datetime, timedelta
+import logging
+log = logging.getLogger(__name__)
+
+from metrics import metrics, TimedRows
+from report_processing import ReportProcessing
+
+load_dotenv()
+
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+
+def record_key(call_entry):
+    '''
+    Returns the key identifying a call history record, used to skip records fetched twice.
+    '''
+
+    if call_entry.get('Call ID') and call_entry.get('Local SessionID'):
+        return (call_entry['Call ID'], call_entry['Local SessionID'])
+
+    return (call_entry['Correlation ID'], call_entry['Start time'], call_entry['Direction'],
+            call_entry['Calling number'], call_entry['Called number'], call_entry.get('User UUID'))
+
+
+class RollingCallWindow():
+    '''
+    Incrementally maintained, processed call history of a moving time window (used for the last 48 h).
+    Only records newer than the high-water mark (the end of the last fetched window) are fetched, records
+    starting before the window are evicted. Only the correlation groups with new or evicted records are
+    processed again, all groups are only re-tagged when the directory data changed.
+    '''
+
+    def __init__(self, fetch_call_history, overlap=None):
+        self.fetch_call_history = fetch_call_history
+        # Records can show up in the feed with a delay, the last seconds before the high-water mark are fetched again
+        self.overlap = timedelta(seconds=overlap if overlap is not None else int(os.getenv("ROLLING_WINDOW_OVERLAP", 300)))
+
+        self.raw_groups = {}
+        self.processed_groups = {}
+        self.start_times = []
+        self.high_water_mark = None
+        self.fingerprint = None
+        self.lock = threading.Lock()
+
+
+    def refresh(self, start_time, end_time, categorization_index):
+        '''
+        Moves the window to (start_time, end_time) and returns the processed call history (correlation id -> call group).
+        start_time and end_time need to use the following format: YYYY-MM-DDTHH:MM:SS.mmmZ
+        '''
+
+        report_processor = ReportProcessing((), categorization_index=categorization_index)
+
+        with self.lock:
+            if self.high_water_mark is None or self.high_water_mark < start_time:
+                self._reset()
+                fetch_start = start_time
+            else:
+                fetch_start = max(start_time, self._format(self._parse(self.high_water_mark) - self.overlap))
+
+            # Ordered set of the changed groups, new groups are added in the order of the call history
+            affected_groups = {}
+            if fetch_start < end_time:
+                call_history = TimedRows(self.fetch_call_history(fetch_start, end_time))
+                affected_groups.update(self._add_records(call_history, report_processor))
+                metrics.stage('cdr_fetch', call_history.seconds)
+                metrics.count('rows_total', call_history.count)
+                self.high_water_mark = end_time
+
+            affected_groups.update(self._evict_records(start_time))
+
+            if categorization_index.fingerprint is None or categorization_index.fingerprint != self.fingerprint:
+                affected_groups = dict.fromkeys(self.raw_groups)
+                self.fingerprint = categorization_index.fingerprint
+
+            for correlation_id in affected_groups:
+                self._process_group(correlation_id, report_processor)
+            report_processor.record_metrics()
+
+            print(f"Rolling window refreshed: {len(affected_groups)} of {len(self.raw_groups)} call groups processed ({fetch_start} - {end_time})")
+
+            return dict(self.processed_groups)
+
+
+    def current(self):
+        '''
+        Returns the processed call history of the last refresh, or None before the first refresh.
+        '''
+
+        with self.lock:
+            if self.high_water_mark is None:
+                return None
+            return dict(self.processed_groups)
+
+
+    def _add_records(self, call_history, report_processor):
+        '''
+        Adds new records to their correlation groups, returns the ids of the changed groups.
+        '''
+
+        affected_groups = {}
+
+        for call_entry in call_history:
+            if not report_processor.entry_is_no_notification_entry(call_entry):
+                continue
+
+            correlation_id = call_entry['Correlation ID']
+            key = record_key(call_entry)
+            raw_group = self.raw_groups.setdefault(correlation_id, {})
+            if key in raw_group:
+                continue
+
+            raw_group[key] = call_entry
+            heapq.heappush(self.start_times, (call_entry['Start time'], correlation_id, key))
+            affected_groups[correlation_id] = None
+
+        return affected_groups
+
+
+    def _evict_records(self, start_time):
+        '''
+        Removes the records starting before start_time, returns the ids of the changed groups.
+        '''
+
+        affected_groups = {}
+
+        while self.start_times and self.start_times[0][0] < start_time:
+            _, correlation_id, key = heapq.heappop(self.start_times)
+            raw_group = self.raw_groups.get(correlation_id)
+            if raw_group and raw_group.pop(key, None) is not None:
+                affected_groups[correlation_id] = None
+                if not raw_group:
+                    del self.raw_groups[correlation_id]
+
+        return affected_groups
+
+
+    def _process_group(self, correlation_id, report_processor):
+        '''
+        Deduplicates, sorts and tags a copy of the raw records of a group, the raw records stay untagged.
+        '''
+
+        raw_group = self.raw_groups.get(correlation_id)
+        if not raw_group:
+            self.processed_groups.pop(correlation_id, None)
+            return
+
+        self.processed_groups[correlation_id] = report_processor.process_call_entry_group([dict(call_entry) for call_entry in raw_group.values()])
+
+
+    def _reset(self):
+        self.raw_groups = {}
+        self.processed_groups = {}
+        self.start_times = []
+        self.high_water_mark = None
+        self.fingerprint = None
+
+
+    @staticmethod
+    def _parse(time_string):
+        return datetime.strptime(time_string, TIME_FORMAT)
+
+
+    @staticmethod
+    def _format(timestamp):
+        return timestamp.strftime(TIME_FORMAT)[:-4] + "Z"
@@ -0,0 +1,139 @@
+""" Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+           https://developer.cisco.com/docs/licenses
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+from dotenv import load_dotenv
+import importlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import logging
+log = logging.getLogger(__name__)
+
+load_dotenv()
+
+
+class SharedCache():
+    '''
+    Cache shared by the worker processes of the app (and kept across worker restarts) in a local SQLite file.
+    Values are stored per namespace and key with the time they were updated, leases let a single worker load a
+    value while the other workers wait for it.
+    Other backends (e.g. Redis) can be configured with SHARED_CACHE_BACKEND=module:Class, a class with the same methods.
+    '''
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("SHARED_CACHE_PATH", './reports/shared_cache.db')
+        self.local = threading.local()
+
+        with self._connection() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS entries (namespace TEXT, key TEXT, value BLOB, updated_at REAL, PRIMARY KEY (namespace, key))")
+            connection.execute("CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT, expires_at REAL)")
+
+
+    def _connection(self):
+        '''
+        Returns the database connection of the current thread (and process, connections are not used across forks).
+        '''
+
+        connection = getattr(self.local, 'connection', None)
+        if connection is None or self.local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+
+        return connection
+
+
+    def get(self, namespace, key):
+        '''
+        Returns the (value, updated_at) of a key or None.
+        '''
+
+        row = self._connection().execute("SELECT value, updated_at FROM entries WHERE namespace = ? AND key = ?", (namespace, key)).fetchone()
+        return (pickle.loads(row[0]), row[1]) if row else None
+
+
+    def updated_at(self, namespace, key):
+        '''
+        Returns the time a key was updated (without reading its value) or None.
+        '''
+
+        row = self._connection().execute("SELECT updated_at FROM entries WHERE namespace = ? AND key = ?", (namespace, key)).fetchone()
+        return row[0] if row else None
+
+
+    def set(self, namespace, key, value, updated_at=None):
+        with self._connection() as connection:
+            connection.execute("INSERT OR REPLACE INTO entries (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                               (namespace, key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), updated_at or time.time()))
+
+
+    def items(self, namespace):
+        '''
+        Returns the (key, value) pairs of a namespace.
+        '''
+
+        rows = self._connection().execute("SELECT key, value FROM entries WHERE namespace = ?", (namespace,)).fetchall()
+        return [(key, pickle.loads(value)) for key, value in rows]
+
+
+    def prune(self, namespace, updated_before):
+        '''
+        Removes the keys of a namespace updated before a time.
+        '''
+
+        with self._connection() as connection:
+            connection.execute("DELETE FROM entries WHERE namespace = ? AND updated_at < ?", (namespace, updated_before))
+
+
+    def acquire_lease(self, name, duration):
+        '''
+        Acquires a lease for a duration (in seconds). Returns False while another thread or process holds the lease.
+        '''
+
+        now = time.time()
+        with self._connection() as connection:
+            cursor = connection.execute(
+                "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at WHERE leases.expires_at < ?",
+                (name, self._owner(), now + duration, now))
+            return cursor.rowcount == 1
+
+
+    def release_lease(self, name):
+        with self._connection() as connection:
+            connection.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, self._owner()))
+
+
+    @staticmethod
+    def _owner():
+        return f"{os.getpid()}:{threading.get_ident()}"
+
+
+def shared_cache_from_env():
+    '''
+    Returns the shared cache configured by SHARED_CACHE_BACKEND: sqlite (default), none or module:Class.
+    '''
+
+    backend = os.getenv("SHARED_CACHE_BACKEND", "sqlite")
+
+    if backend == "none":
+        return None
+    if backend == "sqlite":
+        return SharedCache()
+
+    module_name, _, class_name = backend.partition(':')
+    return getattr(importlib.import_module(module_name), class_name)()
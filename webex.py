@@ -13,9 +13,11 @@ or implied.
 
 from dotenv import load_dotenv
 import os
-import requests
-import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 import logging
+import requests
+from webex_transport import transport as default_transport
 log = logging.getLogger(__name__)
 
 load_dotenv()
@@ -26,55 +28,115 @@ class WebexAPI():
     https://developer.webex.com/docs/getting-started
     '''
 
-    def __init__(self):
+    def __init__(self, transport=None):
+        self.transport = transport or default_transport
         self.access_token=os.getenv("WEBEX_TOKEN")
         self.headers = {'Authorization': f'Bearer {self.access_token}'}
-        self.base_url = 'https://webexapis.com/v1'
+        self.base_url = os.getenv("WEBEX_API_URL", 'https://webexapis.com/v1')
+        self.analytics_url = os.getenv("WEBEX_ANALYTICS_URL", 'https://analytics.webexapis.com/v1')
+        self.cdr_feed_time_slices = int(os.getenv("CDR_FEED_TIME_SLICES", 1))
+        self.cdr_feed_workers = int(os.getenv("CDR_FEED_WORKERS", 4))
+        self.page_size = int(os.getenv("WEBEX_PAGE_SIZE", 1000))
+        # Size of the read (compressed) chunks, a gzip chunk is decompressed at once
+        self.download_chunk_size = int(os.getenv("REPORT_DOWNLOAD_CHUNK_SIZE", 64 * 1024))
+        self.download_max_resumes = int(os.getenv("REPORT_DOWNLOAD_MAX_RESUMES", 5))
 
 
-    def execute_rest_call(self, method, url, payload):
+    def send_rest_call(self, method, url, payload):
         '''
-        Execute and check a REST call based on the provided data.
+        Execute and check a REST call based on the provided data. Returns the response.
         '''
 
-        response = requests.request(method, url, headers=self.headers, json=payload)
+        response = self.transport.request(method, url, headers=self.headers, json=payload)
         
-        if response.status_code == 200 or response.status_code == 201:
-            print(f'Successful Webex API call: {url} ({method})')
-            #print(response.json())
-            return response.json()
-
-        elif response.status_code == 204:
+        if response.status_code == 200 or response.status_code == 201 or response.status_code == 204:
             print(f'Successful Webex API call: {url} ({method})')
-            return
-
-        elif response.status_code == 429:
-            print(f'''-----Error 429 (Too Many Requests). Retry in {response.headers["Retry-After"]} seconds -----''')
-            time.sleep(int(response.headers["Retry-After"]))
-            response = self.execute_rest_call(method, url, payload)
             return response
-        
+
         else:
             raise Exception(response.json())
 
 
-    def get_detailed_call_history(self, start_time, end_time):
+    def execute_rest_call(self, method, url, payload):
+        '''
+        Execute and check a REST call based on the provided data. Returns the json content.
+        '''
+
+        response = self.send_rest_call(method, url, payload)
+
+        if response.status_code == 204:
+            return
+
+        return response.json()
+
+
+    def execute_paginated_rest_call(self, method, url, payload, items_key):
+        '''
+        Execute a REST call and follow the next links of the responses (Link header).
+        The next page is requested while the items of the current page are processed.
+        Yields the items of all pages.
+        '''
+
+        with ThreadPoolExecutor(max_workers=1) as prefetcher:
+            next_page = prefetcher.submit(self.send_rest_call, method, url, payload)
+
+            while next_page:
+                response = next_page.result()
+
+                url = response.links.get('next', {}).get('url')
+                next_page = prefetcher.submit(self.send_rest_call, method, url, payload) if url else None
+
+                yield from response.json()[items_key]
+
+
+    def get_detailed_call_history(self, start_time, end_time, time_slices=None, max_workers=None):
         '''
         Retrieve detailed call history of the last 48 hours as json.
         start_time and end_time need to use the following format: YYYY-MM-DDTHH:MM:SS.mmmZ
-        Max 500 entries supported per call. No pagination implemented so far.
+        Max 500 entries are returned per call, all pages are retrieved by following the next links.
+        Optionally, the time window is split into time_slices, which are retrieved in parallel by max_workers
+        and merged in order.
         (see also: https://developer.webex.com/docs/api/v1/reports-detailed-call-history/get-detailed-call-history)
         '''
 
+        time_slices = time_slices or self.cdr_feed_time_slices
+        max_workers = max_workers or self.cdr_feed_workers
+
+        if time_slices <= 1:
+            return self._get_detailed_call_history_slice((start_time, end_time))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            slices = executor.map(self._get_detailed_call_history_slice, self._split_time_window(start_time, end_time, time_slices))
+
+            return [call_entry for call_history_slice in slices for call_entry in call_history_slice]
+
+
+    def _get_detailed_call_history_slice(self, time_window):
+        '''
+        Retrieve all pages of the detailed call history of a (start_time, end_time) window.
+        '''
+
+        start_time, end_time = time_window
         method = "GET"
         max = 500
-        url = f"https://analytics.webexapis.com/v1/cdr_feed?startTime={start_time}&endTime={end_time}&max={max}"
+        url = f"{self.analytics_url}/cdr_feed?startTime={start_time}&endTime={end_time}&max={max}"
         payload = {}
-        
-        
-        response = self.execute_rest_call(method, url, payload)
 
-        return response['items']
+        return list(self.execute_paginated_rest_call(method, url, payload, 'items'))
+
+
+    def _split_time_window(self, start_time, end_time, time_slices):
+        '''
+        Splits a time window into consecutive (start_time, end_time) slices of equal length.
+        '''
+
+        time_format = "%Y-%m-%dT%H:%M:%S.%fZ"
+        start = datetime.strptime(start_time, time_format)
+        slice_length = (datetime.strptime(end_time, time_format) - start) / time_slices
+        boundaries = [start + slice_length * i for i in range(time_slices)]
+        boundaries = [boundary.strftime(time_format)[:-4] + "Z" for boundary in boundaries] + [end_time]
+
+        return list(zip(boundaries[:-1], boundaries[1:]))
 
 
     def get_report_templates(self):
@@ -127,15 +189,75 @@ class WebexAPI():
         return response['items'] 
 
 
-    def download_report(self, url):
+    def download_report(self, url, file):
         ''' 
-        Download the report data of a created report.
+        Download the report data of a created report in chunks into a binary file (gzip compressed if supported
+        by the server). Returns the number of written bytes.
+        A dropped or incomplete transfer is resumed from the written position with a range request, up to
+        REPORT_DOWNLOAD_MAX_RESUMES times. Restarting the compressed transfer is preferred if it is shorter than the
+        uncompressed rest. In that case, or if the server ignores the range, the already written bytes are skipped,
+        so the file is only appended to and can be read while it is written.
         '''
         method = "GET"
-        payload = {}
+        written = 0
+        validator = None
+        resume_with_range = False
+
+        for attempt in range(self.download_max_resumes + 1):
+            headers = dict(self.headers, **{'Accept-Encoding': 'gzip'})
+            if resume_with_range:
+                # Ranges refer to the unencoded report data
+                headers.update({'Accept-Encoding': 'identity', 'Range': f'bytes={written}-'})
+                if validator:
+                    headers['If-Range'] = validator
+
+            response = None
+            try:
+                with self.transport.request(method, url, headers=headers, stream=True) as response:
+                    if response.status_code not in (200, 206):
+                        raise Exception(f'Report download failed with status {response.status_code}')
+
+                    validator = validator or response.headers.get('ETag') or response.headers.get('Last-Modified')
+                    skip = written if response.status_code == 200 else 0
+
+                    for chunk in response.iter_content(self.download_chunk_size):
+                        if skip:
+                            skipped = min(skip, len(chunk))
+                            chunk, skip = chunk[skipped:], skip - skipped
+                        file.write(chunk)
+                        written += len(chunk)
+
+                    expected_length = response.headers.get('Content-Length')
+                    if expected_length and response.raw.tell() < int(expected_length):
+                        raise requests.ConnectionError(f'Connection closed after {response.raw.tell()} of {expected_length} bytes')
+
+                file.flush()
+                print(f'Successful Webex API call: {url} ({method}, {written} bytes)')
+                return written
+
+            except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
+                if attempt == self.download_max_resumes:
+                    raise
+                file.flush()
+                resume_with_range = written > 0 and self._resume_with_range(response, written)
+                print(f'-----Report download interrupted after {written} bytes ({e}). '
+                      f'{"Resume" if resume_with_range else "Restart"} {attempt + 1} of {self.download_max_resumes} -----')
+
+
+    def _resume_with_range(self, response, written):
+        '''
+        Checks if an interrupted download is resumed with an (uncompressed) range request or the compressed transfer
+        is restarted: the uncompressed rest is estimated with the compression ratio of the interrupted transfer.
+        '''
+
+        if response is None or response.headers.get('Content-Encoding') != 'gzip' or not response.headers.get('Content-Length'):
+            return True
+
+        compressed_length, compressed_read = int(response.headers['Content-Length']), response.raw.tell()
+        if not compressed_read:
+            return True
 
-        response = requests.request(method, url, headers=self.headers, data=payload)
-        return response.content
+        return (compressed_length - compressed_read) * written / compressed_read < compressed_length
 
 
     def delete_report(self, id):
@@ -150,31 +272,42 @@ class WebexAPI():
         response = self.execute_rest_call(method, url, payload)
 
         
-    def get_call_queues(self):
+    def iter_call_queues(self):
         '''
-        Get Webex call queues.
+        Iterate over all Webex call queues (all pages).
         (see also https://developer.webex.com/docs/api/v1/features-call-queue/read-the-list-of-call-queues)
         '''
         method = "GET"
-        url = f"{self.base_url}/telephony/config/queues"
+        url = f"{self.base_url}/telephony/config/queues?max={self.page_size}"
         payload = {}
-        
-        response = self.execute_rest_call(method, url, payload)
 
-        return response['queues']
+        return self.execute_paginated_rest_call(method, url, payload, 'queues')
 
 
-    def get_phone_numbers(self):
+    def get_call_queues(self):
         '''
-        Get Webex phone numbers of an organization.
+        Get Webex call queues.
+        '''
+
+        return list(self.iter_call_queues())
+
+
+    def iter_phone_numbers(self):
+        '''
+        Iterate over all Webex phone numbers of an organization (all pages).
         (see also https://developer.webex.com/docs/api/v1/numbers/get-phone-numbers-for-an-organization-with-given-criterias)
         '''
 
         method = "GET"
-        url = f"{self.base_url}/telephony/config/numbers"
+        url = f"{self.base_url}/telephony/config/numbers?max={self.page_size}"
         payload = {}
-        
-        response = self.execute_rest_call(method, url, payload)
 
-        return response['phoneNumbers']
+        return self.execute_paginated_rest_call(method, url, payload, 'phoneNumbers')
+
+
+    def get_phone_numbers(self):
+        '''
+        Get Webex phone numbers of an organization.
+        '''
 
+        return list(self.iter_phone_numbers())
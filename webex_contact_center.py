@@ -14,9 +14,9 @@ or implied.
 
 from dotenv import load_dotenv
 import os
-import requests
-import time
+from concurrent.futures import ThreadPoolExecutor
 import logging
+from webex_transport import transport as default_transport
 log = logging.getLogger(__name__)
 
 load_dotenv()
@@ -27,11 +27,13 @@ class WebexContactCenterAPI():
     https://developer.webex-cx.com/documentation/getting-started
     '''
     
-    def __init__(self):
+    def __init__(self, transport=None):
+        self.transport = transport or default_transport
         self.access_token=os.getenv("WEBEX_CC_TOKEN")
         self.headers = {'Content-Type': 'application/json', 'Authorization': f'Bearer {self.access_token}', 'Accept': 'application/json'}
-        self.base_url = 'https://api.wxcc-us1.cisco.com'
+        self.base_url = os.getenv("WXCC_API_URL", 'https://api.wxcc-us1.cisco.com')
         self.organization_id = os.getenv("WXCC_ORG_ID")
+        self.page_size = int(os.getenv("WXCC_PAGE_SIZE", 500))
 
     
     def execute_rest_call(self, method, url, payload):
@@ -39,7 +41,7 @@ class WebexContactCenterAPI():
         Execute and check a REST call based on the provided data.
         '''
 
-        response = requests.request(method, url, headers=self.headers, json=payload)
+        response = self.transport.request(method, url, headers=self.headers, json=payload)
         
         if response.status_code == 200 or response.status_code == 201:
             print(f'Successful Webex CC API call: {url}')
@@ -50,18 +52,48 @@ class WebexContactCenterAPI():
             print(f'Successful Webex API call: {url} ({method})')
             return
 
-        elif response.status_code == 429:
-            print(f'''-----Error 429 (Too Many Requests). Retry in {response.headers["Retry-After"]} seconds -----''')
-            time.sleep(int(response.headers["Retry-After"]))
-            response = self.execute_rest_call(method, url, payload)
-            return response
         else:
             raise Exception(response.json())
 
     
-    def list_dial_numbers(self):
+    def execute_paginated_rest_call(self, method, url, payload):
         '''
-        List WxCC dial numbers
+        Execute a REST call for all pages (page and pageSize parameters) of a collection.
+        The next page is requested while the items of the current page are processed.
+        Yields the items of all pages.
+        '''
+
+        separator = '&' if '?' in url else '?'
+        page = 0
+        previous_first_item = None
+
+        with ThreadPoolExecutor(max_workers=1) as prefetcher:
+            next_page = prefetcher.submit(self.execute_rest_call, method, f"{url}{separator}page={page}&pageSize={self.page_size}", payload)
+
+            while next_page:
+                response = next_page.result() or []
+
+                # Collections are either returned as list or as data with meta information
+                items = response['data'] if isinstance(response, dict) else response
+                total_pages = response.get('meta', {}).get('totalPages') if isinstance(response, dict) else None
+
+                # A repeated page means the endpoint ignores the pagination parameters
+                if not items or items[0] == previous_first_item:
+                    break
+
+                page += 1
+                previous_first_item = items[0]
+                # The endpoint might cap the page size, so a short page is not the last one: with meta information
+                # the total pages decide, otherwise pages are requested until an empty (or repeated) page
+                last_page = total_pages is not None and page >= total_pages
+                next_page = None if last_page else prefetcher.submit(self.execute_rest_call, method, f"{url}{separator}page={page}&pageSize={self.page_size}", payload)
+
+                yield from items
+
+
+    def iter_dial_numbers(self):
+        '''
+        Iterate over all WxCC dial numbers (all pages)
         (see also: https://developer.webex-cx.com/documentation/dial-number/v1/list-dial-numbers)
         '''
 
@@ -69,14 +101,20 @@ class WebexContactCenterAPI():
         url = f"{self.base_url}/organization/{self.organization_id}/dial-number"
         payload = {}
 
-        response = self.execute_rest_call(method, url, payload)
+        return self.execute_paginated_rest_call(method, url, payload)
 
-        return response
 
+    def list_dial_numbers(self):
+        '''
+        List WxCC dial numbers
+        '''
 
-    def list_users(self):
+        return list(self.iter_dial_numbers())
+
+
+    def iter_users(self):
         '''
-        List WxCC users
+        Iterate over all WxCC users (all pages)
         (see also: https://developer.webex-cx.com/documentation/users/v2/list-users)
         '''
 
@@ -84,6 +122,12 @@ class WebexContactCenterAPI():
         url = f"{self.base_url}/organization/{self.organization_id}/v2/user"
         payload = {}
 
-        response = self.execute_rest_call(method, url, payload)
+        return self.execute_paginated_rest_call(method, url, payload)
+
+
+    def list_users(self):
+        '''
+        List WxCC users
+        '''
 
-        return response['data']
+        return list(self.iter_users())
@@ -12,10 +12,24 @@ or implied.
 """
 
 from dotenv import load_dotenv
+import json
 import os
+import statistics
+import threading
 import time
+from contextlib import contextmanager
+from datetime import date
 from pathlib import Path
 
+from csv_reader import CSVReader
+from metrics import metrics
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: the poll history is only locked within the process
+    fcntl = None
+
 load_dotenv()
 
 class Webex_Reports():
@@ -29,6 +43,13 @@ class Webex_Reports():
         self.template_id =  os.getenv("TEMPLATE_ID")   
         self.start_date = os.getenv("REPORT_START_DATE")  
         self.end_date = os.getenv("REPORT_END_DATE") 
+        self.poll_initial_interval = float(os.getenv("REPORT_POLL_INITIAL_INTERVAL", 5))
+        self.poll_max_interval = float(os.getenv("REPORT_POLL_MAX_INTERVAL", 60))
+        self.poll_backoff_factor = float(os.getenv("REPORT_POLL_BACKOFF_FACTOR", 2))
+        self.poll_deadline = float(os.getenv("REPORT_POLL_DEADLINE", 3600))
+        self.poll_history_path = Path(os.getenv("REPORT_POLL_HISTORY", './reports/poll_history.json'))
+        self.poll_history_lock = threading.Lock()
+        self.poll_history_lock_path = self.poll_history_path.with_name(f"{self.poll_history_path.name}.lock")
 
 
     def _get_templates(self):
@@ -43,50 +64,165 @@ class Webex_Reports():
         return templates
 
 
-    def _report_creation(self):
-        ''' Creates the needed report.
+    def _report_creation(self, template_id=None, start_date=None, end_date=None):
+        ''' Creates the needed report (by default for the configured template and date range).
         '''
 
-        report = self.webex_api.create_report(self.template_id, self.start_date , self.end_date)
+        report = self.webex_api.create_report(template_id or self.template_id, start_date or self.start_date, end_date or self.end_date)
 
         print(f"Created Report ID: {report['Id']}")
         return report['Id']
 
 
-    def _check_on_report(self, id):
-        ''' Loop on a 30 second interval checking if the newly created
-            report is done and ready to be downloaded.
+    def _poll_history_key(self, template_id, start_date, end_date):
+        ''' Returns the key of the completion history: the template and the number of days of the report.
+        '''
+
+        try:
+            days = (date.fromisoformat(end_date) - date.fromisoformat(start_date)).days + 1
+        except (TypeError, ValueError):
+            days = f"{start_date}-{end_date}"
+
+        return f"{template_id}:{days}"
+
+
+    def _read_poll_history(self):
+        ''' Reads the completion times (in seconds) of earlier reports per template and number of days.
+        '''
+
+        try:
+            with open(self.poll_history_path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+
+    @contextmanager
+    def _poll_history_file_lock(self):
+        ''' Holds the lock of the poll history within the process and across the worker processes.
+        '''
+
+        with self.poll_history_lock, open(self.poll_history_lock_path, 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+
+    def _record_completion_time(self, key, seconds):
+        ''' Stores the completion time of a report, keeping the latest 20 per key.
+        '''
+
+        temp_path = self.poll_history_path.with_name(f"{self.poll_history_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with self._poll_history_file_lock():
+                poll_history = self._read_poll_history()
+                poll_history[key] = (poll_history.get(key, []) + [round(seconds, 1)])[-20:]
+
+                with open(temp_path, 'w', encoding='utf-8') as file:
+                    json.dump(poll_history, file)
+                os.replace(temp_path, self.poll_history_path)
+        except OSError as e:
+            print(f'Error: Unable to store report completion time: {e}')
+
+
+    def _first_poll_delay(self, key):
+        ''' Returns the delay of the first status check: slightly before the median completion time of
+            earlier reports with the same key, or the initial poll interval without history.
+        '''
+
+        completion_times = self._read_poll_history().get(key)
+        if not completion_times:
+            return self.poll_initial_interval
+
+        return max(self.poll_initial_interval, statistics.median(completion_times) * 0.9)
+
+
+    def _check_on_report(self, id, template_id=None, start_date=None, end_date=None):
+        ''' Checks if the newly created report is done and ready to be downloaded.
+            The first check happens after the predicted completion time, afterwards the interval starts
+            short and backs off exponentially up to the maximum interval, until the overall deadline.
         '''
         
-        report_status = 'not done'
-        download_url = ""
-        
-        while report_status != 'done':
+        key = self._poll_history_key(template_id or self.template_id, start_date or self.start_date, end_date or self.end_date)
+        started = time.monotonic()
+        deadline = started + self.poll_deadline
+        interval = self.poll_initial_interval
+        delay = self._first_poll_delay(key)
+
+        while True:
             
+            print(f"Checking report status in {delay:.0f} seconds...")
+            time.sleep(max(0, min(delay, deadline - time.monotonic())))
+
             report = self.webex_api.get_report(id)
 
             download_url = report[0]['downloadURL']
             report_status = report[0]['status']
-            print(f"Report status: {report[0]['status']}, checking in 30 seconds...")
-            time.sleep(30)
+            print(f"Report status: {report_status}")
+
+            if report_status == 'done':
+                break
+            if str(report_status).lower() in ('failed', 'error', 'cancelled', 'canceled'):
+                raise Exception(f'Report {id} generation {report_status}')
+            if time.monotonic() >= deadline:
+                raise Exception(f'Report {id} not done after {self.poll_deadline:.0f} seconds (status: {report_status})')
 
+            delay = interval
+            interval = min(interval * self.poll_backoff_factor, self.poll_max_interval)
+
+        self._record_completion_time(key, time.monotonic() - started)
         print(f'Report Download URL: {download_url}')
 
         return download_url
 
 
-    def _download_report(self, url: str, id: str):
+    def _download_report(self, url: str, id: str, process_rows=None):
         ''' Downloads the report to a new CSV file in the reports folder with the report id 
-            as name.
+            as name. The report is streamed to a temporary file, which is renamed once complete.
+            Optionally, process_rows(report_path, rows) is called with the rows while they are downloaded.
         '''
+        report_path = Path(f'./reports/{id}.csv')
+        temp_path = report_path.with_name(f'{id}.csv.part')
+        downloaded = threading.Event()
+        errors = []
+
+        def download(writefile):
+            try:
+                with writefile:
+                    self.webex_api.download_report(url, writefile)
+                os.replace(temp_path, report_path)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                downloaded.set()
+
+        def downloading_rows():
+            yield from CSVReader.follow_csv(temp_path, downloaded)
+            if errors:
+                raise errors[0]
+
         try:
-            download_content = self.webex_api.download_report(url)
-            with open(Path(f'./reports/{id}.csv'), 'wb') as writefile:
-                writefile.write(download_content)
+            writefile = open(temp_path, 'wb')
+            if process_rows:
+                download_thread = threading.Thread(target=download, args=(writefile,), name=f'report-download-{id}', daemon=True)
+                download_thread.start()
+                try:
+                    process_rows(report_path, downloading_rows())
+                except Exception as e:
+                    print(f'Error: Unable to process report {id} while downloading: {e}')
+                download_thread.join()
+            else:
+                download(writefile)
+
+            if errors:
+                raise errors[0]
             print(f'Downloaded Report... See file reports/{id}.csv')
             return True
         except Exception as e:
             print(f'Error: {e}')
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
 
 
     def _delete_report(self, id):
@@ -98,15 +234,18 @@ class Webex_Reports():
         print(f'Deleted Report with ID: {id}')
 
 
-    def report_workflow(self):
+    def report_workflow(self, template_id=None, start_date=None, end_date=None, process_rows=None):
         '''
-        Creates, checks, downloads and deletes a report.
+        Creates, checks, downloads and deletes a report. Optionally, the rows are processed with
+        process_rows(report_path, rows) while the report is downloaded.
         '''
         
-        report_id = self._report_creation()
+        with metrics.timer('report_generation'):
+            report_id = self._report_creation(template_id, start_date, end_date)
+            report_created = self._check_on_report(report_id, template_id, start_date, end_date)
 
-        report_created = self._check_on_report(id=report_id)
-        report_downloaded = self._download_report(url=report_created, id=report_id)
+        with metrics.timer('report_download'):
+            report_downloaded = self._download_report(url=report_created, id=report_id, process_rows=process_rows)
         if report_downloaded:
             self._delete_report(id=report_id)
             return report_id
@@ -0,0 +1,229 @@
+""" Copyright (c) 2024 Cisco and/or its affiliates.
+This software is licensed to you under the terms of the Cisco Sample
+Code License, Version 1.1 (the "License"). You may obtain a copy of the
+License at
+           https://developer.cisco.com/docs/licenses
+All use of the material herein must be in accordance with the terms of
+the License. All rights not expressly granted by the License are
+reserved. Unless required by applicable law or agreed to separately in
+writing, software distributed under the License is distributed on an "AS
+IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+or implied.
+"""
+
+from dotenv import load_dotenv
+import os
+import random
+import threading
+import time
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+import logging
+log = logging.getLogger(__name__)
+
+from metrics import metrics
+
+load_dotenv()
+
+# Methods retried after server errors and connection errors while the response is read, a repeated POST
+# (e.g. creating a report) could have been processed already
+IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'DELETE'))
+
+
+class TokenBucket():
+    '''
+    Token bucket rate limiter. The rate is halved and all callers are paused on a Retry-After,
+    afterwards the rate recovers step by step with each successful call.
+    '''
+
+    def __init__(self, rate, capacity=None):
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0
+        self.lock = threading.Lock()
+
+
+    def acquire(self):
+        '''
+        Blocks until a token is available and takes it.
+        '''
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+
+            time.sleep(wait)
+
+
+    def retry_after(self, seconds):
+        '''
+        Pauses all callers for the Retry-After seconds and halves the rate.
+        '''
+
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.rate = max(self.max_rate / 16, self.rate / 2)
+            self.tokens = 0
+
+
+    def success(self):
+        '''
+        Increases the rate after a successful call, up to the configured rate.
+        '''
+
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class WebexTransport():
+    '''
+    Shared HTTP transport of the Webex and Webex Contact Center API clients.
+    Keeps a pooled keep-alive session and a rate limiter per host, retries 429 (after Retry-After) and
+    5xx responses (with jittered exponential backoff) a bounded number of times and records the call latencies.
+    Non-idempotent calls are only retried after 429 and connection errors before the request was sent.
+    Calls time out after WEBEX_API_CONNECT_TIMEOUT / WEBEX_API_TIMEOUT seconds (connect / read) by default.
+    '''
+
+    def __init__(self, rate=None, max_retries=None, backoff=None, pool_size=None, timeout=None):
+        self.rate = rate or float(os.getenv("WEBEX_API_RATE", 10))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("WEBEX_API_MAX_RETRIES", 5))
+        self.backoff = backoff if backoff is not None else float(os.getenv("WEBEX_API_BACKOFF", 0.5))
+        self.pool_size = pool_size or int(os.getenv("WEBEX_API_POOL_SIZE", 16))
+        # Default (connect, read) timeout in seconds of calls without own timeout, a stalled call is retried
+        self.timeout = timeout or (float(os.getenv("WEBEX_API_CONNECT_TIMEOUT", 10)), float(os.getenv("WEBEX_API_TIMEOUT", 60)))
+        self.sessions = {}
+        self.limiters = {}
+        self.call_metrics = {}
+        self.lock = threading.Lock()
+
+
+    def _host(self, host):
+        '''
+        Returns the session and rate limiter of a host, creating them on first use.
+        '''
+
+        with self.lock:
+            if host not in self.sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self.sessions[host] = session
+                self.limiters[host] = TokenBucket(self.rate)
+                self.call_metrics[host] = {'calls': 0, 'retries': 0, 'errors': 0, 'seconds_total': 0.0, 'seconds_max': 0.0}
+
+            return self.sessions[host], self.limiters[host]
+
+
+    def _record(self, host, seconds, retry=False, error=False):
+        '''
+        Records the latency and outcome of a single call.
+        '''
+
+        with self.lock:
+            call_metrics = self.call_metrics[host]
+            call_metrics['calls'] += 1
+            call_metrics['retries'] += retry
+            call_metrics['errors'] += error
+            call_metrics['seconds_total'] += seconds
+            call_metrics['seconds_max'] = max(call_metrics['seconds_max'], seconds)
+
+        metrics.observe('api_call_seconds', seconds, host=host)
+        metrics.count('api_calls_total', host=host, outcome='retry' if retry else 'error' if error else 'success')
+
+
+    @staticmethod
+    def _not_sent(error):
+        '''
+        Checks if a connection error occurred before the request was sent (connection refused or timed out, name resolution).
+        '''
+
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+
+        reason = getattr(error.args[0], 'reason', None) if error.args else None
+        return isinstance(reason, NewConnectionError)
+
+
+    def _backoff(self, attempt):
+        '''
+        Sleeps for a jittered exponential backoff.
+        '''
+
+        time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+
+    def request(self, method, url, **kwargs):
+        '''
+        Execute a REST call on the pooled session of the url host. Returns the final response.
+        '''
+
+        host = urlparse(url).netloc
+        session, limiter = self._host(host)
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        kwargs.setdefault('timeout', self.timeout)
+
+        for attempt in range(self.max_retries + 1):
+            limiter.acquire()
+            last_attempt = attempt == self.max_retries
+            start = time.perf_counter()
+
+            try:
+                response = session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                retry = not last_attempt and (idempotent or self._not_sent(e))
+                self._record(host, time.perf_counter() - start, retry=retry, error=True)
+                if not retry:
+                    raise
+                print(f'-----Connection error ({e}). Retry {attempt + 1} of {self.max_retries} -----')
+                self._backoff(attempt)
+                continue
+
+            elapsed = time.perf_counter() - start
+            log.debug(f'{method} {url}: {response.status_code} in {elapsed * 1000:.0f} ms')
+
+            if response.status_code == 429 and not last_attempt:
+                self._record(host, elapsed, retry=True)
+                retry_after = int(response.headers.get("Retry-After", 1))
+                print(f'''-----Error 429 (Too Many Requests). Retry in {retry_after} seconds -----''')
+                limiter.retry_after(retry_after)
+                # Returns the connection of a streamed response to the pool
+                response.close()
+                continue
+
+            if response.status_code >= 500 and idempotent and not last_attempt:
+                self._record(host, elapsed, retry=True, error=True)
+                print(f'-----Error {response.status_code}. Retry {attempt + 1} of {self.max_retries} -----')
+                response.close()
+                self._backoff(attempt)
+                continue
+
+            self._record(host, elapsed, error=response.status_code >= 400)
+            if response.status_code < 400:
+                limiter.success()
+            return response
+
+
+    def metrics(self):
+        '''
+        Returns a copy of the call metrics (calls, retries, errors, seconds_total, seconds_max) per host.
+        '''
+
+        with self.lock:
+            return {host: dict(call_metrics) for host, call_metrics in self.call_metrics.items()}
+
+
+transport = WebexTransport()